@@ -1,12 +1,41 @@
 import os.path
+import tempfile
+import time
+from typing import TYPE_CHECKING, AsyncIterator, Iterable, Iterator, Tuple
 
-from TTS.api import TTS as CTTS
+import numpy as np
 from langcodes import Language
 from ovos_config import Configuration
 from ovos_plugin_manager.templates.tts import TTS as AbstractTTS
 from ovos_plugin_manager.tts import load_tts_plugin
 from ovos_utils.log import LOG
 
+from ovos_tts_plugin_coqui.aio import SynthesisCancelled, collect_chunks, iterate_cancellable, run_cancellable, write_chunks
+from ovos_tts_plugin_coqui.audio import WavStreamWriter, load_audio, to_pcm16
+from ovos_tts_plugin_coqui.cache import AudioCache
+from ovos_tts_plugin_coqui.frontend import FrontendCache
+from ovos_tts_plugin_coqui.cpu import can_quantize, compare_audio, configure_threads, quantize_tts, run_inference
+from ovos_tts_plugin_coqui.loader import LoadState, ModelLoader
+from ovos_tts_plugin_coqui.metrics import Metrics, instrument_model
+from ovos_tts_plugin_coqui.onnx_backend import load_onnx_vits
+from ovos_tts_plugin_coqui.output import AudioData, AudioEncoder, AudioSink, FileSink
+from ovos_tts_plugin_coqui.pipeline import render_ahead
+from ovos_tts_plugin_coqui.pool import ModelKey, ModelPool, estimate_model_size
+from ovos_tts_plugin_coqui.prerender import Prerenderer, iter_phrases
+from ovos_tts_plugin_coqui.scheduler import BatchSpec, ModelScheduler, RequestOptions, RequestRejected
+from ovos_tts_plugin_coqui.segment import split_sentences
+from ovos_tts_plugin_coqui.selection import DEFAULT_SENTENCE, ModelSelector, host_fingerprint, model_version
+from ovos_tts_plugin_coqui.snapshot import ModelSnapshots
+from ovos_tts_plugin_coqui.speakers import SpeakerCache, compute_voice, supports_voice_cache
+from ovos_tts_plugin_coqui.util import file_hash, get_cache_dir
+from ovos_tts_plugin_coqui.worker import WorkerClient
+from ovos_tts_plugin_coqui.vits import is_vits, synth_vits_batch
+from ovos_tts_plugin_coqui.vc import FREEVC_MODEL, freevc_convert, freevc_sample_rate, freevc_target_voice
+from ovos_tts_plugin_coqui.xtts import get_conditioning, is_xtts, stream_xtts, synth_xtts
+
+if TYPE_CHECKING:
+    from TTS.api import TTS as CTTS
+
 
 def standardize_lang_tag(lang_code, macro=True):
     """https://langcodes-hickford.readthedocs.io/en/sphinx/index.html"""
@@ -22,7 +51,14 @@ def standardize_lang_tag(lang_code, macro=True):
 
 class CoquiTTSPlugin(AbstractTTS):
     """Interface to coqui TTS."""
-    _MODELS = {}
+    _METRICS = Metrics()  # per request timings, disabled unless a sink is configured
+    _POOL = ModelPool(metrics=_METRICS)  # shared by all plugin instances in this process
+    _SPEAKERS = SpeakerCache()
+    _FRONTEND = FrontendCache()  # memoized text normalization / phonemization
+    _SCHEDULER = ModelScheduler(metrics=_METRICS)  # serializes (and batches) inference per model
+    _SELECTOR = ModelSelector()  # "auto_select" choices and the measurements behind them
+    _SNAPSHOTS = ModelSnapshots(metrics=_METRICS)  # memory mapped models restored on later starts
+    _PRERENDER = Prerenderer(_SCHEDULER)  # predicted phrases rendered while the models are idle
     LANG2MODEL = {
         "bg": 'tts_models/bg/cv/vits',
         "cs": ['tts_models/cs/cv/vits',
@@ -135,14 +171,95 @@ class CoquiTTSPlugin(AbstractTTS):
         config = config or {}
         config["lang"] = lang
         super().__init__(config=config, audio_ext='wav')
-        model_id = self.config.get("model") or self._lang2model()
-        self.get_model(model=model_id,
-                       model_config=self.config.get("model_config"),
-                       vocoder=self.config.get("vocoder"),
-                       vocoder_config=self.config.get("vocoder_config"))
+        model_pool = self._config_section("model_pool")
+        model_pool.pop("enabled", None)  # the pool is always used, "model_pool": true keeps the defaults
+        self._POOL.configure(**model_pool)
+        self._SPEAKERS.configure(cache_dir=self.config.get("speaker_cache_dir"),
+                                 max_items=self.config.get("speaker_cache_size"))
+        batching = self._config_section("batching")
+        batching_enabled = batching.pop("enabled", None)
+        if batching_enabled is False:
+            batching["max_batch_size"] = 1
+        elif batching_enabled:
+            batching.setdefault("max_batch_size", 8)
+        self._SCHEDULER.configure(**batching,
+                                  **{k: v for k, v in self._config_section("scheduling").items()
+                                     if k in ("policy", "max_queue", "aging")})
+        self._METRICS.configure(**self._config_section("metrics"))
+        self._FRONTEND.configure(**self._config_section("frontend_cache"))
+        self._SNAPSHOTS.configure(**self._config_section("snapshots"))
+        self._METRICS.add_gauge("model_pool_ram_mb", lambda: CoquiTTSPlugin._POOL.ram_usage_mb)
+        self._METRICS.add_gauge("models_loaded", lambda: len(CoquiTTSPlugin._POOL.loaded_models))
+        # with a worker pool configured the models live in the pool, this instance only forwards requests
+        self.worker = WorkerClient.from_config(self.config.get("worker"))
+        self.audio_cache = None if self.worker else AudioCache.from_config(self.config.get("audio_cache"))
+        self.audio_encoder = AudioEncoder.from_config(self.config.get("audio_output"))
+        prerender = self.config.get("prerender")
+        prerender = {"enabled": bool(prerender)} if not isinstance(prerender, dict) else prerender
+        self.prerender_cache = None
+        if prerender.get("enabled", True) and not self.worker:
+            self._PRERENDER.configure(prerender.get("max_pending"), prerender.get("idle_delay"))
+            self.prerender_cache = self.audio_cache or AudioCache.from_config(
+                {"path": prerender.get("path") or get_cache_dir("prerender"),
+                 "max_size_mb": prerender.get("max_size_mb", 64)})
+        self.loader = ModelLoader(self.__class__.__name__)
+        if not self.worker:
+            if self.config.get("warmup"):
+                self.loader.run(self._warmup, background=True)
+            elif self.config.get("preload", True):
+                self.loader.run(self._load_default)
+        if self.prerender_cache and prerender.get("dialog_dirs"):
+            self.prerender(iter_phrases(prerender["dialog_dirs"]))
+
+    def _config_section(self, name: str) -> dict:
+        """a copy of a config section, a bool value (eg. "metrics": true) is read as {"enabled": value}"""
+        section = self.config.get(name, {})
+        if not isinstance(section, dict):
+            return {"enabled": bool(section)}
+        return dict(section)
+
+    @property
+    def load_state(self) -> str:
+        """one of 'unloaded', 'loading', 'ready' or 'error'"""
+        return self.loader.state
+
+    @property
+    def is_ready(self) -> bool:
+        return self.loader.is_ready
+
+    def wait_until_ready(self, timeout: float = None):
+        """block until a background warmup finishes, raises if it failed"""
+        self.loader.wait(timeout if timeout is not None else self.config.get("warmup_timeout"))
+
+    def _load_default(self) -> "CTTS":
+        """load the default model and precompute the voices in "voices_dir" """
+        tts = self.get_model()
+        voices_dir = self.config.get("voices_dir")
+        if voices_dir and supports_voice_cache(tts):
+            key = self.get_model_key()
+            n = self._SPEAKERS.precompute(key.model, voices_dir,
+                                          lambda wav: self._infer(key, lambda: compute_voice(tts, wav)),
+                                          key.device)
+            LOG.info(f"{n} voices ready from {voices_dir}")
+        return tts
+
+    def _warmup(self):
+        """load the default model and run a short synthesis so lazy
+        initialization (phonemizer, cuda kernels...) is not paid by the first request"""
+        tts = self._load_default()
+        try:
+            kwargs = self._synth_kwargs(tts, self.lang, self.config.get("voice"))
+            self._infer(self.get_model_key(),
+                        lambda: tts.tts(self.config.get("warmup_sentence", "hello"), **kwargs))
+        except Exception as e:
+            LOG.warning(f"warmup synthesis failed: {e}")
 
     def _lang2model(self, lang: str = None ) -> str:
         lang = lang or self.lang
+        if self.config.get("auto_select"):
+            candidates = self._lang_candidates(lang)
+            if len(candidates) > 1:
+                return self._auto_select(lang, candidates)
         model_id = self.LANG2MODEL.get(lang) or self.LANG2MODEL.get(lang.split("-")[0])
         if isinstance(model_id, list):
             model_id = model_id[0]
@@ -151,60 +268,650 @@ class CoquiTTSPlugin(AbstractTTS):
                              f"pass 'model' explicitly in config")
         return model_id
 
+    def _lang_candidates(self, lang: str) -> list:
+        model_ids = self.LANG2MODEL.get(lang) or self.LANG2MODEL.get(lang.split("-")[0]) or []
+        if isinstance(model_ids, str):
+            model_ids = [model_ids]
+        return model_ids
+
+    def _auto_select(self, lang: str, candidates: list) -> str:
+        """pick the candidate that fits the "auto_select" budget on this host"""
+        budget = self.config["auto_select"] if isinstance(self.config["auto_select"], dict) else {}
+        self._SELECTOR.profiles.configure(budget.get("profile_file"))
+        host = host_fingerprint("cuda" if self.config.get("gpu") else "cpu", self.config.get("num_threads"))
+
+        def settings(model: str) -> str:
+            key = self.get_model_key(lang, model)
+            return f"{key.backend}-{'int8' if key.quantize else 'fp32'}"
+
+        return self._SELECTOR.select(lang, candidates, budget, host, settings,
+                                     lambda model: self.profile_model(model, lang, budget.get("sentence")))
+
+    def profile_model(self, model_id: str, lang: str = None, sentence: str = None) -> dict:
+        """load a model and measure its load time, real time factor and memory on this host"""
+        lang = lang or self.lang
+        key = self.get_model_key(lang, model_id)
+        load_time = None
+        if key in self._POOL:
+            tts = self._POOL.get(key, lambda: None)
+        else:
+            start = time.perf_counter()
+            tts = self._prepare_model(key, lang)
+            load_time = time.perf_counter() - start
+        kwargs = self._synth_kwargs(tts, lang)
+        sentence = sentence or DEFAULT_SENTENCE
+        self._infer(key, lambda: tts.tts(sentence, **kwargs))  # the first call pays lazy initialization
+        start = time.perf_counter()
+        wav = self._infer(key, lambda: tts.tts(sentence, **kwargs))
+        elapsed = time.perf_counter() - start
+        sample_rate = tts.synthesizer.output_sample_rate
+        return {"load_time_s": load_time,
+                "rtf": elapsed / (len(wav) / sample_rate),
+                "ram_mb": estimate_model_size(tts) / 1024 / 1024,
+                "sample_rate": sample_rate}
+
+    def get_model_key(self, lang: str = None,
+                      model=None,
+                      model_config=None,
+                      vocoder=None,
+                      vocoder_config=None) -> ModelKey:
+        """resolve the identity of the model that would be used for a request"""
+        lang = lang or self.lang
+        if not model:
+            default_model = self.config.get("model")
+            # the configured model is also used for other languages it supports
+            if default_model and (lang == self.lang or default_model in self._lang_candidates(lang)):
+                model = default_model
+                model_config = model_config or self.config.get("model_config")
+                vocoder = vocoder or self.config.get("vocoder")
+                vocoder_config = vocoder_config or self.config.get("vocoder_config")
+            else:
+                model = self._lang2model(lang)
+        if os.path.isfile(model):
+            model_config = model_config or model.replace(".pth", "_config.json")
+        device = "cuda" if self.config.get("gpu") else "cpu"
+        quantize = bool(self.config.get("quantize")) and device == "cpu"
+        backend = "onnx" if self.config.get("backend") == "onnx" and device == "cpu" and not vocoder else "torch"
+        return ModelKey(model, model_config, vocoder, vocoder_config, device, quantize, backend)
+
+    @staticmethod
+    def _load_model(key: ModelKey) -> "CTTS":
+        return CoquiTTSPlugin._SNAPSHOTS.load(key, lambda: CoquiTTSPlugin._build_model(key))
+
+    @staticmethod
+    def _build_model(key: ModelKey) -> "CTTS":
+        from TTS.api import TTS as CTTS  # heavy import, deferred until a model is needed
+        if os.path.isfile(key.model):
+            tts = CTTS(model_path=key.model,
+                       config_path=key.model_config,
+                       vocoder_path=key.vocoder,
+                       vocoder_config_path=key.vocoder_config)
+        else:
+            tts = CTTS(key.model)
+        if key.device != "cpu":
+            tts.to(key.device)
+        return tts
+
     def get_model(self, lang: str = None,
                   model=None,
                   model_config=None,
                   vocoder=None,
-                  vocoder_config=None):
-        lang = lang or self.lang
-        if lang not in self._MODELS:
-            model = model or self._lang2model(lang)
-            if os.path.isfile(model):
-                tts = CTTS(model_path=model,
-                           config_path=model_config or model.replace(".pth", "_config.json"),
-                           vocoder_path=vocoder,
-                           vocoder_config_path=vocoder_config)
-            else:
-                tts = CTTS(model)
-            if self.config.get("gpu"):
-                tts.to("cuda")
-            self._MODELS[lang] = tts
-        return self._MODELS[lang]
+                  vocoder_config=None) -> "CTTS":
+        key = self.get_model_key(lang, model, model_config, vocoder, vocoder_config)
+        tts = self._POOL.get(key, lambda: self._load_instrumented(key, lang))
+        self.loader.mark_ready()
+        return tts
 
-    def get_tts(self, sentence: str, wav_file: str,
-                lang: str = None, voice: str = None,
-                reference_speaker: str = None,
-                model_id: str = None):
-        lang = lang or self.lang
-        if model_id:
-            tts = self.get_model(model=model_id)
-        else:
-            tts = self.get_model(lang=lang)
+    def _load_instrumented(self, key: ModelKey, lang: str = None) -> "CTTS":
+        tts = self._prepare_model(key, lang)
+        scope = f"{key.model}|{model_version(key.model)}"
+        if key.model_config:  # the config picks the text cleaners and the phonemizer
+            scope += f"|{key.model_config}|{model_version(key.model_config)}"
+        self._FRONTEND.install(tts, scope)
+        return instrument_model(tts, self._METRICS)
+
+    def _prepare_model(self, key: ModelKey, lang: str = None) -> "CTTS":
+        """load a model and apply the CPU performance settings"""
+        configure_threads(self.config.get("num_threads"), self.config.get("num_interop_threads"))
+        loaded = []
+
+        def load_torch() -> "CTTS":
+            if not loaded:
+                loaded.append(self._load_model(key))
+            return loaded[0]
+
+        if key.backend == "onnx":
+            try:
+                return load_onnx_vits(key, load_torch, self.config.get("num_threads"),
+                                      self.config.get("num_interop_threads"))
+            except Exception as e:
+                LOG.warning(f"onnx backend unavailable for {key.model}, using pytorch: {e}")
+        tts = load_torch()
+        if not key.quantize:
+            return tts
+        if not can_quantize(tts):
+            LOG.warning(f"int8 quantization is not supported for {key.model}, using fp32")
+            return tts
+        render = None
+        if self.config.get("quantize_check", True):
+            kwargs = self._synth_kwargs(tts, lang or self.lang, self.config.get("voice"))
+            sentence = self.config.get("quantize_check_sentence",
+                                       "The quick brown fox jumps over the lazy dog.")
+
+            def render() -> np.ndarray:
+                return np.asarray(run_inference(lambda: tts.tts(sentence, **kwargs)), dtype=np.float32)
+        if quantize_tts(tts, render, self.check_quantization):
+            LOG.info(f"using int8 quantized {key.model}")
+        return tts
+
+    def check_quantization(self, reference: np.ndarray, quantized: np.ndarray) -> bool:
+        """quality check of a quantized model, override to use a different metric
 
-        if tts.is_multi_speaker:
+        reference and quantized are renderings of the same sentence by the fp32
+        and the int8 model, return False to keep using the fp32 model
+        """
+        ratio, distance = compare_audio(reference, quantized)
+        LOG.debug(f"int8 quality check: length ratio {ratio:.2f}, spectral distance {distance:.2f} dB")
+        return abs(1 - ratio) <= self.config.get("quantize_max_length_diff", 0.2) and \
+            distance <= self.config.get("quantize_max_distance_db", 3.0)
+
+    def _synth_kwargs(self, tts: "CTTS", lang: str,
+                      voice: str = None,
+                      reference_speaker: str = None) -> dict:
+        """validate a request against the selected model and
+        return the keyword arguments for coqui synthesis methods"""
+        if tts.is_multi_speaker and not reference_speaker:
             voice = voice or tts.speakers[0]
             if voice not in tts.speakers:
                 raise ValueError(f"speaker '{voice}' is not valid for selected TTS, valid: {tts.speakers}")
 
         lang = lang.split("-")[0]
         if tts.is_multi_lingual and lang not in tts.languages:
-            raise ValueError(f"lang '{lang}' is not valid for selected TTS, valid: {tts.available_languages}")
+            raise ValueError(f"lang '{lang}' is not valid for selected TTS, valid: {tts.languages}")
+
+        kwargs = {"language": lang if tts.is_multi_lingual else None,
+                  "speaker": voice if tts.is_multi_speaker and not reference_speaker else None}
+        if reference_speaker:
+            kwargs["speaker_wav"] = reference_speaker
+        return kwargs
+
+    def get_tts(self, sentence: str, wav_file: str,
+                lang: str = None, voice: str = None,
+                reference_speaker: str = None,
+                model_id: str = None):
+        lang = lang or self.lang
+        key = self.get_model_key(lang, model_id)
+        with self._METRICS.request("get_tts", self.__class__.__name__, key.model, lang), self._scheduling():
+            return self._with_fallback(lang, key, model_id, lambda k, m: self._get_tts(
+                sentence, wav_file, k, lang, voice, reference_speaker, m))
 
+    def _get_tts(self, sentence: str, wav_file: str, key: ModelKey,
+                 lang: str, voice: str = None,
+                 reference_speaker: str = None,
+                 model_id: str = None):
+        if self.worker:
+            header, payload = self._remote("get_tts", lang, model_id, sentence=sentence,
+                                           voice=voice, reference_speaker=reference_speaker)
+            with open(wav_file, "wb") as f:
+                f.write(payload)
+            return (wav_file, header.get("phonemes"))
         reference_speaker = reference_speaker or self.config.get("reference_speaker")
-        if reference_speaker and self.config.get("use_freeVC"):
-            tts.tts_with_vc_to_file(pt,
-                                    speaker_wav="/home/miro/PycharmProjects/ovos-tts-plugin-nos/test.wav",
-                                    speaker=voice if tts.is_multi_speaker else None,
-                                    language=lang.split("-")[0] if tts.is_multi_lingual else None,
-                                    file_path=wav_file
-                                    )
+        cache_key = None
+        if self.audio_cache or self.prerender_cache:
+            cache_key = self.get_cache_key(sentence, lang, voice, reference_speaker, key)
+            if self._cache_lookup(cache_key, wav_file):
+                return (wav_file, None)
+
+        self.wait_until_ready()
+        tts = self.get_model(lang=lang, model=model_id)
+        incremental = bool(self.config.get("streaming"))
+        if self.config.get("pipeline") or (incremental and is_xtts(tts)):
+            # write progressively so playback can start before synthesis ends
+            sample_rate = self._output_sample_rate(tts, reference_speaker)
+            try:
+                with WavStreamWriter(wav_file, sample_rate) as f:
+                    for chunk in self._iter_audio(tts, key, sentence, lang, voice,
+                                                  reference_speaker, incremental):
+                        f.write(chunk)
+                        self._METRICS.add_audio(len(chunk) / sample_rate)
+            except BaseException:
+                # the writer finalizes the header on exit, do not leave a valid looking truncated file
+                if os.path.exists(wav_file):
+                    os.remove(wav_file)
+                raise
         else:
-            tts.tts_to_file(sentence, file_path=wav_file,
-                            speaker_wav=reference_speaker,
-                            language=lang.split("-")[0] if tts.is_multi_lingual else None,
-                            speaker=voice if tts.is_multi_speaker else None)
+            wav, sample_rate = self._synthesize(tts, key, sentence, lang, voice, reference_speaker)
+            self._METRICS.add_audio(len(wav) / sample_rate)
+            with self._METRICS.stage("write"):
+                FileSink(wav_file, "wav").write(wav, sample_rate)
+        if cache_key and self.audio_cache:
+            self.audio_cache.put(cache_key, wav_file)
         return (wav_file, None)  # No phonemes
 
+    def _cache_lookup(self, cache_key: str, wav_file: str) -> bool:
+        """place cached or pre-rendered audio at wav_file, returns False on a miss"""
+        with self._METRICS.stage("cache_lookup"):
+            hit = bool(self.audio_cache and self.audio_cache.get(cache_key, wav_file))
+            if not hit and self.prerender_cache and self.prerender_cache is not self.audio_cache:
+                hit = self.prerender_cache.get(cache_key, wav_file)
+        self._METRICS.count("audio_cache", result="hit" if hit else "miss")
+        self._METRICS.tag("cache", "hit" if hit else "miss")
+        return hit
+
+    async def get_tts_async(self, sentence: str, wav_file: str,
+                            lang: str = None, voice: str = None,
+                            reference_speaker: str = None,
+                            model_id: str = None):
+        """get_tts without blocking the event loop, synthesis runs on a worker thread
+
+        cancelling the task stops synthesis at the next sentence (or XTTS chunk)
+        boundary, the model is released for the next request and no partial
+        file is left behind
+        """
+        return await run_cancellable(lambda cancel: self._get_tts_cancellable(
+            cancel, sentence, wav_file, lang, voice, reference_speaker, model_id))
+
+    def _get_tts_cancellable(self, cancel, sentence: str, wav_file: str,
+                             lang: str = None, voice: str = None,
+                             reference_speaker: str = None,
+                             model_id: str = None):
+        lang = lang or self.lang
+        if self.worker:
+            # the worker renders the whole utterance, the result is discarded if cancelled meanwhile
+            result = self.get_tts(sentence, wav_file, lang, voice, reference_speaker, model_id)
+            if cancel.is_set():
+                if os.path.isfile(wav_file):
+                    os.remove(wav_file)
+                raise SynthesisCancelled(wav_file)
+            return result
+        key = self.get_model_key(lang, model_id)
+        with self._METRICS.request("get_tts_async", self.__class__.__name__, key.model, lang), self._scheduling():
+            reference_speaker = reference_speaker or self.config.get("reference_speaker")
+            cache_key = None
+            if self.audio_cache or self.prerender_cache:
+                cache_key = self.get_cache_key(sentence, lang, voice, reference_speaker, key)
+                if self._cache_lookup(cache_key, wav_file):
+                    return (wav_file, None)
+            self.wait_until_ready()
+            tts = self.get_model(lang=lang, model=model_id)
+            sample_rate = self._output_sample_rate(tts, reference_speaker)
+            chunks = self._iter_audio(tts, key, sentence, lang, voice, reference_speaker, split=True)
+            samples = self._write_cancellable(tts, chunks, sample_rate, wav_file, cancel)
+            self._METRICS.add_audio(samples / sample_rate)
+            if cache_key and self.audio_cache:
+                self.audio_cache.put(cache_key, wav_file)
+        return (wav_file, None)
+
+    def prerender(self, sentences: Iterable[str], lang: str = None, voice: str = None,
+                  reference_speaker: str = None, model_id: str = None) -> int:
+        """render sentences in the background while the models are idle, returns how many were queued
+
+        a later get_tts call with the same arguments is served from the
+        pre-render cache, eg. for registered dialogs or the next sentences of a long answer
+        """
+        if not self.prerender_cache:
+            LOG.warning("pre-rendering is disabled, set \"prerender\" in the plugin config")
+            return 0
+        lang = lang or self.lang
+        key = self.get_model_key(lang, model_id)
+        reference_speaker = reference_speaker or self.config.get("reference_speaker")
+        queued = 0
+        for sentence in sentences:
+            cache_key = self.get_cache_key(sentence, lang, voice, reference_speaker, key)
+            if cache_key in self.prerender_cache:
+                continue
+            queued += self._PRERENDER.submit(cache_key, lambda cancel, s=sentence, c=cache_key: self._prerender_one(
+                cancel, c, s, key, lang, voice, reference_speaker, model_id))
+        return queued
+
+    def _prerender_one(self, cancel, cache_key: str, sentence: str, key: ModelKey,
+                       lang: str, voice: str = None, reference_speaker: str = None,
+                       model_id: str = None):
+        tts = self.get_model(lang=lang, model=model_id)
+        sample_rate = self._output_sample_rate(tts, reference_speaker)
+        chunks = self._iter_audio(tts, key, sentence, lang, voice, reference_speaker, split=True)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            wav_file = os.path.join(tmpdir, "prerender.wav")
+            self._write_cancellable(tts, chunks, sample_rate, wav_file, cancel)
+            self.prerender_cache.put(cache_key, wav_file)
+
+    def _write_cancellable(self, tts: "CTTS", chunks: Iterator[np.ndarray], sample_rate: int,
+                           wav_file: str, cancel) -> int:
+        """write chunks to wav_file exactly like get_tts would, returns the number of samples
+
+        with "pipeline" (or "streaming" XTTS) the chunks are written as they come,
+        otherwise the whole utterance is peak normalized and written at once,
+        synthesis stops at the next chunk once cancel is set
+        """
+        if self.config.get("pipeline") or (self.config.get("streaming") and is_xtts(tts)):
+            return write_chunks(chunks, sample_rate, wav_file, cancel)
+        wav = collect_chunks(chunks, cancel)
+        FileSink(wav_file, "wav").write(wav, sample_rate)
+        return len(wav)
+
+    def get_cache_key(self, sentence: str, lang: str = None, voice: str = None,
+                      reference_speaker: str = None, key: ModelKey = None) -> str:
+        """audio cache key of everything that determines the output of a synthesis request"""
+        lang = lang or self.lang
+        key = key or self.get_model_key(lang)
+        return AudioCache.make_key(text=sentence,
+                                   model=[key.model, key.model_config, key.vocoder, key.vocoder_config],
+                                   lang=lang.split("-")[0],
+                                   voice=voice,
+                                   reference=file_hash(reference_speaker) if reference_speaker else None,
+                                   settings={"use_freeVC": bool(self.config.get("use_freeVC")),
+                                             "quantize": key.quantize,
+                                             "backend": key.backend,
+                                             **self._output_settings()})
+
+    def _output_settings(self) -> dict:
+        """config values that change the rendered audio of a given model and voice, with their defaults"""
+        return {"pipeline": bool(self.config.get("pipeline")),
+                "sentence_silence": self.config.get("sentence_silence", 0.2),
+                "max_segment_chars": self.config.get("max_segment_chars", 250),
+                "streaming": bool(self.config.get("streaming")),
+                "stream_chunk_size": self.config.get("stream_chunk_size", 20),
+                "stream_overlap": self.config.get("stream_overlap", 1024)}
+
+    def get_waveform(self, sentence: str,
+                     lang: str = None, voice: str = None,
+                     reference_speaker: str = None,
+                     model_id: str = None) -> Tuple[np.ndarray, int]:
+        """synthesize sentence in memory, returns (float waveform, sample_rate)"""
+        lang = lang or self.lang
+        key = self.get_model_key(lang, model_id)
+        with self._METRICS.request("get_waveform", self.__class__.__name__, key.model, lang), self._scheduling():
+            wav, sample_rate = self._with_fallback(lang, key, model_id, lambda k, m: self._get_waveform(
+                sentence, k, lang, voice, reference_speaker, m))
+            self._METRICS.add_audio(len(wav) / sample_rate)
+            return wav, sample_rate
+
+    def _get_waveform(self, sentence: str, key: ModelKey,
+                      lang: str, voice: str = None,
+                      reference_speaker: str = None,
+                      model_id: str = None) -> Tuple[np.ndarray, int]:
+        if self.worker:
+            header, payload = self._remote("get_waveform", lang, model_id, sentence=sentence,
+                                           voice=voice, reference_speaker=reference_speaker)
+            return np.frombuffer(payload, dtype="<f4"), header["sample_rate"]
+        self.wait_until_ready()
+        tts = self.get_model(lang=lang, model=model_id)
+        reference_speaker = reference_speaker or self.config.get("reference_speaker")
+        return self._synthesize(tts, key, sentence, lang, voice, reference_speaker)
+
+    def get_audio(self, sentence: str,
+                  lang: str = None, voice: str = None,
+                  reference_speaker: str = None,
+                  model_id: str = None,
+                  audio_format: str = "pcm16",
+                  sample_rate: int = None) -> Tuple[AudioData, int]:
+        """synthesize sentence in memory, returns (audio, sample_rate)
+
+        audio_format is one of "float32" (numpy array), "pcm16" (mono 16 bit
+        PCM bytes) or "wav", "ogg", "opus", "mp3", "flac" (encoded bytes),
+        with sample_rate set the audio is resampled to it
+        """
+        lang = lang or self.lang
+        key = self.get_model_key(lang, model_id)
+        sink = AudioSink(audio_format, sample_rate, self.audio_encoder)
+        with self._METRICS.request("get_audio", self.__class__.__name__, key.model, lang), self._scheduling():
+            wav, sr = self._with_fallback(lang, key, model_id, lambda k, m: self._get_waveform(
+                sentence, k, lang, voice, reference_speaker, m))
+            self._METRICS.add_audio(len(wav) / sr)
+            with self._METRICS.stage("encode"):
+                return sink.write(wav, sr)
+
+    def _synthesize(self, tts: "CTTS", key: ModelKey, sentence: str,
+                    lang: str, voice: str = None,
+                    reference_speaker: str = None) -> Tuple[np.ndarray, int]:
+        sample_rate = tts.synthesizer.output_sample_rate
+        if self._uses_freevc(reference_speaker):
+            kwargs = self._synth_kwargs(tts, lang, voice)
+            wav = self._infer(key, lambda: tts.tts(sentence, **kwargs),
+                              batch=self._batch_spec(tts, sentence, kwargs), cost=len(sentence))
+            return self._freevc(np.asarray(wav), sample_rate, reference_speaker)
+
+        kwargs = self._synth_kwargs(tts, lang, voice, reference_speaker)
+        if reference_speaker and is_xtts(tts):
+            conditioning = self._xtts_conditioning(tts, key, kwargs)
+            wav = self._infer(key, lambda: synth_xtts(tts, sentence, kwargs["language"], conditioning),
+                              cost=len(sentence))
+        else:
+            kwargs = self._cached_voice_kwargs(tts, key, kwargs)
+            wav = self._infer(key, lambda: tts.tts(sentence, **kwargs),
+                              batch=self._batch_spec(tts, sentence, kwargs), cost=len(sentence))
+        return np.asarray(wav, dtype=np.float32), sample_rate
+
+    def _infer(self, key: ModelKey, fn, batch: BatchSpec = None, cost: float = 0):
+        """run model code through the scheduler, with autograd disabled unless "inference_mode" is false
+
+        cost (characters of text) lets the scheduler estimate how long the call takes
+        """
+        if self.config.get("inference_mode", True):
+            return self._SCHEDULER.submit(key, lambda: run_inference(fn), batch, cost)
+        return self._SCHEDULER.submit(key, fn, batch, cost)
+
+    def scheduling(self, priority: int = None, deadline: float = None):
+        """context manager setting the priority (higher runs first) and deadline
+        (seconds from now) of the requests made by this thread
+
+            with tts.scheduling(priority=10, deadline=1.5):
+                tts.get_tts("ok", "/tmp/ok.wav")
+        """
+        return self._SCHEDULER.request(priority, deadline)
+
+    def _request_options(self) -> RequestOptions:
+        """the options set by the caller with scheduling(), or the "scheduling" config defaults"""
+        options = self._SCHEDULER.current()
+        if options is None:
+            cfg = self._config_section("scheduling")
+            deadline = cfg.get("deadline")
+            options = RequestOptions(cfg.get("priority", 0),
+                                     time.perf_counter() + deadline if deadline is not None else None)
+        return options
+
+    def _scheduling(self):
+        return self._SCHEDULER.bind(self._request_options())
+
+    def _with_fallback(self, lang: str, key: ModelKey, model_id: str, fn):
+        """call fn(key, model_id), with "on_overload": "fallback" a shed request
+        is served by the "fallback_model" instead (from the audio cache if possible)"""
+        try:
+            return fn(key, model_id)
+        except RequestRejected as e:
+            cfg = self._config_section("scheduling")
+            fallback = cfg.get("fallback_model")
+            if isinstance(fallback, dict):
+                fallback = fallback.get(lang) or fallback.get(lang.split("-")[0])
+            if cfg.get("on_overload", "reject") != "fallback" or not fallback or fallback == key.model:
+                raise
+            LOG.info(f"{key.model} overloaded ({e.reason}), using {fallback}")
+            self._METRICS.count("scheduler_fallbacks", model=key.model, fallback=fallback)
+            self._METRICS.tag("fallback", fallback)
+            return fn(self.get_model_key(lang, fallback), fallback)
+
+    @staticmethod
+    def _batch_spec(tts: "CTTS", sentence: str, kwargs: dict) -> BatchSpec:
+        """requests to the same VITS model with the same speaker and language can share a forward pass"""
+        if not is_vits(tts) or kwargs.get("speaker_wav"):
+            return None
+        speaker, language, voice_dir = kwargs.get("speaker"), kwargs.get("language"), kwargs.get("voice_dir")
+        return ((speaker, language, voice_dir),
+                lambda texts: synth_vits_batch(tts, texts, speaker, language, voice_dir),
+                sentence)
+
+    def _uses_freevc(self, reference_speaker: str = None) -> bool:
+        return bool(reference_speaker and self.config.get("use_freeVC"))
+
+    def _vc_key(self) -> ModelKey:
+        return ModelKey(FREEVC_MODEL, device="cuda" if self.config.get("gpu") else "cpu")
+
+    def _get_vc(self) -> "CTTS":
+        vc_key = self._vc_key()
+        return self._POOL.get(vc_key, lambda: self._load_model(vc_key))
+
+    def _output_sample_rate(self, tts: "CTTS", reference_speaker: str = None) -> int:
+        if self._uses_freevc(reference_speaker):
+            return freevc_sample_rate(self._get_vc())
+        return tts.synthesizer.output_sample_rate
+
+    def _freevc(self, wav: np.ndarray, sample_rate: int,
+                reference_speaker: str) -> Tuple[np.ndarray, int]:
+        """apply FreeVC voice conversion in memory, returns (float waveform, sample_rate)"""
+        vc, vc_key = self._get_vc(), self._vc_key()
+        target = self._SPEAKERS.get(FREEVC_MODEL, reference_speaker,
+                                    lambda ref: self._SCHEDULER.submit(vc_key, lambda: freevc_target_voice(vc, ref)),
+                                    vc_key.device)
+        with self._METRICS.stage("voice_conversion"):
+            converted = self._SCHEDULER.submit(vc_key, lambda: freevc_convert(vc, wav, sample_rate, target))
+        return converted, freevc_sample_rate(vc)
+
+    def _get_voice(self, tts: "CTTS", key: ModelKey, speaker_wav: str) -> dict:
+        def compute(wav: str) -> dict:
+            with self._METRICS.stage("speaker_embedding"):
+                return self._infer(key, lambda: compute_voice(tts, wav))
+
+        return self._SPEAKERS.get(key.model, speaker_wav, compute, key.device)
+
+    def _xtts_conditioning(self, tts: "CTTS", key: ModelKey, kwargs: dict) -> tuple:
+        if kwargs.get("speaker_wav"):
+            voice = self._get_voice(tts, key, kwargs["speaker_wav"])
+            return voice["gpt_conditioning_latents"], voice["speaker_embedding"]
+        return get_conditioning(tts, kwargs["speaker"])
+
+    def _cached_voice_kwargs(self, tts: "CTTS", key: ModelKey, kwargs: dict) -> dict:
+        """point coqui at the cached voice instead of the reference audio"""
+        speaker_wav = kwargs.get("speaker_wav")
+        if not speaker_wav or not supports_voice_cache(tts):
+            return kwargs
+        self._get_voice(tts, key, speaker_wav)
+        kwargs = dict(kwargs)
+        kwargs.pop("speaker_wav")
+        kwargs["speaker"] = self._SPEAKERS.voice_id(key.model, speaker_wav)
+        kwargs["voice_dir"] = self._SPEAKERS.cache_dir
+        return kwargs
+
+    def _iter_chunks(self, tts: "CTTS", key: ModelKey, sentence: str,
+                     lang: str, voice: str = None, reference_speaker: str = None,
+                     incremental: bool = True) -> Iterator[np.ndarray]:
+        """yield float waveform chunks, incrementally for XTTS models and
+        as a single chunk for everything else"""
+        if incremental and is_xtts(tts) and not self._uses_freevc(reference_speaker):
+            kwargs = self._synth_kwargs(tts, lang, voice, reference_speaker)
+            stream = stream_xtts(tts, sentence, kwargs["language"],
+                                 self._xtts_conditioning(tts, key, kwargs),
+                                 chunk_size=self.config.get("stream_chunk_size", 20),
+                                 overlap=self.config.get("stream_overlap", 1024))
+            while True:
+                # the model is only held while a chunk is generated, concurrent streams interleave
+                chunk = self._SCHEDULER.submit(key, lambda: next(stream, None))
+                if chunk is None:
+                    return
+                yield chunk
+        else:
+            yield self._synthesize(tts, key, sentence, lang, voice, reference_speaker)[0]
+
+    def _iter_audio(self, tts: "CTTS", key: ModelKey, sentence: str,
+                    lang: str, voice: str = None, reference_speaker: str = None,
+                    incremental: bool = True, split: bool = False) -> Iterator[np.ndarray]:
+        """yield float waveform chunks for sentence
+
+        with "pipeline" enabled the input is split into sentences that are
+        rendered ahead on a background thread, separated by "sentence_silence" seconds,
+        split=True splits the input the same way but renders one sentence at a time
+        """
+        record = self._METRICS.current()
+        # the deadline is met once audio starts flowing, later segments are not shed
+        request = self._request_options()
+        options = RequestOptions(request.priority, request.deadline)
+
+        def render(segment: str) -> Iterator[np.ndarray]:
+            with self._METRICS.bind(record), self._SCHEDULER.bind(options):  # may run on the pipeline thread
+                for chunk in self._iter_chunks(tts, key, segment, lang, voice,
+                                               reference_speaker, incremental):
+                    options.deadline = None
+                    yield chunk
+
+        segments = [sentence]
+        if self.config.get("pipeline") or split:
+            segments = split_sentences(sentence, lang, self.config.get("max_segment_chars", 250))
+        if len(segments) < 2:
+            yield from render(sentence)
+            return
+
+        sample_rate = self._output_sample_rate(tts, reference_speaker)
+        silence = np.zeros(int(sample_rate * self.config.get("sentence_silence", 0.2)),
+                           dtype=np.float32)
+        if self.config.get("pipeline"):
+            rendered = render_ahead(segments, render, self.config.get("pipeline_lookahead", 2))
+        else:
+            rendered = ((idx, chunk) for idx, segment in enumerate(segments) for chunk in render(segment))
+        current = 0
+        for idx, chunk in rendered:
+            if idx != current:
+                current = idx
+                yield silence
+            yield chunk
+
+    def stream_tts(self, sentence: str,
+                   lang: str = None, voice: str = None,
+                   reference_speaker: str = None,
+                   model_id: str = None) -> Iterator[bytes]:
+        """yield mono 16 bit PCM chunks as soon as they are synthesized
+
+        see get_sample_rate for the sample rate of the audio
+        """
+        return self._stream_pcm(sentence, lang, voice, reference_speaker, model_id)
+
+    def stream_tts_async(self, sentence: str,
+                         lang: str = None, voice: str = None,
+                         reference_speaker: str = None,
+                         model_id: str = None) -> AsyncIterator[bytes]:
+        """async iterator of mono 16 bit PCM chunks, see stream_tts
+
+        the input is always split into sentences, cancelling the consuming
+        task or closing the iterator stops synthesis at the next chunk
+        """
+        return iterate_cancellable(lambda: self._stream_pcm(sentence, lang, voice, reference_speaker,
+                                                            model_id, split=True))
+
+    def _stream_pcm(self, sentence: str,
+                    lang: str = None, voice: str = None,
+                    reference_speaker: str = None,
+                    model_id: str = None, split: bool = False) -> Iterator[bytes]:
+        lang = lang or self.lang
+        if self.worker:
+            yield from self.worker.stream("stream_tts", sentence=sentence, lang=lang, voice=voice,
+                                          reference_speaker=reference_speaker, model_id=model_id,
+                                          **self._worker_params(lang, model_id))
+            return
+        self.wait_until_ready()
+        key = self.get_model_key(lang, model_id)
+        tts = self.get_model(lang=lang, model=model_id)
+        reference_speaker = reference_speaker or self.config.get("reference_speaker")
+        chunks = self._iter_audio(tts, key, sentence, lang, voice, reference_speaker, split=split)
+        for chunk in self._METRICS.iterate(chunks, "stream_tts", self.__class__.__name__, key.model, lang,
+                                           self._output_sample_rate(tts, reference_speaker)):
+            yield to_pcm16(chunk)
+
+    def get_sample_rate(self, lang: str = None, model_id: str = None) -> int:
+        if self.worker:
+            return self._remote("get_sample_rate", lang or self.lang, model_id)[0]["sample_rate"]
+        tts = self.get_model(lang=lang, model=model_id)
+        return self._output_sample_rate(tts, self.config.get("reference_speaker"))
+
+    def _worker_params(self, lang: str, model_id: str = None) -> dict:
+        """what a pool worker needs to serve a request the way this instance would"""
+        return {"plugin_lang": self.lang,
+                "config": {k: v for k, v in self.config.items() if k != "worker"},
+                "model_key": self.get_model_key(lang, model_id).model}
+
+    def _remote(self, method: str, lang: str, model_id: str = None, **params) -> Tuple[dict, bytes]:
+        header, payload = self.worker.request(method, lang=lang, model_id=model_id,
+                                              **params, **self._worker_params(lang, model_id))
+        self.loader.mark_ready()
+        return header, payload
+
     @property
     def available_languages(self) -> set:
         """Return languages supported by this TTS implementation in this state
@@ -225,14 +932,93 @@ class CoquiXTTSPlugin(AbstractTTS):
         config = config or {}
         super().__init__(config=config, audio_ext='wav')
         self.default_model = self.config.get("model", "tts_models/multilingual/multi-dataset/xtts_v2")
-        self.model = CoquiTTSPlugin(config={"model": self.default_model, "lang": lang})
+        cfg = dict(self.config)
+        cfg["model"] = self.default_model
+        self.model = CoquiTTSPlugin(lang=lang, config=cfg)
+
+    @property
+    def load_state(self) -> str:
+        """one of 'unloaded', 'loading', 'ready' or 'error'"""
+        return self.model.load_state
+
+    @property
+    def is_ready(self) -> bool:
+        return self.model.is_ready
 
     def get_tts(self, sentence: str, wav_file: str,
-                lang: str = None, voice: str = None):
+                lang: str = None, voice: str = None,
+                reference_speaker: str = None):
+        lang = lang or self.lang
+        if standardize_lang_tag(lang) not in self.available_languages:
+            raise ValueError(f"{lang} is not supported for selected TTS, valid: {self.available_languages}")
+        return self.model.get_tts(sentence, wav_file, lang=lang, voice=voice,
+                                  reference_speaker=reference_speaker)
+
+    async def get_tts_async(self, sentence: str, wav_file: str,
+                            lang: str = None, voice: str = None,
+                            reference_speaker: str = None):
+        """get_tts without blocking the event loop, see CoquiTTSPlugin.get_tts_async"""
+        lang = lang or self.lang
+        if standardize_lang_tag(lang) not in self.available_languages:
+            raise ValueError(f"{lang} is not supported for selected TTS, valid: {self.available_languages}")
+        return await self.model.get_tts_async(sentence, wav_file, lang=lang, voice=voice,
+                                              reference_speaker=reference_speaker)
+
+    def stream_tts(self, sentence: str,
+                   lang: str = None, voice: str = None,
+                   reference_speaker: str = None) -> Iterator[bytes]:
+        """yield mono 16 bit PCM chunks as soon as they are synthesized"""
+        lang = lang or self.lang
+        if standardize_lang_tag(lang) not in self.available_languages:
+            raise ValueError(f"{lang} is not supported for selected TTS, valid: {self.available_languages}")
+        return self.model.stream_tts(sentence, lang=lang, voice=voice,
+                                     reference_speaker=reference_speaker)
+
+    def stream_tts_async(self, sentence: str,
+                         lang: str = None, voice: str = None,
+                         reference_speaker: str = None) -> AsyncIterator[bytes]:
+        """async iterator of mono 16 bit PCM chunks, see CoquiTTSPlugin.stream_tts_async"""
+        lang = lang or self.lang
+        if standardize_lang_tag(lang) not in self.available_languages:
+            raise ValueError(f"{lang} is not supported for selected TTS, valid: {self.available_languages}")
+        return self.model.stream_tts_async(sentence, lang=lang, voice=voice,
+                                           reference_speaker=reference_speaker)
+
+    def get_waveform(self, sentence: str,
+                     lang: str = None, voice: str = None,
+                     reference_speaker: str = None) -> Tuple[np.ndarray, int]:
+        """synthesize sentence in memory, returns (float waveform, sample_rate)"""
         lang = lang or self.lang
         if standardize_lang_tag(lang) not in self.available_languages:
             raise ValueError(f"{lang} is not supported for selected TTS, valid: {self.available_languages}")
-        return self.model.get_tts(sentence, wav_file, lang=lang, voice=voice)
+        return self.model.get_waveform(sentence, lang=lang, voice=voice,
+                                       reference_speaker=reference_speaker)
+
+    def get_audio(self, sentence: str,
+                  lang: str = None, voice: str = None,
+                  reference_speaker: str = None,
+                  audio_format: str = "pcm16",
+                  sample_rate: int = None) -> Tuple[AudioData, int]:
+        """synthesize sentence in memory, see CoquiTTSPlugin.get_audio"""
+        lang = lang or self.lang
+        if standardize_lang_tag(lang) not in self.available_languages:
+            raise ValueError(f"{lang} is not supported for selected TTS, valid: {self.available_languages}")
+        return self.model.get_audio(sentence, lang=lang, voice=voice,
+                                    reference_speaker=reference_speaker,
+                                    audio_format=audio_format, sample_rate=sample_rate)
+
+    def get_sample_rate(self, lang: str = None) -> int:
+        return self.model.get_sample_rate(lang)
+
+    def scheduling(self, priority: int = None, deadline: float = None):
+        """see CoquiTTSPlugin.scheduling"""
+        return self.model.scheduling(priority, deadline)
+
+    def prerender(self, sentences: Iterable[str], lang: str = None, voice: str = None,
+                  reference_speaker: str = None) -> int:
+        """see CoquiTTSPlugin.prerender"""
+        return self.model.prerender(sentences, lang=lang or self.lang, voice=voice,
+                                    reference_speaker=reference_speaker)
 
     @property
     def available_languages(self) -> set:
@@ -263,22 +1049,161 @@ class CoquiFreeVCTTS(AbstractTTS):
             raise ValueError(f"{tts_module} failed to load, is it installed?")
         tts_config = Configuration().get("tts", {}).get(tts_module) or {}
         tts_config.update(self.config)
+        tts_config["audio_cache"] = False  # only the converted audio is cached
         self.model: AbstractTTS = clazz(lang=lang, config=tts_config)
+        self.tts_module = tts_module
+        self.audio_cache = AudioCache.from_config(self.config.get("audio_cache"))
+        self.audio_encoder = AudioEncoder.from_config(self.config.get("audio_output"))
         LOG.info(f"FreeVC base TTS: {tts_module} - {clazz} - {tts_config}")
-        self.vc = CTTS(model_name="voice_conversion_models/multilingual/vctk/freevc24")
-        if self.config.get("gpu"):
-            self.vc.to("cuda")
+        self.vc_key = ModelKey(FREEVC_MODEL, device="cuda" if self.config.get("gpu") else "cpu")
+        self.loader = ModelLoader(self.__class__.__name__)
+        if self.config.get("warmup"):
+            self.loader.run(self.get_target_voice, background=True)
+        elif self.config.get("preload", True):
+            self.loader.run(self.get_target_voice)
+
+    @property
+    def vc(self) -> "CTTS":
+        """voice conversion model, from the shared model pool"""
+        vc = CoquiTTSPlugin._POOL.get(self.vc_key, lambda: CoquiTTSPlugin._load_model(self.vc_key))
+        self.loader.mark_ready()
+        return vc
+
+    @property
+    def load_state(self) -> str:
+        """one of 'unloaded', 'loading', 'ready' or 'error'"""
+        return self.loader.state
+
+    @property
+    def is_ready(self) -> bool:
+        return self.loader.is_ready and getattr(self.model, "is_ready", True)
+
+    def scheduling(self, priority: int = None, deadline: float = None):
+        """see CoquiTTSPlugin.scheduling, applies to the base TTS and to the voice conversion"""
+        return CoquiTTSPlugin._SCHEDULER.request(priority, deadline)
+
+    def get_target_voice(self) -> dict:
+        """embedding of reference_speaker, computed once and cached"""
+        vc = self.vc
+        return CoquiTTSPlugin._SPEAKERS.get(
+            self.vc_key.model, self.reference_wav,
+            lambda ref: CoquiTTSPlugin._SCHEDULER.submit(self.vc_key, lambda: freevc_target_voice(vc, ref)),
+            self.vc_key.device)
+
+    def get_cache_key(self, sentence: str, lang: str = None, voice: str = None) -> str:
+        """audio cache key of the base TTS request plus the voice conversion model and target voice"""
+        lang = lang or self.lang
+        voice = voice or self.voice
+        if isinstance(self.model, CoquiTTSPlugin):
+            # the base plugin synthesizes with its own configured reference, see CoquiTTSPlugin._get_waveform
+            base = self.model.get_cache_key(sentence, lang, voice, self.model.config.get("reference_speaker"))
+        else:
+            base = AudioCache.make_key(text=sentence, model=self.tts_module, lang=lang.split("-")[0],
+                                       voice=voice, settings=self.model.config)
+        return AudioCache.make_key(base=base,
+                                   vc=self.vc_key.model,
+                                   reference=file_hash(self.reference_wav))
 
     def get_tts(self, sentence: str, wav_file: str,
                 lang: str = None, voice: str = None):
-        tmp = wav_file.replace(".wav", "_original.wav")
-        voice = voice or self.voice
-        tmp, phonemes = self.model.get_tts(sentence, tmp, lang=lang, voice=voice)
-        self.vc.voice_conversion_to_file(source_wav=tmp,
-                                         target_wav=self.reference_wav,
-                                         file_path=wav_file)
+        with CoquiTTSPlugin._METRICS.request("get_tts", self.__class__.__name__,
+                                             self.vc_key.model, lang or self.lang):
+            return self._get_tts(sentence, wav_file, lang, voice)
+
+    def _get_tts(self, sentence: str, wav_file: str,
+                 lang: str = None, voice: str = None):
+        metrics = CoquiTTSPlugin._METRICS
+        cache_key = None
+        if self.audio_cache:
+            cache_key = self.get_cache_key(sentence, lang, voice)
+            with metrics.stage("cache_lookup"):
+                hit = self.audio_cache.get(cache_key, wav_file)
+            metrics.count("audio_cache", result="hit" if hit else "miss")
+            metrics.tag("cache", "hit" if hit else "miss")
+            if hit:
+                return wav_file, None
+        wav, sample_rate, phonemes = self._convert(sentence, lang, voice)
+        metrics.add_audio(len(wav) / sample_rate)
+        with metrics.stage("write"):
+            FileSink(wav_file, "wav").write(wav, sample_rate)
+        if cache_key:
+            self.audio_cache.put(cache_key, wav_file)
         return wav_file, phonemes
 
+    async def get_tts_async(self, sentence: str, wav_file: str,
+                            lang: str = None, voice: str = None):
+        """get_tts without blocking the event loop
+
+        sentences are converted one at a time, cancelling the task stops at
+        the next sentence and leaves no partial file behind
+        """
+        return await run_cancellable(lambda cancel: self._get_tts_cancellable(cancel, sentence, wav_file,
+                                                                              lang, voice))
+
+    def _get_tts_cancellable(self, cancel, sentence: str, wav_file: str,
+                             lang: str = None, voice: str = None):
+        lang = lang or self.lang
+        cache_key = None
+        if self.audio_cache:
+            cache_key = self.get_cache_key(sentence, lang, voice)
+            if self.audio_cache.get(cache_key, wav_file):
+                return wav_file, None
+        sample_rate = freevc_sample_rate(self.vc)
+        silence = np.zeros(int(sample_rate * self.config.get("sentence_silence", 0.2)), dtype=np.float32)
+
+        def render() -> Iterator[np.ndarray]:
+            segments = split_sentences(sentence, lang, self.config.get("max_segment_chars", 250))
+            for idx, segment in enumerate(segments):
+                if idx:
+                    yield silence
+                yield self._convert(segment, lang, voice)[0]
+
+        # same output as get_tts, the whole utterance is peak normalized and written at once
+        wav = collect_chunks(render(), cancel)
+        FileSink(wav_file, "wav").write(wav, sample_rate)
+        if cache_key:
+            self.audio_cache.put(cache_key, wav_file)
+        return wav_file, None
+
+    def get_waveform(self, sentence: str, lang: str = None,
+                     voice: str = None) -> Tuple[np.ndarray, int]:
+        """synthesize sentence in memory, returns (float waveform, sample_rate)"""
+        with CoquiTTSPlugin._METRICS.request("get_waveform", self.__class__.__name__,
+                                             self.vc_key.model, lang or self.lang):
+            wav, sample_rate, _ = self._convert(sentence, lang, voice)
+            CoquiTTSPlugin._METRICS.add_audio(len(wav) / sample_rate)
+            return wav, sample_rate
+
+    def get_audio(self, sentence: str, lang: str = None, voice: str = None,
+                  audio_format: str = "pcm16", sample_rate: int = None) -> Tuple[AudioData, int]:
+        """synthesize sentence in memory, see CoquiTTSPlugin.get_audio"""
+        sink = AudioSink(audio_format, sample_rate, self.audio_encoder)
+        with CoquiTTSPlugin._METRICS.request("get_audio", self.__class__.__name__,
+                                             self.vc_key.model, lang or self.lang):
+            wav, sr, _ = self._convert(sentence, lang, voice)
+            CoquiTTSPlugin._METRICS.add_audio(len(wav) / sr)
+            with CoquiTTSPlugin._METRICS.stage("encode"):
+                return sink.write(wav, sr)
+
+    def _convert(self, sentence: str, lang: str = None, voice: str = None):
+        self.loader.wait(self.config.get("warmup_timeout"))
+        voice = voice or self.voice
+        phonemes = None
+        if hasattr(self.model, "get_waveform"):
+            # fast path, base plugin can synthesize in memory
+            wav, sample_rate = self.model.get_waveform(sentence, lang=lang, voice=voice)
+        else:
+            with tempfile.TemporaryDirectory() as tmpdir:
+                tmp = os.path.join(tmpdir, f"original.{self.model.audio_ext}")
+                tmp, phonemes = self.model.get_tts(sentence, tmp, lang=lang, voice=voice)
+                wav, sample_rate = load_audio(tmp)
+        vc = self.vc
+        target = self.get_target_voice()
+        with CoquiTTSPlugin._METRICS.stage("voice_conversion"):
+            converted = CoquiTTSPlugin._SCHEDULER.submit(self.vc_key,
+                                                         lambda: freevc_convert(vc, wav, sample_rate, target))
+        return converted, freevc_sample_rate(vc), phonemes
+
     @property
     def available_languages(self) -> set:
         """Return languages supported by this TTS implementation in this state
@@ -376,28 +1301,81 @@ class CoquiFairSeqTTSPlugin(AbstractTTS):
         'sah', 'yba', 'yli', 'nlk', 'yal', 'yam', 'yat', 'jmd', 'tao', 'yaa', 'ame', 'zpo', 'zad', 'zpc', 'zca', 'zpg',
         'zai', 'zpl', 'zam', 'zaw', 'zpm', 'zac', 'zao', 'ztq', 'zar', 'zpt', 'zpi', 'zas', 'zaa', 'zpz', 'zab', 'zpu',
         'zae', 'zty', 'zav', 'zza', 'zyb', 'ziw', 'zos', 'gnd', 'ewe']
-    _MODELS = {}
 
     def __init__(self, lang="en-us", config=None):
         super().__init__(config=config, audio_ext='wav')
+        self._engine = None
+        if self.config.get("warmup"):
+            self._engine = self._create_engine()
 
-    def get_model(self, lang: str = None) -> CoquiTTSPlugin:
-        lang = lang or self.lang
+    @staticmethod
+    def _lang2model(lang: str) -> str:
         norm_l = str(Language.get(lang).to_alpha3())
-        if norm_l not in self._MODELS:
-            cfg = dict(self.config)
-            cfg["lang"] = lang
-            cfg["model"] = f"tts_models/{norm_l}/fairseq/vits"
-            self._MODELS[norm_l] = CoquiTTSPlugin(lang=lang, config=cfg)
-        return self._MODELS[norm_l]
+        return f"tts_models/{norm_l}/fairseq/vits"
+
+    def _create_engine(self) -> CoquiTTSPlugin:
+        cfg = dict(self.config)
+        cfg["model"] = self._lang2model(self.lang)
+        cfg["preload"] = False  # loaded per language on demand, cached audio needs no model
+        return CoquiTTSPlugin(lang=self.lang, config=cfg)
+
+    @property
+    def engine(self) -> CoquiTTSPlugin:
+        """CoquiTTSPlugin instance drawing the fairseq models from the shared model pool"""
+        if self._engine is None:
+            self._engine = self._create_engine()
+        return self._engine
+
+    @property
+    def load_state(self) -> str:
+        """one of 'unloaded', 'loading', 'ready' or 'error'"""
+        if self._engine is None:
+            return LoadState.UNLOADED
+        return self._engine.load_state
+
+    @property
+    def is_ready(self) -> bool:
+        return self._engine is not None and self._engine.is_ready
+
+    def get_model(self, lang: str = None) -> "CTTS":
+        lang = lang or self.lang
+        return self.engine.get_model(lang, model=self._lang2model(lang))
+
+    def scheduling(self, priority: int = None, deadline: float = None):
+        """see CoquiTTSPlugin.scheduling"""
+        return self.engine.scheduling(priority, deadline)
+
+    def prerender(self, sentences: Iterable[str], lang: str = None, voice: str = None) -> int:
+        """see CoquiTTSPlugin.prerender"""
+        lang = lang or self.lang
+        return self.engine.prerender(sentences, lang=lang, model_id=self._lang2model(lang))
 
     def get_tts(self, sentence: str, wav_file: str,
                 lang: str = None, voice: str = None):
         lang = lang or self.lang
-        norm_l = str(Language.get(lang).to_alpha3())
-        model = self.get_model(lang)
-        return model.get_tts(sentence, wav_file, lang=lang,
-                             model_id=f"tts_models/{norm_l}/fairseq/vits")
+        return self.engine.get_tts(sentence, wav_file, lang=lang,
+                                   model_id=self._lang2model(lang))
+
+    async def get_tts_async(self, sentence: str, wav_file: str,
+                            lang: str = None, voice: str = None):
+        """get_tts without blocking the event loop, see CoquiTTSPlugin.get_tts_async"""
+        lang = lang or self.lang
+        return await self.engine.get_tts_async(sentence, wav_file, lang=lang,
+                                               model_id=self._lang2model(lang))
+
+    def get_waveform(self, sentence: str, lang: str = None,
+                     voice: str = None) -> Tuple[np.ndarray, int]:
+        """synthesize sentence in memory, returns (float waveform, sample_rate)"""
+        lang = lang or self.lang
+        return self.engine.get_waveform(sentence, lang=lang,
+                                        model_id=self._lang2model(lang))
+
+    def get_audio(self, sentence: str, lang: str = None, voice: str = None,
+                  audio_format: str = "pcm16", sample_rate: int = None) -> Tuple[AudioData, int]:
+        """synthesize sentence in memory, see CoquiTTSPlugin.get_audio"""
+        lang = lang or self.lang
+        return self.engine.get_audio(sentence, lang=lang, model_id=self._lang2model(lang),
+                                     audio_format=audio_format, sample_rate=sample_rate)
 
     @property
     def available_languages(self) -> set:
@@ -0,0 +1,109 @@
+import asyncio
+import os
+import threading
+import uuid
+from typing import AsyncIterator, Callable, Iterator, TypeVar
+
+import numpy as np
+
+from ovos_tts_plugin_coqui.audio import WavStreamWriter
+
+T = TypeVar("T")
+
+_END = object()
+
+
+class SynthesisCancelled(Exception):
+    """synthesis was stopped because the request was cancelled"""
+
+
+async def run_cancellable(fn: Callable[[threading.Event], T]) -> T:
+    """run fn(cancel) on a worker thread without blocking the event loop
+
+    cancelling the awaiting task sets the cancel event and waits for fn
+    to return, so whatever fn was holding (models, files) is released
+    before the cancellation propagates
+    """
+    loop = asyncio.get_running_loop()
+    cancel = threading.Event()
+    future = loop.run_in_executor(None, fn, cancel)
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        cancel.set()
+        await asyncio.wait([future])
+        if not future.cancelled():
+            future.exception()  # retrieved, the task is cancelled either way
+        raise
+
+
+async def iterate_cancellable(make_iterator: Callable[[], Iterator[T]]) -> AsyncIterator[T]:
+    """consume a blocking iterator on a worker thread, one item at a time
+
+    cancelling the consuming task (or closing the async iterator) waits
+    for the item being produced and then closes the iterator, so
+    production stops at the next item boundary
+    """
+    loop = asyncio.get_running_loop()
+    iterator = make_iterator()
+    future = None
+    try:
+        while True:
+            future = loop.run_in_executor(None, next, iterator, _END)
+            item = await asyncio.shield(future)
+            if item is _END:
+                return
+            yield item
+    finally:
+        if future is not None and not future.done():
+            await asyncio.wait([future])
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            await loop.run_in_executor(None, close)
+
+
+def write_chunks(chunks: Iterator[np.ndarray], sample_rate: int, wav_file: str,
+                 cancel: threading.Event = None) -> int:
+    """write float waveform chunks to wav_file, returns the number of samples
+
+    audio goes to a temporary file that only replaces wav_file once
+    complete, if cancel is set synthesis stops at the next chunk and
+    SynthesisCancelled is raised without leaving a partial file behind
+    """
+    tmp = f"{wav_file}.{uuid.uuid4().hex[:8]}.part"
+    samples = 0
+    try:
+        with WavStreamWriter(tmp, sample_rate) as f:
+            for chunk in chunks:
+                if cancel is not None and cancel.is_set():
+                    raise SynthesisCancelled(wav_file)
+                f.write(chunk)
+                samples += len(chunk)
+        if cancel is not None and cancel.is_set():
+            raise SynthesisCancelled(wav_file)
+        os.replace(tmp, wav_file)
+        return samples
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def collect_chunks(chunks: Iterator[np.ndarray], cancel: threading.Event = None) -> np.ndarray:
+    """concatenate float waveform chunks, if cancel is set synthesis stops
+    at the next chunk and SynthesisCancelled is raised"""
+    wav = []
+    try:
+        for chunk in chunks:
+            if cancel is not None and cancel.is_set():
+                raise SynthesisCancelled()
+            wav.append(np.asarray(chunk, dtype=np.float32))
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+    if cancel is not None and cancel.is_set():
+        raise SynthesisCancelled()
+    return np.concatenate(wav) if wav else np.zeros(0, dtype=np.float32)
@@ -0,0 +1,68 @@
+import wave
+
+import numpy as np
+
+
+def to_pcm16(wav) -> bytes:
+    """convert a float waveform in the [-1, 1] range to 16 bit little endian PCM"""
+    wav = np.clip(np.asarray(wav, dtype=np.float32), -1.0, 1.0)
+    return (wav * 32767).astype("<i2").tobytes()
+
+
+def normalize(wav) -> np.ndarray:
+    """peak normalize a float waveform like coqui does before saving"""
+    wav = np.asarray(wav, dtype=np.float32)
+    peak = max(0.01, float(np.max(np.abs(wav)))) if wav.size else 1.0
+    return wav / peak
+
+
+def resample(wav, orig_sr: int, target_sr: int) -> np.ndarray:
+    """resample a float waveform, a no-op if the rates match"""
+    wav = np.asarray(wav, dtype=np.float32)
+    if orig_sr == target_sr or not wav.size:
+        return wav
+    import librosa
+    return librosa.resample(wav, orig_sr=orig_sr, target_sr=target_sr).astype(np.float32)
+
+
+def save_wav(wav, sample_rate: int, path: str):
+    """save a float waveform as a mono 16 bit wav file, peak normalized like coqui does"""
+    with WavStreamWriter(path, sample_rate) as f:
+        f.write(normalize(wav))
+
+
+class WavStreamWriter:
+    """Writes a mono 16 bit wav file incrementally
+
+    the header is patched after every write, so readers can
+    start consuming the file before synthesis is finished
+    """
+
+    def __init__(self, path: str, sample_rate: int):
+        self.path = path
+        self.sample_rate = sample_rate
+        self._f = wave.open(path, "wb")
+        self._f.setnchannels(1)
+        self._f.setsampwidth(2)
+        self._f.setframerate(sample_rate)
+
+    def write(self, wav):
+        self._f.writeframes(to_pcm16(wav))
+
+    def write_pcm(self, pcm: bytes):
+        self._f.writeframes(pcm)
+
+    def close(self):
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def load_audio(path: str):
+    """read any audio file supported by librosa, returns (float waveform, sample_rate)"""
+    import librosa
+    return librosa.load(path, sr=None, mono=True)
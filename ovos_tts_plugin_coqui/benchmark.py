@@ -0,0 +1,274 @@
+"""Offline benchmark of the coqui plugins
+
+reports model load time, real time factor, time to first audio, peak
+memory and throughput with concurrent callers for several text lengths,
+results are printed as JSON so runs can be compared between releases
+
+by default a tiny randomly initialized VITS checkpoint is created and
+loaded from disk, so no model is downloaded and no network is needed,
+the xtts and freevc targets download their models
+
+every plugin is measured in its own spawned process, so load time and
+peak memory are not skewed by the plugins measured before it
+
+    ovos-coqui-benchmark --concurrency 1 4 --output results.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, List, Tuple
+
+from ovos_tts_plugin_coqui.version import VERSION_ALPHA, VERSION_BUILD, VERSION_MAJOR, VERSION_MINOR
+
+CORPUS = ("The quick brown fox jumps over the lazy dog. "
+          "It took me a long time to have a voice, now that I have it I am not going to be silent. "
+          "Open Voice OS is a community powered voice assistant that runs on your own hardware. "
+          "Please remember to water the plants while I am away this weekend. "
+          "The weather tomorrow will be mostly sunny with a light breeze in the afternoon. ")
+
+BUCKETS = {"short": 30, "medium": 120, "long": 480}
+
+PLUGINS = ("coqui", "xtts", "fairseq", "freevc")
+
+XTTS_MODEL = "tts_models/multilingual/multi-dataset/xtts_v2"
+
+
+def make_text(n_chars: int) -> str:
+    """text of about n_chars characters, cut at a word boundary"""
+    text = CORPUS * (n_chars // len(CORPUS) + 1)
+    cut = text.rfind(" ", 0, n_chars + 1)
+    return text[:cut if cut > 0 else n_chars].strip()
+
+
+def create_random_vits(folder: str, seed: int = 0) -> Tuple[str, str]:
+    """save a tiny randomly initialized VITS model, returns (checkpoint path, config path)
+
+    the model produces noise but runs the same code paths as a real VITS checkpoint
+    """
+    import torch
+    from TTS.tts.configs.vits_config import VitsConfig
+    from TTS.tts.models.vits import Vits, VitsArgs
+
+    torch.manual_seed(seed)
+    os.makedirs(folder, exist_ok=True)
+    config = VitsConfig(
+        text_cleaner="basic_cleaners",
+        use_phonemes=False,
+        model_args=VitsArgs(hidden_channels=32,
+                            hidden_channels_ffn_text_encoder=64,
+                            num_layers_text_encoder=1,
+                            num_layers_posterior_encoder=1,
+                            num_layers_flow=1,
+                            upsample_initial_channel_decoder=32,
+                            resblock_kernel_sizes_decoder=[3],
+                            resblock_dilation_sizes_decoder=[[1, 3]],
+                            init_discriminator=False))
+    model = Vits.init_from_config(config)
+    model_path = os.path.join(folder, "model.pth")
+    config_path = os.path.join(folder, "model_config.json")
+    torch.save({"model": model.state_dict()}, model_path)
+    model.config.save_json(config_path)
+    return model_path, config_path
+
+
+def peak_rss_mb() -> float:
+    """peak resident memory of this process so far, each target runs in a fresh process"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024  # bytes on macOS, KB elsewhere
+
+
+class Target:
+    """how to create, load and query one plugin"""
+
+    def __init__(self, name: str, create: Callable[[], object], load: Callable[[object], None],
+                 synth: Callable[[object, str], Tuple[object, int]],
+                 stream: Callable[[object, str], object] = None):
+        self.name = name
+        self.create = create
+        self.load = load
+        self.synth = synth
+        self.stream = stream
+
+
+def build_targets(names: List[str], model: str, model_config: str, lang: str,
+                  config: dict, work_dir: str, xtts_model: str = XTTS_MODEL) -> Dict[str, Target]:
+    from ovos_tts_plugin_coqui import CoquiFairSeqTTSPlugin, CoquiFreeVCTTS, CoquiTTSPlugin, CoquiXTTSPlugin
+
+    # audio cache off, every request must be synthesized
+    base = dict(config, model=model, model_config=model_config, audio_cache=False)
+
+    class LocalFairSeq(CoquiFairSeqTTSPlugin):
+        """the fairseq plugin reading every language from the local checkpoint"""
+
+        @staticmethod
+        def _lang2model(lang: str) -> str:
+            return model
+
+    def lang_for(plugin) -> str:
+        """the xtts plugin only accepts bare language codes"""
+        return lang.split("-")[0] if isinstance(plugin, CoquiXTTSPlugin) else lang
+
+    def waveform(plugin, text):
+        return plugin.get_waveform(text, lang=lang_for(plugin))
+
+    def stream(plugin, text):
+        return plugin.stream_tts(text, lang=lang_for(plugin))
+
+    targets = {
+        "coqui": Target("coqui", lambda: CoquiTTSPlugin(lang=lang, config=dict(base)),
+                        lambda p: p.get_model(), waveform, stream),
+        # a real XTTS checkpoint, the VITS model under test can not stand in for it
+        "xtts": Target("xtts", lambda: CoquiXTTSPlugin(lang=lang, config=dict(base, model=xtts_model,
+                                                                              model_config=None)),
+                       lambda p: p.model.get_model(), waveform, stream),
+        "fairseq": Target("fairseq", lambda: LocalFairSeq(lang=lang, config=dict(base)),
+                          lambda p: p.get_model(), waveform),
+    }
+    if "freevc" in names:
+        reference = os.path.join(work_dir, "reference.wav")
+        CoquiTTSPlugin(lang=lang, config=dict(base)).get_tts(make_text(BUCKETS["medium"]), reference)
+        targets["freevc"] = Target("freevc",
+                                   lambda: CoquiFreeVCTTS(lang=lang, config=dict(base, reference_speaker=reference)),
+                                   lambda p: p.get_target_voice(), waveform)
+    return {n: targets[n] for n in names}
+
+
+def bench_target(target: Target, repeats: int, concurrency: List[int]) -> dict:
+    from ovos_tts_plugin_coqui import CoquiTTSPlugin
+    CoquiTTSPlugin._POOL.clear()  # measure a cold load
+
+    start = time.perf_counter()
+    plugin = target.create()
+    target.load(plugin)
+    result = {"plugin": target.name,
+              "load_time_s": time.perf_counter() - start,
+              "peak_rss_mb_after_load": peak_rss_mb(),
+              "buckets": {},
+              "throughput": []}
+
+    target.synth(plugin, make_text(BUCKETS["short"]))  # warmup, not measured
+    for bucket, n_chars in BUCKETS.items():
+        text = make_text(n_chars)
+        rtfs, ttfas, times, durations = [], [], [], []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            wav, sample_rate = target.synth(plugin, text)
+            elapsed = time.perf_counter() - start
+            duration = len(wav) / sample_rate
+            times.append(elapsed)
+            durations.append(duration)
+            rtfs.append(elapsed / duration if duration else float("inf"))
+            if target.stream:
+                start = time.perf_counter()
+                chunks = iter(target.stream(plugin, text))
+                next(chunks, None)
+                ttfas.append(time.perf_counter() - start)
+                for _ in chunks:
+                    pass
+            else:  # no streaming, the first audio is the whole utterance
+                ttfas.append(elapsed)
+        result["buckets"][bucket] = {"chars": len(text),
+                                     "synth_time_s": statistics.mean(times),
+                                     "audio_s": statistics.mean(durations),
+                                     "rtf": statistics.mean(rtfs),
+                                     "rtf_max": max(rtfs),
+                                     "ttfa_s": statistics.mean(ttfas)}
+
+    text = make_text(BUCKETS["medium"])
+    for callers in concurrency:
+        n_requests = callers * repeats
+        start = time.perf_counter()
+        with ThreadPoolExecutor(callers) as pool:
+            outputs = list(pool.map(lambda _: target.synth(plugin, text), range(n_requests)))
+        wall = time.perf_counter() - start
+        audio = sum(len(wav) / sr for wav, sr in outputs)
+        result["throughput"].append({"callers": callers,
+                                     "requests": n_requests,
+                                     "wall_s": wall,
+                                     "requests_per_s": n_requests / wall,
+                                     "audio_s_per_s": audio / wall})
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def _bench_in_process(name: str, model: str, model_config: str, lang: str, config: dict,
+                      work_dir: str, xtts_model: str, repeats: int, concurrency: List[int]) -> dict:
+    """benchmark one plugin, runs in a spawned process"""
+    target = build_targets([name], model, model_config, lang, config, work_dir, xtts_model)[name]
+    return bench_target(target, repeats, concurrency)
+
+
+def run_benchmark(plugins: List[str] = ("coqui", "fairseq"), model: str = None,
+                  model_config: str = None, lang: str = "en-us", repeats: int = 3,
+                  concurrency: List[int] = (1, 4), config: dict = None,
+                  work_dir: str = None, xtts_model: str = XTTS_MODEL) -> dict:
+    """run the benchmark and return the report as a dict"""
+    work_dir = work_dir or tempfile.mkdtemp(prefix="coqui-bench-")
+    if not model:
+        model, model_config = create_random_vits(os.path.join(work_dir, "random_vits"))
+    report = {"meta": {"plugin_version": f"{VERSION_MAJOR}.{VERSION_MINOR}.{VERSION_BUILD}"
+                                         + (f"a{VERSION_ALPHA}" if VERSION_ALPHA else ""),
+                       "model": model,
+                       "xtts_model": xtts_model if "xtts" in plugins else None,
+                       "lang": lang,
+                       "repeats": repeats,
+                       "python": platform.python_version(),
+                       "platform": platform.platform(),
+                       "cpu_count": os.cpu_count(),
+                       "config": config or {}},
+              "results": []}
+    try:
+        import torch
+        report["meta"]["torch"] = torch.__version__
+        report["meta"]["torch_threads"] = torch.get_num_threads()
+    except ImportError:
+        pass
+
+    ctx = multiprocessing.get_context("spawn")  # a clean interpreter per plugin, torch does not survive fork
+    for name in plugins:
+        try:
+            with ProcessPoolExecutor(1, mp_context=ctx) as pool:
+                report["results"].append(pool.submit(_bench_in_process, name, model, model_config, lang,
+                                                     config or {}, work_dir, xtts_model, repeats,
+                                                     list(concurrency)).result())
+        except Exception as e:
+            report["results"].append({"plugin": name, "error": f"{e.__class__.__name__}: {e}"})
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark the coqui tts plugins")
+    parser.add_argument("--plugins", nargs="+", choices=PLUGINS, default=["coqui", "fairseq"],
+                        help="plugins to benchmark, xtts and freevc download their models")
+    parser.add_argument("--model", help="model id or checkpoint path, a random VITS model is used by default")
+    parser.add_argument("--model-config", help="config of a checkpoint passed with --model")
+    parser.add_argument("--xtts-model", default=XTTS_MODEL, help="XTTS model id used by the xtts plugin")
+    parser.add_argument("--lang", default="en-us")
+    parser.add_argument("--repeats", type=int, default=3, help="runs per text length")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4],
+                        help="number of concurrent callers for the throughput test")
+    parser.add_argument("--config", default="{}", help="extra plugin config as a JSON string")
+    parser.add_argument("--work-dir", help="where the random model and temporary files are written")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.plugins, args.model, args.model_config, args.lang, args.repeats,
+                           args.concurrency, json.loads(args.config), args.work_dir, args.xtts_model)
+    data = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(data)
+    else:
+        print(data)
+
+
+if __name__ == "__main__":
+    main()
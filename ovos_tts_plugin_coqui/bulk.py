@@ -0,0 +1,263 @@
+"""Bulk offline rendering of a manifest of prompts
+
+renders every line of a jsonl or csv manifest with the fields
+
+- "text" - what to say (required)
+- "output" - audio file to write, the extension picks the format (required)
+- "lang", "voice", "reference_speaker", "model" - optional, per line
+
+work is grouped by model and spread over a process pool, each worker
+process keeps its models loaded for the whole run, finished lines are
+recorded in a checkpoint file so an interrupted run resumes where it
+stopped, outputs rendered by a previous run with the same settings are
+skipped
+
+    ovos-coqui-render prompts.jsonl --plugin fairseq --workers 4
+"""
+import argparse
+import csv
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from ovos_utils.log import LOG
+
+from ovos_tts_plugin_coqui.output import ENCODED_FORMATS, RAW_FORMATS, FileSink
+
+PLUGINS = ("coqui", "xtts", "fairseq")
+
+# set in each worker process by _init_worker
+_ENGINE = None
+_RESOLVE = None
+
+
+class ManifestItem:
+    def __init__(self, idx: int, row: dict, base_dir: str):
+        self.idx = idx
+        self.id = str(row.get("id") or idx)
+        self.text = row["text"]
+        self.lang = row.get("lang") or None
+        self.voice = row.get("voice") or None
+        self.reference_speaker = row.get("reference_speaker") or None
+        self.model = row.get("model") or None
+        output = os.path.expanduser(row["output"])
+        self.output = output if os.path.isabs(output) else os.path.join(base_dir, output)
+        self.group: Optional[str] = None
+        self.signature: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        return {"id": self.id, "text": self.text, "lang": self.lang, "voice": self.voice,
+                "reference_speaker": self.reference_speaker, "model": self.model, "output": self.output}
+
+
+def output_format(path: str) -> Optional[str]:
+    """audio format of an output file from its extension, None if not supported"""
+    ext = os.path.splitext(path)[1].lstrip(".").lower()
+    if ext in ("float32", "pcm16") or ext not in RAW_FORMATS + ENCODED_FORMATS:
+        return None
+    return ext
+
+
+def read_manifest(path: str, output_dir: str = None) -> List[ManifestItem]:
+    """parse a jsonl or csv manifest, relative outputs are resolved against output_dir (default: the manifest folder)"""
+    base_dir = output_dir or os.path.dirname(os.path.abspath(path))
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.endswith(".csv"):
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f if line.strip()]
+    items = []
+    for idx, row in enumerate(rows):
+        if not row.get("text") or not row.get("output"):
+            raise ValueError(f"{path} line {idx + 1}: 'text' and 'output' are required")
+        if output_format(row["output"]) is None:
+            raise ValueError(f"{path} line {idx + 1}: unsupported output format {row['output']}")
+        items.append(ManifestItem(idx, row, base_dir))
+    return items
+
+
+def create_plugin(plugin: str, lang: str, config: dict):
+    from ovos_tts_plugin_coqui import CoquiFairSeqTTSPlugin, CoquiTTSPlugin, CoquiXTTSPlugin
+    config = dict(config, preload=False)
+    if plugin == "xtts":
+        return CoquiXTTSPlugin(lang=lang, config=config)
+    if plugin == "fairseq":
+        return CoquiFairSeqTTSPlugin(lang=lang, config=config)
+    return CoquiTTSPlugin(lang=lang, config=config)
+
+
+def engine_of(plugin):
+    """the CoquiTTSPlugin doing the synthesis, and a function returning the model_id of an item"""
+    from ovos_tts_plugin_coqui import CoquiFairSeqTTSPlugin, CoquiXTTSPlugin
+    if isinstance(plugin, CoquiXTTSPlugin):
+        return plugin.model, lambda item: item.model
+    if isinstance(plugin, CoquiFairSeqTTSPlugin):
+        return plugin.engine, lambda item: item.model or plugin._lang2model(item.lang or plugin.lang)
+    return plugin, lambda item: item.model
+
+
+class Checkpoint:
+    """append only record of the rendered outputs and the request they were rendered from"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done: Dict[str, str] = {}  # output -> signature
+        if os.path.isfile(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line of an interrupted run
+                    self.done[entry["output"]] = entry["signature"]
+        self._f = open(path, "a", encoding="utf-8")
+
+    def is_done(self, item: ManifestItem) -> bool:
+        return self.done.get(item.output) == item.signature and os.path.isfile(item.output)
+
+    def add(self, item: ManifestItem):
+        self.done[item.output] = item.signature
+        self._f.write(json.dumps({"id": item.id, "output": item.output, "signature": item.signature}) + "\n")
+        self._f.flush()
+
+    def close(self):
+        self._f.close()
+
+
+def _init_worker(plugin: str, lang: str, config: dict):
+    global _ENGINE, _RESOLVE
+    _ENGINE, _RESOLVE = engine_of(create_plugin(plugin, lang, config))
+
+
+def _render_batch(batch: List[Tuple[int, dict]],
+                  sample_rate: int = None) -> List[Tuple[int, float, Optional[str]]]:
+    """render items in a worker process, returns (idx, audio seconds, error) per item"""
+    results = []
+    for idx, fields in batch:
+        item = ManifestItem(idx, fields, "/")
+        tmp = f"{item.output}.{os.getpid()}.part"
+        try:
+            wav, sr = _ENGINE.get_waveform(item.text, lang=item.lang, voice=item.voice,
+                                           reference_speaker=item.reference_speaker,
+                                           model_id=_RESOLVE(item))
+            os.makedirs(os.path.dirname(item.output) or ".", exist_ok=True)
+            FileSink(tmp, output_format(item.output), sample_rate, _ENGINE.audio_encoder).write(wav, sr)
+            os.replace(tmp, item.output)
+            results.append((idx, len(wav) / sr, None))
+        except Exception as e:
+            results.append((idx, 0.0, f"{e.__class__.__name__}: {e}"))
+            if os.path.exists(tmp):
+                os.remove(tmp)
+    return results
+
+
+def _batches(items: List[ManifestItem], batch_size: int) -> Iterator[List[ManifestItem]]:
+    """batches that never mix models, in model order so workers keep reusing the loaded one"""
+    groups: Dict[str, List[ManifestItem]] = {}
+    for item in items:
+        groups.setdefault(item.group, []).append(item)
+    for group in groups.values():
+        for i in range(0, len(group), batch_size):
+            yield group[i:i + batch_size]
+
+
+def render_manifest(manifest: str, plugin: str = "coqui", lang: str = "en-us", config: dict = None,
+                    workers: int = None, batch_size: int = 16, checkpoint: str = None,
+                    output_dir: str = None, sample_rate: int = None, force: bool = False,
+                    report_every: float = 10) -> dict:
+    """render a manifest and return a report of the run"""
+    config = dict(config or {}, audio_cache=False)
+    workers = workers or max(1, (os.cpu_count() or 1) // 2)
+    if not config.get("num_threads"):
+        config["num_threads"] = max(1, (os.cpu_count() or 1) // workers)
+
+    items = read_manifest(manifest, output_dir)
+    engine, resolve = engine_of(create_plugin(plugin, lang, config))
+    for item in items:
+        item_lang = item.lang or lang
+        key = engine.get_model_key(item_lang, resolve(item))
+        item.group = key.model
+        item.signature = hashlib.sha256(json.dumps(
+            [engine.get_cache_key(item.text, item_lang, item.voice, item.reference_speaker, key),
+             sample_rate, output_format(item.output)]).encode("utf-8")).hexdigest()[:32]
+
+    progress = Checkpoint(checkpoint or f"{manifest}.progress.jsonl")
+    todo = [i for i in items if force or not progress.is_done(i)]
+    report = {"manifest": manifest, "items": len(items), "skipped": len(items) - len(todo),
+              "rendered": 0, "failed": 0, "errors": {}, "models": len({i.group for i in todo}),
+              "workers": workers}
+    LOG.info(f"rendering {len(todo)} of {len(items)} items ({report['models']} models) with {workers} workers")
+
+    by_idx = {i.idx: i for i in todo}
+    start = last_report = time.perf_counter()
+    audio_s = chars = 0
+    ctx = multiprocessing.get_context("spawn")  # torch does not survive a fork once its threads started
+    try:
+        with ProcessPoolExecutor(workers, mp_context=ctx, initializer=_init_worker,
+                                 initargs=(plugin, lang, config)) as pool:
+            pending = {pool.submit(_render_batch, [(i.idx, i.to_dict()) for i in batch], sample_rate)
+                       for batch in _batches(todo, batch_size)}
+            while pending:
+                finished, pending = wait(pending, timeout=report_every, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    for idx, seconds, error in future.result():
+                        item = by_idx[idx]
+                        if error:
+                            report["failed"] += 1
+                            report["errors"][item.id] = error
+                            LOG.error(f"{item.id} failed: {error}")
+                            continue
+                        progress.add(item)
+                        report["rendered"] += 1
+                        audio_s += seconds
+                        chars += len(item.text)
+                now = time.perf_counter()
+                if now - last_report >= report_every:
+                    last_report = now
+                    done = report["rendered"] + report["failed"]
+                    LOG.info(f"{done}/{len(todo)} rendered, {done / (now - start):.2f} items/s")
+    finally:
+        progress.close()
+        wall = time.perf_counter() - start
+        report.update(wall_s=wall,
+                      items_per_s=report["rendered"] / wall if wall else 0.0,
+                      chars_per_s=chars / wall if wall else 0.0,
+                      audio_s_per_s=audio_s / wall if wall else 0.0)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="render a jsonl or csv manifest of prompts with coqui")
+    parser.add_argument("manifest", help="jsonl or csv file with text, output and optional lang, voice, "
+                                         "reference_speaker and model fields")
+    parser.add_argument("--plugin", choices=PLUGINS, default="coqui")
+    parser.add_argument("--lang", default="en-us", help="language of lines without a lang field")
+    parser.add_argument("--config", default="{}", help="plugin config as a JSON string")
+    parser.add_argument("--workers", type=int, help="worker processes, half the cpu cores by default")
+    parser.add_argument("--batch-size", type=int, default=16, help="lines sent to a worker at once")
+    parser.add_argument("--checkpoint", help="progress file, <manifest>.progress.jsonl by default")
+    parser.add_argument("--output-dir", help="base folder of relative output paths, the manifest folder by default")
+    parser.add_argument("--sample-rate", type=int, help="resample the outputs to this rate")
+    parser.add_argument("--force", action="store_true", help="render everything, even up to date outputs")
+    parser.add_argument("--report", help="write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    report = render_manifest(args.manifest, args.plugin, args.lang, json.loads(args.config), args.workers,
+                             args.batch_size, args.checkpoint, args.output_dir, args.sample_rate, args.force)
+    data = json.dumps(report, indent=2)
+    if args.report:
+        with open(args.report, "w") as f:
+            f.write(data)
+    else:
+        print(data)
+    if report["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Optional, Union
+
+from ovos_utils.log import LOG
+
+from ovos_tts_plugin_coqui.util import get_cache_dir
+
+
+def normalize_text(text: str) -> str:
+    """normalize unicode and whitespace so trivially different strings share a cache entry"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class AudioCache:
+    """Content addressed cache of synthesized audio files
+
+    entries are keyed by a hash of everything that determines the output
+    (text, model, speaker, language, reference audio, settings) and stored
+    on disk, the least recently used files are deleted once the cache
+    exceeds max_bytes
+
+    hits are served by hard linking (or copying) the cached file into the
+    requested path, no model is needed for that
+    """
+    _INSTANCES: Dict[str, "AudioCache"] = {}
+
+    def __init__(self, cache_dir: str = None, max_bytes: int = 0,
+                 hardlink: bool = True, ext: str = "wav"):
+        self.cache_dir = cache_dir or get_cache_dir("audio")
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hardlink = hardlink
+        self.ext = ext
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: Dict[str, int] = OrderedDict()  # key -> size in bytes
+        self._load_index()
+
+    @classmethod
+    def from_config(cls, config: Union[bool, dict, None]) -> Optional["AudioCache"]:
+        """return the shared cache for a plugin "audio_cache" config, or None if disabled
+
+        plugins configured with the same folder share one instance
+        """
+        if not config:
+            return None
+        if config is True:
+            config = {}
+        if not config.get("enabled", True):
+            return None
+        cache_dir = config.get("path") or get_cache_dir("audio")
+        if cache_dir not in cls._INSTANCES:
+            cls._INSTANCES[cache_dir] = cls(cache_dir,
+                                            max_bytes=int(config.get("max_size_mb", 512) * 1024 * 1024),
+                                            hardlink=config.get("hardlink", True))
+        return cls._INSTANCES[cache_dir]
+
+    @staticmethod
+    def make_key(**fields) -> str:
+        if "text" in fields:
+            fields["text"] = normalize_text(fields["text"])
+        data = json.dumps(fields, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    @property
+    def size_bytes(self) -> int:
+        with self._lock:
+            return sum(self._entries.values())
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits,
+                    "misses": self.misses,
+                    "entries": len(self._entries),
+                    "size_bytes": sum(self._entries.values())}
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.{self.ext}")
+
+    def _load_index(self):
+        files = []
+        for f in os.listdir(self.cache_dir):
+            if not f.endswith(f".{self.ext}"):
+                continue
+            st = os.stat(os.path.join(self.cache_dir, f))
+            files.append((st.st_mtime, f[:-len(self.ext) - 1], st.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def get(self, key: str, wav_file: str) -> bool:
+        """place the cached audio for key at wav_file, returns False on a miss"""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return False
+            self._entries.move_to_end(key)
+            self.hits += 1
+        path = self._path(key)
+        try:
+            os.utime(path)  # keep LRU order across restarts
+            self._place(path, wav_file)
+            return True
+        except FileNotFoundError:  # deleted behind our back
+            with self._lock:
+                self._entries.pop(key, None)
+                self.hits -= 1
+                self.misses += 1
+            return False
+
+    def put(self, key: str, wav_file: str):
+        """store a copy of wav_file under key"""
+        path = self._path(key)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            shutil.copyfile(wav_file, tmp)
+            os.replace(tmp, path)
+        except OSError as e:
+            LOG.warning(f"failed to cache {wav_file}: {e}")
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return
+        with self._lock:
+            self._entries[key] = os.path.getsize(path)
+            self._entries.move_to_end(key)
+            evicted = []
+            while self.max_bytes and len(self._entries) > 1 and \
+                    sum(self._entries.values()) > self.max_bytes:
+                evicted.append(self._entries.popitem(last=False)[0])
+        for k in evicted:
+            try:
+                os.remove(self._path(k))
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        with self._lock:
+            keys = list(self._entries)
+            self._entries.clear()
+        for k in keys:
+            try:
+                os.remove(self._path(k))
+            except FileNotFoundError:
+                pass
+
+    def _place(self, path: str, wav_file: str):
+        if os.path.abspath(path) == os.path.abspath(wav_file):
+            return
+        if os.path.lexists(wav_file):
+            os.remove(wav_file)
+        if self.hardlink:
+            try:
+                os.link(path, wav_file)
+                return
+            except OSError:  # cross device, unsupported fs...
+                pass
+        shutil.copyfile(path, wav_file)
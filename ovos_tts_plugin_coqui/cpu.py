@@ -0,0 +1,145 @@
+import sys
+from typing import TYPE_CHECKING, Callable, Tuple
+
+import numpy as np
+from ovos_utils.log import LOG
+
+if TYPE_CHECKING:
+    from TTS.api import TTS as CTTS
+
+# architectures that are known to work with int8 dynamic quantization
+QUANTIZABLE = ("Vits", "GlowTTS", "ForwardTTS")  # ForwardTTS covers fast_pitch
+
+_THREADS_SET = False
+
+
+def configure_threads(num_threads: int = None, num_interop_threads: int = None):
+    """limit the number of cores torch uses per request, applies to the whole process
+
+    inter-op threads can only be set before torch runs anything in parallel,
+    a warning is logged if that is too late
+    """
+    global _THREADS_SET
+    if _THREADS_SET or not (num_threads or num_interop_threads):
+        return
+    import torch
+    if num_threads:
+        torch.set_num_threads(int(num_threads))
+    if num_interop_threads:
+        try:
+            torch.set_num_interop_threads(int(num_interop_threads))
+        except RuntimeError as e:
+            LOG.warning(f"could not set inter-op threads: {e}")
+    _THREADS_SET = True
+
+
+def run_inference(fn: Callable[[], object]):
+    """call fn with autograd disabled"""
+    torch = sys.modules.get("torch")  # always imported once a model is loaded
+    if torch is None:
+        return fn()
+    with torch.inference_mode():
+        return fn()
+
+
+def can_quantize(tts: "CTTS") -> bool:
+    model = getattr(tts.synthesizer, "tts_model", None)
+    return model is not None and model.__class__.__name__ in QUANTIZABLE
+
+
+def quantize_module(module):
+    """return an int8 dynamically quantized copy of a torch module
+
+    torch only quantizes Linear and recurrent layers dynamically, the
+    models supported here are mostly convolutional, so pointwise (kernel
+    size 1) convolutions are rewritten as equivalent Linear layers first
+    """
+    import copy
+    import torch
+    module = copy.deepcopy(module)
+    _pointwise_to_linear(module)
+    return torch.ao.quantization.quantize_dynamic(module, {torch.nn.Linear, torch.nn.LSTM, torch.nn.GRU},
+                                                  dtype=torch.qint8, inplace=True)
+
+
+def _pointwise_to_linear(module):
+    import torch
+
+    class PointwiseLinear(torch.nn.Module):
+        """Conv1d with kernel size 1 applied as a Linear layer over the channel axis"""
+
+        def __init__(self, conv: torch.nn.Conv1d):
+            super().__init__()
+            self.in_channels = conv.in_channels
+            self.out_channels = conv.out_channels
+            self.linear = torch.nn.Linear(conv.in_channels, conv.out_channels, bias=conv.bias is not None)
+            self.linear.weight.data.copy_(conv.weight.data[:, :, 0])
+            if conv.bias is not None:
+                self.linear.bias.data.copy_(conv.bias.data)
+
+        def forward(self, x):
+            return self.linear(x.transpose(1, 2)).transpose(1, 2)
+
+    for name, child in list(module.named_children()):
+        if isinstance(child, torch.nn.Conv1d) and child.kernel_size == (1,) and child.groups == 1 \
+                and child.stride == (1,) and child.padding in ((0,), 0) \
+                and isinstance(child._parameters.get("weight"), torch.nn.Parameter) \
+                and not child._forward_pre_hooks:  # weight norm is applied in a hook
+            setattr(module, name, PointwiseLinear(child))
+        else:
+            _pointwise_to_linear(child)
+
+
+def compare_audio(reference: np.ndarray, candidate: np.ndarray, n_fft: int = 1024) -> Tuple[float, float]:
+    """cheap similarity check between two renderings of the same text
+
+    returns (length ratio, long term average spectrum distance in dB),
+    the spectra are averaged over time so small timing differences do not matter
+    """
+    reference = np.asarray(reference, dtype=np.float32)
+    candidate = np.asarray(candidate, dtype=np.float32)
+    if not reference.size or not candidate.size:
+        return 0.0, float("inf")
+
+    def ltas(wav):
+        wav = np.pad(wav, (0, max(0, n_fft - wav.size)))
+        frames = np.lib.stride_tricks.sliding_window_view(wav, n_fft)[::n_fft // 4] * np.hanning(n_fft)
+        spectrum = np.abs(np.fft.rfft(frames, axis=1)).mean(axis=0)
+        # relative to the peak and floored, so inaudible bins do not dominate the distance
+        return np.maximum(20 * np.log10(spectrum / (spectrum.max() + 1e-9) + 1e-9), -60)
+
+    ratio = candidate.size / reference.size
+    distance = float(np.sqrt(np.mean((ltas(reference) - ltas(candidate)) ** 2)))
+    return ratio, distance
+
+
+def quantize_tts(tts: "CTTS", render: Callable[[], np.ndarray] = None,
+                 check: Callable[[np.ndarray, np.ndarray], bool] = None) -> bool:
+    """quantize the acoustic model and vocoder of a loaded coqui model in place
+
+    if render and check are given, render() is called before and after
+    quantization and the fp32 model is kept unless check(fp32 audio, int8 audio)
+    returns True
+
+    returns True if the quantized model is in use
+    """
+    import torch
+    synthesizer = tts.synthesizer
+    fp32 = synthesizer.tts_model, getattr(synthesizer, "vocoder_model", None)
+    try:
+        reference = None
+        if render and check:
+            torch.manual_seed(0)  # same noise for both renderings
+            reference = render()
+        synthesizer.tts_model = quantize_module(fp32[0])
+        if fp32[1] is not None:
+            synthesizer.vocoder_model = quantize_module(fp32[1])
+        if reference is not None:
+            torch.manual_seed(0)
+            if not check(reference, render()):
+                raise ValueError("quantized output differs too much from the fp32 model")
+        return True
+    except Exception as e:
+        LOG.warning(f"int8 quantization disabled for {fp32[0].__class__.__name__}: {e}")
+        synthesizer.tts_model, synthesizer.vocoder_model = fp32
+        return False
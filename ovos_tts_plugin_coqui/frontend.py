@@ -0,0 +1,208 @@
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple, Union
+
+from ovos_utils.log import LOG
+
+from ovos_tts_plugin_coqui.util import get_cache_dir
+
+# phonemizers that phonemize every word on its own, so words can be cached separately
+WORD_PHONEMIZERS = ("espeak", "gruut")
+
+
+class FrontendCache:
+    """Memoizes the text frontend (cleaners + phonemizer + tokenizer) of coqui models
+
+    - sentences: the token ids of every sentence a model tokenizes are
+      kept per (model, language), a repeated sentence skips the frontend
+    - words: with "words" enabled the phonemes of single words are cached
+      too, only words not seen before are sent to the phonemizer, so a
+      template like "set a timer for {n} minutes" only phonemizes {n}
+
+    entries live in a bounded in memory LRU and optionally in a sqlite
+    file shared by all processes, the file is written in WAL mode without
+    an fsync per entry and memory hits never wait for it
+
+    word level caching phonemizes words without their neighbours, for
+    languages where pronunciation depends on the next word (eg. french
+    liaison) it can change the output slightly, so it is opt in
+    """
+
+    def __init__(self, max_items: int = 4096, words: bool = False,
+                 disk: Union[bool, str] = False):
+        self.enabled = True
+        self.max_items = max_items
+        self.words = words
+        self._memory: Dict[Tuple[str, str, str], object] = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_path: Optional[str] = None
+        self._lock = threading.Lock()  # memory LRU and stats
+        self._db_lock = threading.Lock()  # the sqlite connection
+        self.hits = 0
+        self.misses = 0
+        self.configure(disk=disk)
+
+    def configure(self, enabled: bool = None, max_items: int = None,
+                  words: bool = None, disk: Union[bool, str] = None):
+        """update the settings from the plugin "frontend_cache" config, None values are left unchanged"""
+        if enabled is not None:
+            self.enabled = bool(enabled)
+        if max_items is not None:
+            self.max_items = int(max_items)
+        if words is not None:
+            self.words = bool(words)
+        if disk is not None:
+            path = None
+            if disk:
+                path = os.path.expanduser(disk) if isinstance(disk, str) else \
+                    os.path.join(get_cache_dir("frontend"), "frontend.sqlite")
+            if path != self._db_path:
+                self._open(path)
+
+    def _open(self, path: Optional[str]):
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+            self._db_path = path
+            if not path:
+                return
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                self._db = sqlite3.connect(path, check_same_thread=False, timeout=5)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                # a crash may lose the last entries but never corrupts the file, they are recomputed
+                self._db.execute("PRAGMA synchronous=NORMAL")
+                self._db.execute("CREATE TABLE IF NOT EXISTS frontend "
+                                 "(scope TEXT, kind TEXT, text TEXT, value TEXT, PRIMARY KEY (scope, kind, text))")
+                self._db.commit()
+            except sqlite3.Error as e:
+                LOG.warning(f"frontend cache {path} unavailable, using memory only: {e}")
+                self._db = None
+
+    @property
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "items": len(self._memory)}
+
+    def get(self, scope: str, kind: str, text: str):
+        key = (scope, kind, text)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key]
+        value = None
+        with self._db_lock:
+            if self._db is not None:
+                try:
+                    row = self._db.execute("SELECT value FROM frontend WHERE scope=? AND kind=? AND text=?",
+                                           key).fetchone()
+                    value = json.loads(row[0]) if row else None
+                except (sqlite3.Error, ValueError):
+                    value = None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(key, value)
+            return value
+
+    def put(self, scope: str, kind: str, text: str, value):
+        self.put_many(scope, kind, {text: value})
+
+    def put_many(self, scope: str, kind: str, values: Dict[str, object]):
+        """store several entries in a single transaction"""
+        rows = [(scope, kind, text, value) for text, value in values.items()]
+        with self._lock:
+            for row in rows:
+                self._remember(row[:3], row[3])
+        with self._db_lock:
+            if self._db is not None:
+                try:
+                    self._db.executemany("INSERT OR REPLACE INTO frontend VALUES (?, ?, ?, ?)",
+                                         [row[:3] + (json.dumps(row[3]),) for row in rows])
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    LOG.debug(f"frontend cache write failed: {e}")
+
+    def _remember(self, key: Tuple[str, str, str], value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while self.max_items and len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        with self._db_lock:
+            if self._db is not None:
+                self._db.execute("DELETE FROM frontend")
+                self._db.commit()
+
+    # model integration
+    def install(self, tts, scope: str):
+        """memoize the frontend of a loaded model, scope identifies the model
+
+        the cached token ids are returned by the tokenizer of the model
+        instance, so coqui's own synthesis, batched VITS and the onnx
+        backend all use them without further changes
+        """
+        synthesizer = getattr(tts, "synthesizer", None)
+        model = getattr(synthesizer, "tts_model", None)
+        tokenizer = getattr(model, "tokenizer", None) or getattr(tts, "tokenizer", None)
+        if tokenizer is None or not hasattr(tokenizer, "text_to_ids"):
+            return tts
+        self._wrap_tokenizer(tokenizer, scope)
+        phonemizer = getattr(tokenizer, "phonemizer", None) if getattr(tokenizer, "use_phonemes", False) else None
+        if phonemizer is not None:
+            # multi lingual models keep one phonemizer per language
+            for p in list(getattr(phonemizer, "lang_to_phonemizer", {}).values()) or [phonemizer]:
+                self._wrap_phonemizer(p, scope)
+        return tts
+
+    def _wrap_tokenizer(self, tokenizer, scope: str):
+        text_to_ids = tokenizer.text_to_ids
+        if getattr(text_to_ids, "_coqui_frontend", False):
+            return
+
+        def cached_text_to_ids(text: str, language: str = None) -> List[int]:
+            if not self.enabled:
+                return text_to_ids(text, language=language)
+            kind = f"ids:{language or ''}"
+            ids = self.get(scope, kind, text)
+            if ids is None:
+                ids = list(text_to_ids(text, language=language))
+                self.put(scope, kind, text, ids)
+            return list(ids)
+
+        cached_text_to_ids._coqui_frontend = True
+        tokenizer.text_to_ids = cached_text_to_ids
+
+    def _wrap_phonemizer(self, phonemizer, scope: str):
+        phonemize = getattr(phonemizer, "_phonemize", None)
+        name = phonemizer.name() if hasattr(phonemizer, "name") else ""
+        if phonemize is None or name not in WORD_PHONEMIZERS or getattr(phonemize, "_coqui_frontend", False):
+            return
+        kind = f"word:{getattr(phonemizer, 'language', '')}"
+
+        def cached_phonemize(text: str, separator: str = "") -> str:
+            words = text.split()
+            if not (self.enabled and self.words) or separator or not words:
+                return phonemize(text, separator)
+            phonemes = {w: self.get(scope, kind, w) for w in dict.fromkeys(words)}
+            missing = [w for w, p in phonemes.items() if p is None]
+            if missing:
+                parts = phonemize(" ".join(missing), separator).split()
+                if len(parts) != len(missing):
+                    # a word expanded into several (numbers, abbreviations), can not be split per word
+                    return phonemize(text, separator)
+                phonemes.update(zip(missing, parts))
+                self.put_many(scope, kind, dict(zip(missing, parts)))
+            return " ".join(phonemes[w] for w in words)
+
+        cached_phonemize._coqui_frontend = True
+        phonemizer._phonemize = cached_phonemize
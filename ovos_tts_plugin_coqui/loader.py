@@ -0,0 +1,97 @@
+import threading
+from typing import Callable, Optional
+
+from ovos_utils.log import LOG
+
+
+class LoadState:
+    UNLOADED = "unloaded"
+    LOADING = "loading"
+    READY = "ready"
+    ERROR = "error"
+
+
+class ModelLoader:
+    """Tracks the load state of a plugin, optionally loading on a background thread
+
+    get_tts implementations call wait() before synthesizing, it returns
+    immediately unless a background load is still in progress. A failed
+    load is not final, the next wait() runs it again
+    """
+
+    def __init__(self, name: str = "coqui"):
+        self.name = name
+        self.state = LoadState.UNLOADED
+        self.error: Optional[Exception] = None
+        self._load: Optional[Callable[[], None]] = None
+        self._background = False
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._ready.set()
+
+    @property
+    def is_ready(self) -> bool:
+        return self.state == LoadState.READY
+
+    def run(self, load: Callable[[], None], background: bool = False):
+        """execute the load function, in a daemon thread if background is True
+
+        errors in a foreground load are raised, errors in a background
+        load are raised by the next call to wait()
+        """
+        with self._lock:
+            self._load, self._background = load, background
+            self._start()
+        if not background:
+            self._run(load)
+            if self.error:
+                raise self.error
+
+    def retry(self) -> bool:
+        """run the last load again after it failed, in the same mode as run()
+
+        returns False if there is nothing to retry, eg. another thread already did
+        """
+        with self._lock:
+            if self.state != LoadState.ERROR or self._load is None:
+                return False
+            self._start()
+        if not self._background:
+            self._run(self._load)
+        return True
+
+    def mark_ready(self):
+        """flag a lazily loaded model as ready, this also clears a failed warmup"""
+        if self.state in (LoadState.UNLOADED, LoadState.ERROR):
+            self.state = LoadState.READY
+            self.error = None
+
+    def wait(self, timeout: float = None):
+        if self.state == LoadState.ERROR:
+            LOG.info(f"retrying {self.name} load")
+            self.retry()
+        if not self._ready.wait(timeout):
+            raise TimeoutError(f"{self.name} is still warming up")
+        if self.state == LoadState.ERROR:
+            raise RuntimeError(f"{self.name} failed to load") from self.error
+
+    def _start(self):
+        """enter the loading state, called with the lock held"""
+        self.state = LoadState.LOADING
+        self.error = None
+        self._ready.clear()
+        if self._background:
+            threading.Thread(target=self._run, args=(self._load,),
+                             name=f"{self.name}-warmup", daemon=True).start()
+
+    def _run(self, load: Callable[[], None]):
+        try:
+            load()
+            self.state = LoadState.READY
+            LOG.debug(f"{self.name} ready")
+        except Exception as e:
+            LOG.exception(f"{self.name} failed to load")
+            self.error = e
+            self.state = LoadState.ERROR
+        finally:
+            self._ready.set()
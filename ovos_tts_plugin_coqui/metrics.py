@@ -0,0 +1,402 @@
+import importlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from ovos_utils.log import LOG
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_NOOP = nullcontext()
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _escape_label(value: str) -> str:
+    """escape a label value as the prometheus text format requires"""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class RequestRecord:
+    """timings of a single synthesis request
+
+    stages are accumulated by name, a stage that runs several times
+    (eg. once per sentence) reports the total time
+    """
+
+    def __init__(self, method: str, plugin: str, model: str = None, lang: str = None):
+        self.method = method
+        self.plugin = plugin
+        self.model = model
+        self.lang = lang
+        self.start = time.perf_counter()
+        self.elapsed: Optional[float] = None
+        self.stages: Dict[str, float] = defaultdict(float)
+        self.tags: Dict[str, object] = {}
+        self.audio_s = 0.0
+        self.first_audio_s: Optional[float] = None
+        self.error: Optional[str] = None
+        self.depth = 0  # nested requests, eg. the base plugin of FreeVC
+        self._lock = threading.Lock()
+
+    def add_stage(self, name: str, seconds: float):
+        with self._lock:
+            self.stages[name] += seconds
+
+    def to_dict(self) -> dict:
+        elapsed = self.elapsed if self.elapsed is not None else time.perf_counter() - self.start
+        return {"method": self.method,
+                "plugin": self.plugin,
+                "model": self.model,
+                "lang": self.lang,
+                "total_s": elapsed,
+                "stages": dict(self.stages),
+                "audio_s": self.audio_s or None,
+                "rtf": elapsed / self.audio_s if self.audio_s else None,
+                "first_audio_s": self.first_audio_s,
+                "error": self.error,
+                **self.tags}
+
+
+class _PrometheusHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        data = self.server.metrics.prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class Metrics:
+    """Process wide instrumentation of synthesis requests
+
+    every request (get_tts, get_waveform, stream_tts) produces a record
+    with the time spent in each stage, audio duration and real time factor,
+    records are passed to the sinks and aggregated for prometheus
+
+    stages:
+        - cache_lookup: audio cache lookup
+        - model_load: loading a model into the model pool
+        - queue_wait: waiting for the model to be free (see ModelScheduler)
+        - frontend: text normalization and tokenization / phonemization
+        - acoustic: acoustic model, includes the decoder of end to end models such as VITS
+        - vocoder: separate vocoder models
+        - speaker_embedding: computing a cloned voice
+        - voice_conversion: FreeVC
+        - write: writing the wav file
+
+    model calls run on whichever thread holds the model (see ModelScheduler),
+    their stages are still reported by the request that submitted them,
+    the model stages of a micro batch by the first request in the batch
+
+    when disabled every call returns immediately, the instrumentation
+    costs a couple of attribute lookups per stage
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.enabled = False
+        self.buckets = tuple(buckets)
+        self.log = False
+        self.prometheus_file: Optional[str] = None
+        self._sinks: List[Callable[[dict], None]] = []
+        self._gauges: Dict[str, Callable[[], float]] = {}
+        self._counters: Dict[Tuple[str, Labels], float] = defaultdict(float)
+        self._histograms: Dict[Tuple[str, Labels], list] = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._last_write = 0.0
+
+    def configure(self, enabled: bool = None, log: bool = None, prometheus_file: str = None,
+                  prometheus_port: int = None, prometheus_host: str = "127.0.0.1",
+                  callback: str = None):
+        """enable sinks from the plugin "metrics" config, None values are left unchanged
+
+        callback is the import path of a function receiving every record, eg. "my_module:on_tts_metrics"
+        """
+        if log is not None:
+            self.log = bool(log)
+        if prometheus_file is not None:
+            self.prometheus_file = os.path.expanduser(prometheus_file)
+        if prometheus_port and self._server is None:
+            self._server = ThreadingHTTPServer((prometheus_host, int(prometheus_port)), _PrometheusHandler)
+            self._server.daemon_threads = True
+            self._server.metrics = self
+            threading.Thread(target=self._server.serve_forever, daemon=True).start()
+            LOG.info(f"coqui metrics exported on http://{prometheus_host}:{prometheus_port}/metrics")
+        if callback:
+            module, name = callback.split(":", 1)
+            self.add_sink(getattr(importlib.import_module(module), name))
+        if enabled is not None:
+            self.enabled = bool(enabled)
+        elif self.log or self.prometheus_file or self._server or self._sinks:
+            self.enabled = True
+
+    def add_sink(self, sink: Callable[[dict], None]):
+        """call sink(record dict) after every request, enables the metrics"""
+        with self._lock:
+            if sink not in self._sinks:
+                self._sinks.append(sink)
+        self.enabled = True
+
+    def remove_sink(self, sink: Callable[[dict], None]):
+        with self._lock:
+            if sink in self._sinks:
+                self._sinks.remove(sink)
+
+    def add_gauge(self, name: str, fn: Callable[[], float]):
+        """export fn() as the gauge coqui_<name> in prometheus_text()"""
+        self._gauges[name] = fn
+
+    # request scope
+    def current(self) -> Optional[RequestRecord]:
+        return getattr(self._local, "record", None)
+
+    @contextmanager
+    def bind(self, record: Optional[RequestRecord]):
+        """report the stages run by this thread to record, used to follow a request across threads"""
+        previous = self.current()
+        self._local.record = record
+        try:
+            yield
+        finally:
+            self._local.record = previous
+
+    def request(self, method: str, plugin: str, model: str = None, lang: str = None):
+        """context manager recording one request, nested requests are reported as part of the outer one"""
+        if not self.enabled:
+            return _NOOP
+        record = self.current()
+        if record is not None:
+            return self._nested(record)
+        return self._request(RequestRecord(method, plugin, model, lang))
+
+    @contextmanager
+    def _nested(self, record: RequestRecord):
+        record.depth += 1
+        try:
+            yield record
+        finally:
+            record.depth -= 1
+
+    @contextmanager
+    def _request(self, record: RequestRecord):
+        with self.bind(record):
+            try:
+                yield record
+            except BaseException as e:
+                record.error = e.__class__.__name__
+                raise
+            finally:
+                self._finish(record)
+
+    def iterate(self, chunks: Iterator, method: str, plugin: str, model: str = None,
+                lang: str = None, sample_rate: int = None) -> Iterator:
+        """record a streamed request, the record only covers the time spent producing chunks
+
+        the time the consumer spends between chunks is not counted
+        """
+        if not self.enabled or self.current() is not None:
+            yield from chunks
+            return
+        record = RequestRecord(method, plugin, model, lang)
+        busy = 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                with self.bind(record):
+                    chunk = next(chunks, None)
+                busy += time.perf_counter() - start
+                if chunk is None:
+                    return
+                if record.first_audio_s is None:
+                    record.first_audio_s = busy
+                if sample_rate:
+                    record.audio_s += len(chunk) / sample_rate
+                yield chunk
+        except GeneratorExit:
+            record.tags["cancelled"] = True
+            raise
+        except BaseException as e:
+            record.error = e.__class__.__name__
+            raise
+        finally:
+            record.elapsed = busy
+            self._finish(record)
+
+    def add_audio(self, seconds: float):
+        """audio duration produced by the current request, ignored inside nested requests"""
+        record = self.current() if self.enabled else None
+        if record is not None and not record.depth:
+            record.audio_s += seconds
+
+    def tag(self, key: str, value):
+        """set a field of the current request record"""
+        record = self.current() if self.enabled else None
+        if record is not None:
+            record.tags[key] = value
+
+    # stages and events
+    def stage(self, name: str):
+        """context manager timing a stage of the current request"""
+        if not self.enabled:
+            return _NOOP
+        return self._stage(name)
+
+    @contextmanager
+    def _stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(name, time.perf_counter() - start)
+
+    def add_stage(self, name: str, seconds: float):
+        if not self.enabled:
+            return
+        record = self.current()
+        if record is not None:
+            record.add_stage(name, seconds)
+        self.observe("stage_seconds", seconds, stage=name)
+
+    def count(self, name: str, value: float = 1, **labels):
+        """increase the counter coqui_<name>_total"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[(name, self._labels(labels))] += value
+
+    def observe(self, name: str, value: float, **labels):
+        """add a sample to the histogram coqui_<name>"""
+        if not self.enabled:
+            return
+        key = (name, self._labels(labels))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    hist[i] += 1
+            hist[-2] += value
+            hist[-1] += 1
+
+    @staticmethod
+    def _labels(labels: dict) -> Labels:
+        return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+    def _finish(self, record: RequestRecord):
+        if record.elapsed is None:
+            record.elapsed = time.perf_counter() - record.start
+        data = record.to_dict()
+        self.count("requests", method=record.method, status="error" if record.error else "ok")
+        self.observe("request_seconds", record.elapsed, method=record.method)
+        if record.audio_s:
+            self.count("audio_seconds", record.audio_s, method=record.method)
+            self.observe("rtf", data["rtf"], method=record.method)
+        if record.first_audio_s is not None:
+            self.observe("first_audio_seconds", record.first_audio_s, method=record.method)
+
+        if self.log:
+            LOG.info(f"coqui metrics: {json.dumps(data, default=str)}")
+        for sink in list(self._sinks):
+            try:
+                sink(data)
+            except Exception as e:
+                LOG.warning(f"coqui metrics sink failed: {e}")
+        if self.prometheus_file and time.monotonic() - self._last_write > 1:
+            self._last_write = time.monotonic()
+            self.write_prometheus(self.prometheus_file)
+
+    # export
+    def prometheus_text(self) -> str:
+        """all metrics in the prometheus text exposition format"""
+        def fmt(labels: Labels, extra: Labels = ()) -> str:
+            labels = labels + extra
+            if not labels:
+                return ""
+            return "{" + ",".join(f'{k}="{_escape_label(v)}"' for k, v in labels) + "}"
+
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((k, list(v)) for k, v in self._histograms.items())
+        seen = set()
+        for (name, labels), value in counters:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# TYPE coqui_{name}_total counter")
+            lines.append(f"coqui_{name}_total{fmt(labels)} {value}")
+        for (name, labels), hist in histograms:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# TYPE coqui_{name} histogram")
+            for bound, n in zip(self.buckets, hist):
+                lines.append(f"coqui_{name}_bucket{fmt(labels, (('le', str(bound)),))} {n}")
+            lines.append(f"coqui_{name}_bucket{fmt(labels, (('le', '+Inf'),))} {hist[-1]}")
+            lines.append(f"coqui_{name}_sum{fmt(labels)} {hist[-2]}")
+            lines.append(f"coqui_{name}_count{fmt(labels)} {hist[-1]}")
+        for name, fn in sorted(self._gauges.items()):
+            try:
+                value = fn()
+            except Exception:
+                continue
+            lines.append(f"# TYPE coqui_{name} gauge")
+            lines.append(f"coqui_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str):
+        """write prometheus_text() to path, eg. for the node exporter textfile collector"""
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                f.write(self.prometheus_text())
+            os.replace(tmp, path)
+        except OSError as e:
+            LOG.warning(f"could not write coqui metrics to {path}: {e}")
+
+    def reset(self):
+        """drop the aggregated counters and histograms"""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+def instrument_model(tts, metrics: Metrics):
+    """time the text frontend, acoustic model and vocoder of a loaded model
+
+    wraps the methods coqui calls for each stage on this model instance,
+    the wrappers only check metrics.enabled when metrics are off
+    """
+    synthesizer = getattr(tts, "synthesizer", None)
+    model = getattr(synthesizer, "tts_model", None)
+    tokenizer = getattr(model, "tokenizer", None) or getattr(tts, "tokenizer", None)  # onnx keeps it on the wrapper
+    _time_method(tokenizer, "text_to_ids", "frontend", metrics)
+    _time_method(model, "inference", "acoustic", metrics)
+    _time_method(getattr(tts, "session", None), "run", "acoustic", metrics)  # onnx runtime
+    _time_method(getattr(synthesizer, "vocoder_model", None), "inference", "vocoder", metrics)
+    return tts
+
+
+def _time_method(obj, attr: str, stage: str, metrics: Metrics):
+    fn = getattr(obj, attr, None) if obj is not None else None
+    if fn is None or getattr(fn, "_coqui_stage", None):
+        return
+
+    def timed(*args, **kwargs):
+        if not metrics.enabled:
+            return fn(*args, **kwargs)
+        with metrics.stage(stage):
+            return fn(*args, **kwargs)
+
+    timed._coqui_stage = stage
+    setattr(obj, attr, timed)
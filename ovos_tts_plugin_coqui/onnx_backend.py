@@ -0,0 +1,238 @@
+import hashlib
+import json
+import os
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+from ovos_utils.log import LOG
+
+from ovos_tts_plugin_coqui.pool import ModelKey
+from ovos_tts_plugin_coqui.util import get_cache_dir
+
+ONNX_FILE = "coqui_vits.onnx"
+
+
+class _Synthesizer:
+    """the parts of coqui's Synthesizer the plugin reads"""
+
+    def __init__(self, output_sample_rate: int):
+        self.output_sample_rate = output_sample_rate
+        self.tts_model = None
+
+
+class OnnxVits:
+    """VITS model exported to ONNX and run with onnxruntime
+
+    the text frontend (tokenizer, speaker and language ids) is built from the
+    coqui config exactly like coqui does, the torch model is never loaded,
+    duck types the parts of TTS.api.TTS that the plugin uses
+    """
+
+    def __init__(self, onnx_path: str, model_path: str, config_path: str = None,
+                 num_threads: int = None, num_interop_threads: int = None):
+        import onnxruntime as ort
+        self.onnx_path = onnx_path
+        self.speaker_manager = None
+        self.language_manager = None
+        self.ap = None
+        if os.path.isdir(model_path):
+            sample_rate = self._init_fairseq_frontend(model_path)
+        else:
+            sample_rate = self._init_frontend(config_path)
+        self.synthesizer = _Synthesizer(sample_rate)
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = int(num_threads)
+        if num_interop_threads:
+            options.inter_op_num_threads = int(num_interop_threads)
+        self.session = ort.InferenceSession(onnx_path, sess_options=options,
+                                            providers=["CPUExecutionProvider"])
+        self._inputs = {i.name for i in self.session.get_inputs()}
+
+        import pysbd
+        self._segmenter = pysbd.Segmenter(language="en", clean=True)
+
+    def _init_frontend(self, config_path: str) -> int:
+        from TTS.config import load_config
+        from TTS.tts.utils.languages import LanguageManager
+        from TTS.tts.utils.speakers import SpeakerManager
+        from TTS.tts.utils.text.tokenizer import TTSTokenizer
+        from TTS.utils.audio import AudioProcessor
+
+        config = load_config(config_path)
+        if config.model.lower() != "vits":
+            raise ValueError(f"{config.model} models are not supported by the onnx backend")
+        args = config.model_args
+        if args.use_d_vector_file or args.speaker_encoder_model_path:
+            raise ValueError("models conditioned on speaker embeddings are not supported by the onnx backend")
+        self.tokenizer, config = TTSTokenizer.init_from_config(config)
+        self.speaker_manager = SpeakerManager.init_from_config(config)
+        self.language_manager = LanguageManager.init_from_config(config)
+        self.scales = np.array([args.inference_noise_scale, args.length_scale,
+                                args.inference_noise_scale_dp], dtype=np.float32)
+        if "do_trim_silence" in config.audio and config.audio["do_trim_silence"]:
+            self.ap = AudioProcessor.init_from_config(config)
+        return config.audio["sample_rate"]
+
+    def _init_fairseq_frontend(self, model_dir: str) -> int:
+        """same tokenizer as Vits.load_fairseq_checkpoint"""
+        from TTS.config import load_config
+        from TTS.tts.models.vits import FairseqVocab
+        from TTS.tts.utils.text.cleaners import basic_cleaners, uroman_cleaners
+        from TTS.tts.utils.text.tokenizer import TTSTokenizer
+
+        config_file = os.path.join(model_dir, "config.json")
+        args = load_config(config_file).model_args
+        with open(config_file, encoding="utf-8") as f:
+            config_org = json.load(f)
+        is_uroman = config_org["data"]["training_files"].endswith("uroman")
+        self.tokenizer = TTSTokenizer(
+            use_phonemes=False,
+            text_cleaner=uroman_cleaners if is_uroman else basic_cleaners,
+            characters=FairseqVocab(os.path.join(model_dir, "vocab.txt")),
+            phonemizer=None,
+            add_blank=config_org["data"]["add_blank"],
+            use_eos_bos=False,
+        )
+        self.scales = np.array([args.inference_noise_scale, args.length_scale,
+                                args.inference_noise_scale_dp], dtype=np.float32)
+        return config_org["data"]["sampling_rate"]
+
+    @property
+    def nbytes(self) -> int:
+        return os.path.getsize(self.onnx_path)
+
+    @property
+    def is_multi_speaker(self) -> bool:
+        return self.speaker_manager is not None and self.speaker_manager.num_speakers > 1
+
+    @property
+    def is_multi_lingual(self) -> bool:
+        return self.language_manager is not None and self.language_manager.num_languages > 1
+
+    @property
+    def speakers(self) -> Optional[List[str]]:
+        return self.speaker_manager.speaker_names if self.is_multi_speaker else None
+
+    @property
+    def languages(self) -> Optional[List[str]]:
+        return self.language_manager.language_names if self.is_multi_lingual else None
+
+    def _speaker_id(self, speaker: str = None) -> Optional[int]:
+        if self.speaker_manager is None:
+            return None
+        if self.speaker_manager.num_speakers == 1:
+            return list(self.speaker_manager.name_to_id.values())[0]
+        if speaker not in self.speaker_manager.name_to_id:
+            raise ValueError(f"{speaker} is not a valid speaker of the model")
+        return self.speaker_manager.name_to_id[speaker]
+
+    def _language_id(self, language: str = None) -> Optional[int]:
+        if self.language_manager is None:
+            return None
+        if self.language_manager.num_languages == 1:
+            return list(self.language_manager.name_to_id.values())[0]
+        return self.language_manager.name_to_id[language]
+
+    def tts(self, text: str, speaker: str = None, language: str = None,
+            speaker_wav: str = None, split_sentences: bool = True, **kwargs) -> np.ndarray:
+        """same output as TTS.api.TTS.tts for VITS models"""
+        from TTS.utils.synthesizer import PAD_SILENCE_SAMPLES
+        if speaker_wav:
+            raise ValueError("voice cloning is not supported by the onnx backend")
+        inputs = {"scales": self.scales}
+        speaker_id, language_id = self._speaker_id(speaker), self._language_id(language)
+        if speaker_id is not None and "sid" in self._inputs:
+            inputs["sid"] = np.array([speaker_id], dtype=np.int64)
+        if language_id is not None and "langid" in self._inputs:
+            inputs["langid"] = np.array([language_id], dtype=np.int64)
+
+        wavs = []
+        sentences = self._segmenter.segment(text) if split_sentences else [text]
+        for sentence in sentences:
+            ids = self.tokenizer.text_to_ids(sentence, language=language)
+            inputs["input"] = np.array([ids], dtype=np.int64)
+            inputs["input_lengths"] = np.array([len(ids)], dtype=np.int64)
+            wav = self.session.run(["output"], inputs)[0][0].squeeze()
+            if self.ap is not None:
+                wav = wav[:self.ap.find_endpoint(wav)]
+            wavs += [wav.astype(np.float32), np.zeros(PAD_SILENCE_SAMPLES, dtype=np.float32)]
+        return np.concatenate(wavs)
+
+
+def resolve_model_files(key: ModelKey) -> Tuple[str, Optional[str]]:
+    """return (checkpoint file or model folder, config file), downloading the model if needed"""
+    if os.path.isfile(key.model):
+        return key.model, key.model_config
+    from TTS.api import TTS as CTTS
+    from TTS.utils.manage import ModelManager
+    manager = ModelManager(models_file=CTTS.get_models_file_path(), progress_bar=False)
+    model_path, config_path, _ = manager.download_model(key.model)
+    return str(model_path), str(config_path) if config_path else None
+
+
+def onnx_path_for(model_path: str) -> str:
+    """the graph is cached next to the model files, or in the plugin cache if that folder is read only"""
+    model_dir = model_path if os.path.isdir(model_path) else os.path.dirname(model_path)
+    if os.access(model_dir, os.W_OK):
+        return os.path.join(model_dir, ONNX_FILE)
+    digest = hashlib.sha256(os.path.abspath(model_path).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(get_cache_dir("onnx", digest), ONNX_FILE)
+
+
+def _check_supported(model_path: str, config_path: str = None):
+    """cheap check on the config, so unsupported models fail before anything is loaded"""
+    if os.path.isdir(model_path):  # fairseq
+        return
+    with open(config_path, encoding="utf-8") as f:
+        config = json.load(f)
+    if config.get("model", "").lower() != "vits":
+        raise ValueError(f"{config.get('model')} models are not supported by the onnx backend")
+    args = config.get("model_args") or {}
+    if args.get("use_d_vector_file") or args.get("speaker_encoder_model_path"):
+        raise ValueError("models conditioned on speaker embeddings are not supported by the onnx backend")
+
+
+def _is_stale(onnx_path: str, model_path: str) -> bool:
+    if not os.path.isfile(onnx_path):
+        return True
+    if os.path.isdir(model_path):  # fairseq, compare with the checkpoint not the folder
+        checkpoint = os.path.join(model_path, "model.pth")
+        if not os.path.isfile(checkpoint):
+            checkpoint = os.path.join(model_path, "G_100000.pth")
+        model_path = checkpoint
+    return os.path.getmtime(onnx_path) < os.path.getmtime(model_path)
+
+
+def load_onnx_vits(key: ModelKey, load_torch: Callable[[], object],
+                   num_threads: int = None, num_interop_threads: int = None) -> OnnxVits:
+    """return the onnx runtime version of a VITS model, exporting it on first use
+
+    load_torch() must return the coqui model, it is only called to export the graph
+    """
+    model_path, config_path = resolve_model_files(key)
+    _check_supported(model_path, config_path)
+    onnx_path = onnx_path_for(model_path)
+    if _is_stale(onnx_path, model_path):
+        tts = load_torch()
+        model = tts.synthesizer.tts_model
+        if model.__class__.__name__ != "Vits":
+            raise ValueError(f"{model.__class__.__name__} models are not supported by the onnx backend")
+        LOG.info(f"exporting {key.model} to {onnx_path}")
+        tmp = f"{onnx_path}.{os.getpid()}.tmp"
+        own_forward = vars(model).get("forward")
+        try:
+            model.export_onnx(output_path=tmp, verbose=False)
+            os.replace(tmp, onnx_path)
+        finally:
+            # export_onnx swaps model.forward and leaves it swapped if the export raises,
+            # the torch model is then used as the fallback
+            if own_forward is None:
+                vars(model).pop("forward", None)
+            else:
+                model.forward = own_forward
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        del tts, model
+    return OnnxVits(onnx_path, model_path, config_path, num_threads, num_interop_threads)
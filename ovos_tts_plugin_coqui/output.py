@@ -0,0 +1,169 @@
+import io
+import os
+import shutil
+import subprocess
+import wave
+from typing import Optional, Tuple, Union
+
+import numpy as np
+from ovos_utils.log import LOG
+
+from ovos_tts_plugin_coqui.audio import normalize, resample, to_pcm16
+
+# formats returned as is, everything else goes through an AudioEncoder
+RAW_FORMATS = ("float32", "pcm16", "wav")
+ENCODED_FORMATS = ("ogg", "opus", "mp3", "flac")
+
+# sample rates the opus codec accepts
+OPUS_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+
+# (libsndfile format, subtype), (ffmpeg codec, container)
+_SOUNDFILE = {"ogg": ("OGG", "VORBIS"), "opus": ("OGG", "OPUS"),
+              "mp3": ("MP3", "MPEG_LAYER_III"), "flac": ("FLAC", "PCM_16")}
+_FFMPEG = {"ogg": ("libvorbis", "ogg"), "opus": ("libopus", "ogg"),
+           "mp3": ("libmp3lame", "mp3"), "flac": ("flac", "flac")}
+
+AudioData = Union[np.ndarray, bytes]
+
+
+def wav_bytes(pcm: bytes, sample_rate: int) -> bytes:
+    """wrap mono 16 bit PCM in a wav header"""
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(pcm)
+    return buf.getvalue()
+
+
+class AudioEncoder:
+    """Encodes waveforms to compressed formats without touching the disk
+
+    - "soundfile": libsndfile through the soundfile package (ogg, flac,
+      opus and mp3 with libsndfile >= 1.1)
+    - "ffmpeg": pipes PCM through an ffmpeg binary
+    - "auto": soundfile if it supports the format, else ffmpeg
+    """
+
+    def __init__(self, backend: str = "auto", ffmpeg: str = "ffmpeg",
+                 bitrate: str = None):
+        self.backend = backend
+        self.ffmpeg = ffmpeg
+        self.bitrate = bitrate
+
+    @classmethod
+    def from_config(cls, config: Optional[dict]) -> "AudioEncoder":
+        """build an encoder from a plugin "audio_output" config"""
+        config = config or {}
+        return cls(backend=config.get("encoder", "auto"),
+                   ffmpeg=config.get("ffmpeg", "ffmpeg"),
+                   bitrate=config.get("bitrate"))
+
+    @staticmethod
+    def sample_rate_for(audio_format: str, sample_rate: int) -> int:
+        """the closest rate the format can encode, so resampling happens only once"""
+        if audio_format == "opus" and sample_rate not in OPUS_SAMPLE_RATES:
+            return min((r for r in OPUS_SAMPLE_RATES if r >= sample_rate), default=48000)
+        return sample_rate
+
+    def encode(self, wav: np.ndarray, sample_rate: int, audio_format: str) -> bytes:
+        """encode a normalized float waveform"""
+        if audio_format not in ENCODED_FORMATS:
+            raise ValueError(f"unsupported audio format '{audio_format}', valid: {ENCODED_FORMATS}")
+        if self.backend in ("auto", "soundfile"):
+            try:
+                return self._encode_soundfile(wav, sample_rate, audio_format)
+            except (ImportError, RuntimeError, ValueError) as e:
+                if self.backend == "soundfile":
+                    raise
+                LOG.debug(f"soundfile can not encode {audio_format}, using ffmpeg: {e}")
+        return self._encode_ffmpeg(wav, sample_rate, audio_format)
+
+    @staticmethod
+    def _encode_soundfile(wav: np.ndarray, sample_rate: int, audio_format: str) -> bytes:
+        import soundfile as sf
+        fmt, subtype = _SOUNDFILE[audio_format]
+        if not sf.check_format(fmt, subtype):
+            raise ValueError(f"libsndfile {sf.__libsndfile_version__} can not write {fmt}/{subtype}")
+        buf = io.BytesIO()
+        sf.write(buf, wav, sample_rate, format=fmt, subtype=subtype)
+        return buf.getvalue()
+
+    def _encode_ffmpeg(self, wav: np.ndarray, sample_rate: int, audio_format: str) -> bytes:
+        binary = shutil.which(self.ffmpeg)
+        if not binary:
+            raise RuntimeError(f"can not encode {audio_format}: '{self.ffmpeg}' not found")
+        codec, container = _FFMPEG[audio_format]
+        cmd = [binary, "-hide_banner", "-loglevel", "error",
+               "-f", "s16le", "-ar", str(sample_rate), "-ac", "1", "-i", "pipe:0",
+               "-c:a", codec]
+        if self.bitrate and audio_format != "flac":
+            cmd += ["-b:a", str(self.bitrate)]
+        cmd += ["-f", container, "pipe:1"]
+        proc = subprocess.run(cmd, input=to_pcm16(wav), capture_output=True, check=False)
+        if proc.returncode != 0:
+            raise RuntimeError(f"ffmpeg failed to encode {audio_format}: "
+                               f"{proc.stderr.decode('utf-8', 'replace').strip()}")
+        return proc.stdout
+
+
+class AudioSink:
+    """Turns a synthesized waveform into the output a caller asked for
+
+    - "float32": the waveform as a numpy array, as synthesized
+    - "pcm16": peak normalized mono 16 bit PCM bytes
+    - "wav", "ogg", "opus", "mp3", "flac": an encoded file in memory
+
+    with sample_rate set the audio is resampled once, before quantization
+    and encoding, formats with a fixed set of rates (opus) are resampled
+    straight to a rate they accept
+    """
+
+    def __init__(self, audio_format: str = "pcm16", sample_rate: int = None,
+                 encoder: AudioEncoder = None):
+        if audio_format not in RAW_FORMATS + ENCODED_FORMATS:
+            raise ValueError(f"unsupported audio format '{audio_format}', "
+                             f"valid: {RAW_FORMATS + ENCODED_FORMATS}")
+        self.audio_format = audio_format
+        self.sample_rate = sample_rate
+        self.encoder = encoder or AudioEncoder()
+
+    def render(self, wav, sample_rate: int) -> Tuple[AudioData, int]:
+        """returns (audio, sample_rate) in the sink format"""
+        wav = np.asarray(wav, dtype=np.float32)
+        target = AudioEncoder.sample_rate_for(self.audio_format, self.sample_rate or sample_rate)
+        if target != sample_rate:
+            wav = resample(wav, sample_rate, target)
+        if self.audio_format == "float32":
+            return wav, target
+        wav = normalize(wav)
+        if self.audio_format == "pcm16":
+            return to_pcm16(wav), target
+        if self.audio_format == "wav":
+            return wav_bytes(to_pcm16(wav), target), target
+        return self.encoder.encode(wav, target, self.audio_format), target
+
+    def write(self, wav, sample_rate: int) -> Tuple[AudioData, int]:
+        return self.render(wav, sample_rate)
+
+
+class FileSink(AudioSink):
+    """AudioSink that saves the rendered audio to a file, the format defaults to the file extension
+
+    returns (path, sample_rate)
+    """
+
+    def __init__(self, path: str, audio_format: str = None, sample_rate: int = None,
+                 encoder: AudioEncoder = None):
+        audio_format = audio_format or os.path.splitext(path)[1].lstrip(".").lower() or "wav"
+        if audio_format in ("float32", "pcm16"):
+            raise ValueError(f"'{audio_format}' can not be saved as a file")
+        super().__init__(audio_format, sample_rate, encoder)
+        self.path = path
+
+    def write(self, wav, sample_rate: int) -> Tuple[str, int]:
+        data, sample_rate = self.render(wav, sample_rate)
+        with open(self.path, "wb") as f:
+            f.write(data)
+        return self.path, sample_rate
@@ -0,0 +1,53 @@
+import queue
+import threading
+from typing import Callable, Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+_END = object()
+
+
+def render_ahead(segments: List[str],
+                 render: Callable[[str], Iterable[np.ndarray]],
+                 lookahead: int = 2) -> Iterator[Tuple[int, np.ndarray]]:
+    """render segments in order on a background thread
+
+    yields (segment index, audio chunk) as soon as each chunk is ready,
+    at most `lookahead` segments are rendered ahead of the consumer
+
+    closing the generator stops rendering at the next chunk boundary
+    """
+    chunks = queue.Queue()
+    slots = threading.Semaphore(max(1, lookahead))
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for idx, segment in enumerate(segments):
+                while not slots.acquire(timeout=0.1):
+                    if stop.is_set():
+                        return
+                for chunk in render(segment):
+                    if stop.is_set():
+                        return
+                    chunks.put((idx, chunk))
+                chunks.put((idx, _END))
+        except Exception as e:
+            chunks.put((None, e))
+        finally:
+            chunks.put((None, _END))
+
+    threading.Thread(target=produce, name="coqui-pipeline", daemon=True).start()
+    try:
+        while True:
+            idx, chunk = chunks.get()
+            if idx is None:
+                if chunk is _END:
+                    return
+                raise chunk
+            if chunk is _END:
+                slots.release()
+                continue
+            yield idx, chunk
+    finally:
+        stop.set()
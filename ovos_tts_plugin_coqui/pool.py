@@ -0,0 +1,189 @@
+import gc
+import sys
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
+
+from ovos_utils.log import LOG
+
+if TYPE_CHECKING:
+    from ovos_tts_plugin_coqui.metrics import Metrics
+
+ModelKey = namedtuple("ModelKey", ["model", "model_config", "vocoder", "vocoder_config", "device",
+                                   "quantize", "backend"])
+ModelKey.__new__.__defaults__ = (None, None, None, "cpu", False, "torch")
+
+
+def estimate_model_size(model) -> int:
+    """Return the size in bytes of all parameters and buffers of a torch module
+
+    Returns 0 if the size can not be determined
+    """
+    if hasattr(model, "nbytes"):  # not a torch module, eg. an onnx runtime session
+        return model.nbytes
+    try:
+        total = 0
+        for t in list(model.parameters()) + list(model.buffers()):
+            total += t.numel() * t.element_size()
+        return total
+    except Exception:
+        return 0
+
+
+class _PoolEntry:
+    def __init__(self, model, size: int):
+        self.model = model
+        self.size = size
+        self.last_used = time.monotonic()
+
+
+class ModelPool:
+    """Process wide cache of loaded coqui models
+
+    Models are keyed by their real identity (model, config, vocoder,
+    vocoder config, device), so the same checkpoint is only ever loaded once
+    no matter how many languages or plugin instances use it.
+
+    Eviction policy:
+        - max_ram_mb: least recently used models are unloaded while the
+          estimated size of the pool exceeds this budget
+        - max_models: least recently used models are unloaded while the
+          pool holds more than this number of models
+        - idle_timeout: models not used for this many seconds are unloaded
+
+    A value of 0 disables the corresponding limit
+
+    loads and evictions are reported to metrics if given
+    """
+
+    def __init__(self, max_ram_mb: float = 0, max_models: int = 0,
+                 idle_timeout: float = 0, metrics: "Metrics" = None):
+        self.max_ram_mb = max_ram_mb
+        self.metrics = metrics
+        self.max_models = max_models
+        self.idle_timeout = idle_timeout
+        self._models: Dict[ModelKey, _PoolEntry] = OrderedDict()
+        self._key_locks: Dict[ModelKey, threading.Lock] = {}
+        self._lock = threading.RLock()
+        self._reaper: Optional[threading.Thread] = None
+
+    def configure(self, max_ram_mb: float = None, max_models: int = None,
+                  idle_timeout: float = None):
+        """update the eviction policy, None values are left unchanged"""
+        with self._lock:
+            if max_ram_mb is not None:
+                self.max_ram_mb = max_ram_mb
+            if max_models is not None:
+                self.max_models = max_models
+            if idle_timeout is not None:
+                self.idle_timeout = idle_timeout
+            self._enforce_budget()
+        if self.idle_timeout and self._reaper is None:
+            self._reaper = threading.Thread(target=self._reap_loop, daemon=True)
+            self._reaper.start()
+
+    @property
+    def ram_usage_mb(self) -> float:
+        with self._lock:
+            return sum(e.size for e in self._models.values()) / 1024 / 1024
+
+    @property
+    def loaded_models(self) -> List[ModelKey]:
+        with self._lock:
+            return list(self._models.keys())
+
+    def __contains__(self, key: ModelKey) -> bool:
+        with self._lock:
+            return key in self._models
+
+    def get(self, key: ModelKey, loader: Callable[[], object]):
+        """return the model for key, calling loader() if it is not loaded yet
+
+        concurrent requests for the same key wait for a single load
+        """
+        with self._lock:
+            if key in self._models:
+                return self._touch(key)
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                if key in self._models:  # loaded while we waited
+                    return self._touch(key)
+            LOG.info(f"Loading coqui model: {key}")
+            if self.metrics is not None:
+                with self.metrics.stage("model_load"):
+                    model = loader()
+                self.metrics.count("model_loads", model=key.model)
+            else:
+                model = loader()
+            entry = _PoolEntry(model, estimate_model_size(model))
+            with self._lock:
+                self._models[key] = entry
+                self._key_locks.pop(key, None)
+                self._enforce_budget(keep=key)
+            return model
+
+    def evict(self, key: ModelKey) -> bool:
+        with self._lock:
+            entry = self._models.pop(key, None)
+        if entry is None:
+            return False
+        LOG.info(f"Unloading coqui model: {key}")
+        if self.metrics is not None:
+            self.metrics.count("model_evictions", model=key.model)
+        del entry
+        self._release_memory()
+        return True
+
+    def clear(self):
+        for key in self.loaded_models:
+            self.evict(key)
+
+    def reap(self):
+        """unload models that have been idle for longer than idle_timeout"""
+        if not self.idle_timeout:
+            return
+        now = time.monotonic()
+        with self._lock:
+            expired = [k for k, e in self._models.items()
+                       if now - e.last_used > self.idle_timeout]
+        for key in expired:
+            self.evict(key)
+
+    def _touch(self, key: ModelKey):
+        entry = self._models[key]
+        entry.last_used = time.monotonic()
+        self._models.move_to_end(key)
+        return entry.model
+
+    def _over_budget(self) -> bool:
+        if self.max_models and len(self._models) > self.max_models:
+            return True
+        if self.max_ram_mb and self.ram_usage_mb > self.max_ram_mb:
+            return True
+        return False
+
+    def _enforce_budget(self, keep: ModelKey = None):
+        with self._lock:
+            candidates = [k for k in self._models if k != keep]
+            while candidates and self._over_budget():
+                self.evict(candidates.pop(0))
+        if keep is not None and self._over_budget():
+            LOG.warning(f"Model {keep} alone exceeds the model pool budget")
+
+    def _reap_loop(self):
+        while True:
+            time.sleep(max(1.0, min(self.idle_timeout or 60, 60)))
+            try:
+                self.reap()
+            except Exception as e:
+                LOG.error(f"Model pool reaper failed: {e}")
+
+    @staticmethod
+    def _release_memory():
+        gc.collect()
+        torch = sys.modules.get("torch")
+        if torch is not None and torch.cuda.is_available():
+            torch.cuda.empty_cache()
@@ -0,0 +1,167 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterator, List, Union
+
+from ovos_utils.log import LOG
+
+from ovos_tts_plugin_coqui.aio import SynthesisCancelled
+from ovos_tts_plugin_coqui.scheduler import ModelScheduler, RequestRejected
+
+# below anything a caller can reasonably ask for, real requests always run first
+PRERENDER_PRIORITY = -1000
+
+# render(cancel) synthesizes one phrase into the cache, stopping with SynthesisCancelled once cancel is set
+RenderFn = Callable[["Preemption"], None]
+
+
+class Preemption:
+    """set while requests other than pre-renders wait for or use a model
+
+    passed as the cancel event of pre-render jobs, so a job stops at the
+    next sentence or chunk boundary as soon as a real request shows up
+    """
+
+    def __init__(self, scheduler: ModelScheduler):
+        self.scheduler = scheduler
+
+    def is_set(self) -> bool:
+        return self.scheduler.busy(min_priority=PRERENDER_PRIORITY + 1) > 0
+
+
+class Prerenderer:
+    """Renders predicted phrases in the background while the models are idle
+
+    jobs are keyed by the audio cache key of the request they predict,
+    submitting a phrase twice queues it once, when more than max_pending
+    jobs are queued the oldest are dropped
+
+    a job only starts once no real request used a model for idle_delay
+    seconds, it runs at PRERENDER_PRIORITY and is interrupted as soon as a
+    real request arrives, interrupted jobs go back to the front of the queue
+    """
+
+    def __init__(self, scheduler: ModelScheduler, max_pending: int = 256,
+                 idle_delay: float = 0.5):
+        self.scheduler = scheduler
+        self.max_pending = max_pending
+        self.idle_delay = idle_delay
+        self.rendered = 0
+        self.preempted = 0
+        self.dropped = 0
+        self._jobs: Dict[str, RenderFn] = OrderedDict()
+        self._cond = threading.Condition()
+        self._working = False
+        self._thread = None
+
+    def configure(self, max_pending: int = None, idle_delay: float = None):
+        """update the settings from the plugin "prerender" config, None values are left unchanged"""
+        if max_pending is not None:
+            self.max_pending = int(max_pending)
+        if idle_delay is not None:
+            self.idle_delay = float(idle_delay)
+
+    @property
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._jobs)
+
+    @property
+    def stats(self) -> dict:
+        return {"pending": self.pending, "rendered": self.rendered,
+                "preempted": self.preempted, "dropped": self.dropped}
+
+    def submit(self, key: str, render: RenderFn) -> bool:
+        """queue render under key, returns False if it is already queued"""
+        with self._cond:
+            if key in self._jobs:
+                return False
+            self._jobs[key] = render
+            while self.max_pending and len(self._jobs) > self.max_pending:
+                self._jobs.popitem(last=False)
+                self.dropped += 1
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="coqui-prerender", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+        return True
+
+    def clear(self):
+        with self._cond:
+            self._jobs.clear()
+
+    def join(self, timeout: float = None) -> bool:
+        """wait until the queue is empty, returns False on timeout"""
+        end = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._jobs or self._working:
+                remaining = None if end is None else end - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def _wait_idle(self):
+        """block until no real request used a model for idle_delay seconds"""
+        idle_since = time.monotonic()
+        while time.monotonic() - idle_since < self.idle_delay:
+            if self.scheduler.busy(min_priority=PRERENDER_PRIORITY + 1):
+                idle_since = time.monotonic()
+            time.sleep(min(0.05, self.idle_delay or 0.05))
+
+    def _run(self):
+        preemption = Preemption(self.scheduler)
+        while True:
+            with self._cond:
+                while not self._jobs:
+                    self._cond.wait()
+                key, render = self._jobs.popitem(last=False)
+                self._working = True
+            try:
+                self._wait_idle()
+                with self.scheduler.request(priority=PRERENDER_PRIORITY):
+                    render(preemption)
+                self.rendered += 1
+            except (SynthesisCancelled, RequestRejected):
+                self.preempted += 1
+                with self._cond:  # try again at the next idle period
+                    if key not in self._jobs:
+                        self._jobs[key] = render
+                        self._jobs.move_to_end(key, last=False)
+            except Exception as e:
+                LOG.warning(f"pre-rendering failed: {e}")
+            finally:
+                with self._cond:
+                    self._working = False
+                    self._cond.notify_all()
+
+
+def read_dialogs(folder: str) -> List[str]:
+    """the phrases of the .dialog files in folder, lines with {placeholders} can not be predicted and are skipped"""
+    phrases = []
+    for root, _, files in os.walk(os.path.expanduser(folder)):
+        for name in sorted(files):
+            if not name.endswith(".dialog"):
+                continue
+            with open(os.path.join(root, name), encoding="utf-8") as f:
+                phrases += [line.strip() for line in f
+                            if line.strip() and not line.startswith("#") and "{" not in line]
+    return list(dict.fromkeys(phrases))
+
+
+def iter_phrases(folders: Union[str, List[str]]) -> Iterator[str]:
+    """the phrases of the .dialog files in a folder or a list of folders"""
+    if isinstance(folders, str):
+        folders = [folders]
+    if not isinstance(folders, (list, tuple)) or not all(isinstance(f, str) for f in folders):
+        raise TypeError(f"dialog_dirs must be a folder or a list of folders, not {folders!r}")
+    return _iter_phrases(folders)
+
+
+def _iter_phrases(folders: List[str]) -> Iterator[str]:
+    for folder in folders:
+        try:
+            yield from read_dialogs(folder)
+        except OSError as e:
+            LOG.warning(f"can not read dialogs from {folder}: {e}")
@@ -0,0 +1,369 @@
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import TYPE_CHECKING, Callable, Dict, Hashable, List, Optional, Tuple
+
+from ovos_utils.log import LOG
+
+from ovos_tts_plugin_coqui.pool import ModelKey
+
+if TYPE_CHECKING:
+    from ovos_tts_plugin_coqui.metrics import Metrics, RequestRecord
+
+# (group, batch_fn, item), requests in the same group can be run together as batch_fn([item, ...])
+BatchSpec = Tuple[Hashable, Callable[[list], list], object]
+
+
+POLICIES = ("sjf", "fifo")
+
+
+class RequestRejected(RuntimeError):
+    """the scheduler shed a request, reason is "queue_full" or "deadline" """
+
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+class RequestOptions:
+    """scheduling options of the request running on the current thread"""
+
+    def __init__(self, priority: int = 0, deadline: float = None):
+        self.priority = priority
+        self.deadline = deadline  # time.perf_counter() value, None for no deadline
+
+
+class CostModel:
+    """run time of a model as overhead + rate * cost, fitted on recent calls
+
+    exponentially weighted least squares, so the estimate follows changes
+    in load, short calls (fixed overhead) do not inflate the per unit rate
+    """
+
+    def __init__(self, decay: float = 0.95):
+        self.decay = decay
+        self._n = self._x = self._y = self._xx = self._xy = 0.0
+
+    def add(self, cost: float, seconds: float):
+        d = self.decay
+        self._n = d * self._n + 1
+        self._x = d * self._x + cost
+        self._y = d * self._y + seconds
+        self._xx = d * self._xx + cost * cost
+        self._xy = d * self._xy + cost * seconds
+
+    def estimate(self, cost: float) -> float:
+        mean_x, mean_y = self._x / self._n, self._y / self._n
+        var = self._xx / self._n - mean_x ** 2
+        if var <= 1e-9 * max(1.0, mean_x ** 2):  # all calls the same size so far
+            return mean_y * cost / mean_x if mean_x else mean_y
+        rate = max(0.0, (self._xy / self._n - mean_x * mean_y) / var)
+        return max(0.0, mean_y + rate * (cost - mean_x))
+
+
+class _Request:
+    def __init__(self, fn: Callable, batch: Optional[BatchSpec],
+                 options: RequestOptions = None, cost: float = 0, estimate: float = 0,
+                 record: "RequestRecord" = None):
+        self.fn = fn
+        self.record = record  # metrics record of the caller, fn may run on another thread
+        self.batch = batch
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.done = False
+        self.queued = time.perf_counter()
+        self.started: Optional[float] = None
+        self.priority = options.priority if options else 0
+        self.deadline = options.deadline if options else None
+        self.cost = cost
+        self.estimate = estimate
+
+
+class _ModelQueue:
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.pending: List[_Request] = []
+        self.busy = False
+        self.owner: Optional[int] = None  # thread currently using the model
+        self.running: List[_Request] = []
+
+
+class ModelScheduler:
+    """Serializes access to each loaded model and optionally micro-batches requests
+
+    coqui models are not safe to use from several threads at once, every
+    call that touches a model goes through submit() and runs while no
+    other thread uses that model
+
+    with max_batch_size > 1 the thread that gets the model waits window_ms
+    for concurrent requests to arrive, pending requests that declare the
+    same batch group are then run together in a single call
+
+    the next request to run is picked by priority, then with the "sjf"
+    policy by the shortest estimated run time (cost, eg. characters, times
+    the seconds per cost unit measured for the model), waiting time counts
+    against the estimate (aging) so long requests are not starved, with
+    the "fifo" policy requests of the same priority run in arrival order
+
+    requests are shed with RequestRejected if the queue of a model already
+    holds max_queue requests (a request of higher priority takes the place
+    of the worst pending one) or if their deadline can not be met
+
+    queue waits, queue depth and rejections are reported to metrics if given,
+    fn runs on whichever thread holds the model, its stages are reported to
+    the metrics record of the thread that submitted it, the stages of a
+    micro batch to the record of the first request in the batch
+    """
+
+    def __init__(self, max_batch_size: int = 1, window_ms: float = 10,
+                 metrics: "Metrics" = None, policy: str = "sjf", max_queue: int = 0,
+                 aging: float = 1.0):
+        self.max_batch_size = max_batch_size
+        self.window_ms = window_ms
+        self.metrics = metrics
+        self.policy = policy
+        self.max_queue = max_queue
+        self.aging = aging
+        self.default_rate = 0.01  # seconds per cost unit until a model is measured
+        self._costs: Dict[ModelKey, CostModel] = {}
+        self._queues: Dict[ModelKey, _ModelQueue] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        if metrics is not None:
+            metrics.add_gauge("scheduler_queue_depth", lambda: self.queue_depth)
+
+    def configure(self, max_batch_size: int = None, window_ms: float = None,
+                  policy: str = None, max_queue: int = None, aging: float = None):
+        """update the batching and scheduling policy, None values are left unchanged"""
+        if max_batch_size is not None:
+            self.max_batch_size = max(1, int(max_batch_size))
+        if window_ms is not None:
+            self.window_ms = window_ms
+        if policy is not None:
+            if policy not in POLICIES:
+                raise ValueError(f"unknown scheduling policy '{policy}', valid: {POLICIES}")
+            self.policy = policy
+        if max_queue is not None:
+            self.max_queue = max(0, int(max_queue))
+        if aging is not None:
+            self.aging = float(aging)
+
+    # request options
+    def current(self) -> Optional[RequestOptions]:
+        return getattr(self._local, "options", None)
+
+    @contextmanager
+    def bind(self, options: Optional[RequestOptions]):
+        """schedule the model calls of this thread with options, used to follow a request across threads"""
+        previous = self.current()
+        self._local.options = options
+        try:
+            yield options
+        finally:
+            self._local.options = previous
+
+    def request(self, priority: int = None, deadline: float = None):
+        """context manager setting the priority (higher runs first) and the deadline
+        (seconds from now) of the model calls made by this thread, None keeps the
+        value of an enclosing request"""
+        outer = self.current()
+        if priority is None:
+            priority = outer.priority if outer else 0
+        if deadline is not None:
+            deadline = time.perf_counter() + deadline
+        elif outer is not None:
+            deadline = outer.deadline
+        return self.bind(RequestOptions(priority, deadline))
+
+    # estimates
+    def estimate(self, key: ModelKey, cost: float) -> float:
+        """estimated seconds to run a request of the given cost on a model"""
+        model = self._costs.get(key)
+        return model.estimate(cost) if model is not None else cost * self.default_rate
+
+    def _measured(self, key: ModelKey, cost: float, elapsed: float):
+        if cost > 0:
+            self._costs.setdefault(key, CostModel()).add(cost, elapsed)
+
+    @property
+    def queue_depth(self) -> int:
+        """requests waiting for a model, over all models"""
+        with self._lock:
+            queues = list(self._queues.values())
+        return sum(len(q.pending) for q in queues)
+
+    def busy(self, min_priority: int = None) -> int:
+        """requests waiting for or using a model, only those of at least min_priority if given"""
+        with self._lock:
+            queues = list(self._queues.values())
+        requests = [r for q in queues for r in list(q.pending) + list(q.running)]
+        if min_priority is not None:
+            requests = [r for r in requests if r.priority >= min_priority]
+        return len(requests)
+
+    def _order(self, req: _Request, now: float):
+        if self.policy == "fifo":
+            return -req.priority, req.queued
+        return -req.priority, req.estimate - self.aging * (now - req.queued), req.queued
+
+    def _queue(self, key: ModelKey) -> _ModelQueue:
+        with self._lock:
+            return self._queues.setdefault(key, _ModelQueue())
+
+    def submit(self, key: ModelKey, fn: Callable[[], object],
+               batch: BatchSpec = None, cost: float = 0):
+        """run fn() with exclusive use of the model identified by key, returns its result
+
+        if batch is given the request may instead be served by batch_fn
+        together with other pending requests of the same group
+
+        cost is the size of the request (eg. characters), used to estimate
+        its run time, raises RequestRejected if the request is shed
+        """
+        q = self._queue(key)
+        if q.owner == threading.get_ident():
+            return fn()  # nested call from the thread already using this model
+
+        req = _Request(fn, batch if self.max_batch_size > 1 else None,
+                       self.current(), cost, self.estimate(key, cost),
+                       self.metrics.current() if self.metrics is not None else None)
+        with q.cond:
+            self._admit(key, q, req)
+            q.pending.append(req)
+            while True:
+                self._expire(q)
+                if req.done:
+                    break
+                if q.busy:
+                    q.cond.wait(None if req.deadline is None else max(0.0, req.deadline - time.perf_counter()))
+                    continue
+                q.busy = True
+                q.owner = threading.get_ident()
+                q.cond.release()
+                try:
+                    self._run_next(key, q)
+                finally:
+                    q.cond.acquire()
+                    q.busy = False
+                    q.owner = None
+                    q.cond.notify_all()
+        if self.metrics is not None and req.started is not None:
+            self.metrics.add_stage("queue_wait", req.started - req.queued)
+        if req.error is not None:
+            raise req.error
+        return req.result
+
+    def _admit(self, key: ModelKey, q: _ModelQueue, req: _Request):
+        """shed requests that can not be served, called with q.cond held"""
+        now = time.perf_counter()
+        if req.deadline is not None and key in self._costs:  # unmeasured models are given a chance
+            order = self._order(req, now)
+            ahead = sum(r.estimate for r in q.pending if self._order(r, now) <= order)
+            ahead += sum(max(0.0, r.estimate - (now - (r.started or now))) for r in q.running)
+            if now + ahead + req.estimate > req.deadline:
+                self._rejected("deadline", f"deadline can not be met, ~{ahead + req.estimate:.2f}s of work ahead")
+        if self.max_queue and len(q.pending) >= self.max_queue:
+            worst = max(q.pending, key=lambda r: self._order(r, now))
+            if worst.priority >= req.priority:
+                self._rejected("queue_full", f"model queue is full ({len(q.pending)} requests)")
+            # make room, the caller of the worst request is woken up with the rejection
+            q.pending.remove(worst)
+            worst.error = RequestRejected("queue_full", "displaced by a request of higher priority")
+            worst.done = True
+            if self.metrics is not None:
+                self.metrics.count("scheduler_rejections", reason="queue_full")
+            q.cond.notify_all()
+
+    def _expire(self, q: _ModelQueue):
+        """fail pending requests whose deadline passed, called with q.cond held"""
+        now = time.perf_counter()
+        for r in [r for r in q.pending if r.deadline is not None and now >= r.deadline]:
+            q.pending.remove(r)
+            r.error = RequestRejected("deadline", "deadline passed while waiting for the model")
+            r.done = True
+            if self.metrics is not None:
+                self.metrics.count("scheduler_rejections", reason="deadline")
+            q.cond.notify_all()
+
+    def _rejected(self, reason: str, message: str):
+        if self.metrics is not None:
+            self.metrics.count("scheduler_rejections", reason=reason)
+        raise RequestRejected(reason, message)
+
+    def _run_next(self, key: ModelKey, q: _ModelQueue):
+        if self.max_batch_size > 1 and self.window_ms:
+            with q.cond:
+                can_batch = any(r.batch for r in q.pending) and len(q.pending) < self.max_batch_size
+            if can_batch:  # give concurrent callers a chance to join the batch
+                time.sleep(self.window_ms / 1000)
+        with q.cond:
+            self._expire(q)
+            if not q.pending:
+                return  # our own request was displaced or expired meanwhile
+            now = time.perf_counter()
+            head = min(q.pending, key=lambda r: self._order(r, now))
+            q.pending.remove(head)
+            batch = [head]
+            if head.batch is not None:
+                for r in list(q.pending):
+                    if len(batch) >= self.max_batch_size:
+                        break
+                    if r.batch is not None and r.batch[0] == head.batch[0]:
+                        batch.append(r)
+                        q.pending.remove(r)
+            q.running = batch
+        start = time.perf_counter()
+        try:
+            if len(batch) > 1:
+                self._run_batch(batch)
+            else:
+                self._run_one(head)
+            self._measured(key, sum(r.cost for r in batch), time.perf_counter() - start)
+        finally:
+            for r in batch:  # never leave a caller waiting for a request nobody runs
+                if not r.done:
+                    r.error = r.error or RuntimeError("request was not run")
+                    r.done = True
+            with q.cond:
+                q.running = []
+
+    def _metrics_of(self, req: _Request):
+        """attribute the stages timed while running req to the request that submitted it"""
+        if self.metrics is None:
+            return nullcontext()
+        return self.metrics.bind(req.record)
+
+    def _run_one(self, req: _Request):
+        req.started = req.started or time.perf_counter()
+        try:
+            with self._metrics_of(req):
+                req.result = req.fn()
+        except BaseException as e:
+            req.error = e
+        req.done = True
+
+    def _run_batch(self, batch: List[_Request]):
+        batch_fn = batch[0].batch[1]
+        started = time.perf_counter()
+        for r in batch:
+            r.started = started
+        try:
+            with self._metrics_of(batch[0]):
+                results = list(batch_fn([r.batch[2] for r in batch]))
+            if len(results) != len(batch):
+                raise ValueError(f"got {len(results)} results for {len(batch)} requests")
+        except Exception as e:
+            # one bad request should not fail the others
+            LOG.warning(f"batched synthesis failed, running {len(batch)} requests one by one: {e}")
+            for r in batch:
+                self._run_one(r)
+            return
+        except BaseException as e:
+            # eg. KeyboardInterrupt, raised to every caller like _run_one does
+            for r in batch:
+                r.error = e
+                r.done = True
+            return
+        for r, result in zip(batch, results):
+            r.result = result
+            r.done = True
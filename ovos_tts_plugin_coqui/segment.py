@@ -0,0 +1,59 @@
+import re
+from typing import List
+
+# sentence terminators, CJK and some other scripts do not use a space after them
+_SENTENCE_END = re.compile(r'(?<=[.!?…])\s+|(?<=[.!?…]["\')\]»”’])\s+|(?<=[。！？؟۔।॥።])\s*')
+_CLAUSE_END = re.compile(r'(?<=[,;:，；：、،])\s*')
+# a period after these titles or dotted initialisms (e.g., p.m., U.S.) does not end the sentence,
+# a single letter does ("take vitamin C. Then rest.")
+_ABBREVIATION = re.compile(r'(?:^|\s)(?:mr|mrs|ms|dr|prof|sr|jr|st|vs|(?:[a-z]\.)+[a-z])\.$', re.IGNORECASE)
+# languages written without spaces between words
+_NO_SPACE_LANGS = ("zh", "ja", "th", "lo", "km", "my")
+
+
+def split_sentences(text: str, lang: str = "en", max_chars: int = 250) -> List[str]:
+    """split text into sentences, sentences longer than max_chars are split into clauses
+    and then at word boundaries so every segment stays below max_chars"""
+    text = " ".join(text.split())
+    sentences = []
+    for sentence in _SENTENCE_END.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if sentences and _ABBREVIATION.search(sentences[-1]):
+            sentences[-1] = f"{sentences[-1]} {sentence}"
+        else:
+            sentences.append(sentence)
+
+    segments = []
+    for sentence in sentences:
+        if len(sentence) <= max_chars:
+            segments.append(sentence)
+            continue
+        segments += _split_long(sentence, lang, max_chars)
+    return segments
+
+
+def _split_long(sentence: str, lang: str, max_chars: int) -> List[str]:
+    joiner = "" if lang.split("-")[0].lower() in _NO_SPACE_LANGS else " "
+    segments = []
+    current = ""
+    for clause in _CLAUSE_END.split(sentence):
+        if not clause:
+            continue
+        candidate = f"{current}{joiner}{clause}" if current else clause
+        if len(candidate) <= max_chars:
+            current = candidate
+            continue
+        if current:
+            segments.append(current)
+        current = ""
+        while len(clause) > max_chars:  # no punctuation left, break at a word boundary
+            cut = clause.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            segments.append(clause[:cut].strip())
+            clause = clause[cut:].strip()
+        current = clause
+    if current:
+        segments.append(current)
+    return segments
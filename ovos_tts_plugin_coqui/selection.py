@@ -0,0 +1,250 @@
+import hashlib
+import json
+import os
+import platform
+import threading
+import time
+from functools import lru_cache
+from importlib import metadata, util
+from typing import Callable, Dict, List, Optional
+
+from ovos_utils.log import LOG
+
+from ovos_tts_plugin_coqui.util import get_cache_dir
+
+DEFAULT_SENTENCE = "The quick brown fox jumps over the lazy dog."
+
+
+def _package_version(*names: str) -> Optional[str]:
+    for name in names:
+        try:
+            return metadata.version(name)
+        except metadata.PackageNotFoundError:
+            continue
+    return None
+
+
+@lru_cache()
+def host_fingerprint(device: str = "cpu", num_threads: int = None) -> dict:
+    """what the measured speed of a model depends on, besides the model itself"""
+    cpu = platform.processor()
+    if os.path.isfile("/proc/cpuinfo"):
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith(("model name", "Model")):
+                    cpu = line.split(":", 1)[1].strip()
+                    break
+    try:
+        ram_gb = round(os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 1024 ** 3, 1)
+    except (ValueError, OSError, AttributeError):
+        ram_gb = None
+    return {"machine": platform.machine(),
+            "cpu": cpu,
+            "cpu_count": os.cpu_count(),
+            "ram_gb": ram_gb,
+            "device": device,
+            "num_threads": num_threads,
+            "torch": _package_version("torch"),
+            "coqui": _package_version("coqui-tts", "TTS"),
+            "onnxruntime": _package_version("onnxruntime")}
+
+
+def fingerprint_id(fingerprint: dict) -> str:
+    return hashlib.sha256(json.dumps(fingerprint, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def _tts_data_dir() -> str:
+    try:
+        from trainer.io import get_user_data_dir
+        return str(get_user_data_dir("tts"))
+    except ImportError:
+        return os.path.join(os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share"), "tts")
+
+
+def model_version(model: str) -> Optional[str]:
+    """changes when the model files change, None if the model is unknown"""
+    if os.path.isfile(model):
+        stat = os.stat(model)
+        return f"{stat.st_size}-{int(stat.st_mtime)}"
+    spec = util.find_spec("TTS")
+    if spec is None or not spec.submodule_search_locations:
+        return None
+    models_file = os.path.join(list(spec.submodule_search_locations)[0], ".models.json")
+    try:
+        with open(models_file, encoding="utf-8") as f:
+            entry = json.load(f)
+        for part in model.split("/"):
+            entry = entry[part]
+    except (OSError, KeyError, TypeError, ValueError):
+        return None
+    return hashlib.sha256(json.dumps(entry, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def is_downloaded(model: str) -> bool:
+    if os.path.isfile(model):
+        return True
+    return os.path.isdir(os.path.join(_tts_data_dir(), model.replace("/", "--")))
+
+
+class ModelProfiles:
+    """Load time, real time factor and memory of models measured on this host
+
+    stored as json, entries are keyed by the host fingerprint so a profile
+    file copied to a different machine (or a torch / coqui upgrade) triggers
+    new measurements, each entry also records the version of the model
+    """
+
+    def __init__(self, path: str = None):
+        self._path = path
+        self._data: Optional[Dict[str, dict]] = None
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> str:
+        if not self._path:
+            self._path = os.path.join(get_cache_dir("profiles"), "models.json")
+        return self._path
+
+    def configure(self, path: str = None):
+        with self._lock:
+            if path and os.path.expanduser(path) != self._path:
+                self._path = os.path.expanduser(path)
+                self._data = None
+
+    def _load(self) -> Dict[str, dict]:
+        if self._data is None:
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    self._data = json.load(f)
+            except (OSError, ValueError):
+                self._data = {}
+        return self._data
+
+    def get(self, host_id: str, name: str) -> Optional[dict]:
+        with self._lock:
+            return self._load().get(host_id, {}).get(name)
+
+    def put(self, host_id: str, name: str, profile: dict):
+        with self._lock:
+            data = self._load()
+            data.setdefault(host_id, {})[name] = profile
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2, sort_keys=True)
+            os.replace(tmp, self.path)
+
+
+def fits_budget(profile: dict, budget: dict) -> bool:
+    """check a profile against the "auto_select" constraints"""
+    if not profile.get("ok"):
+        return False
+    limits = (("max_rtf", "rtf"), ("max_ram_mb", "ram_mb"), ("max_load_time", "load_time_s"))
+    for limit, field in limits:
+        if budget.get(limit) and profile.get(field) is not None and profile[field] > budget[limit]:
+            return False
+    if budget.get("min_sample_rate") and (profile.get("sample_rate") or 0) < budget["min_sample_rate"]:
+        return False
+    return True
+
+
+def choose_model(candidates: List[str], profiles: Dict[str, dict], budget: dict) -> Optional[str]:
+    """pick a model from profiled candidates
+
+    candidates are in order of preference (LANG2MODEL order), with
+    "prefer": "quality" the first one that fits the budget wins, with
+    "latency" or "memory" the fastest or smallest one that fits,
+    if nothing fits the fastest or smallest working model is used
+    """
+    working = [m for m in candidates if profiles.get(m, {}).get("ok")]
+    if not working:
+        return None
+    fitting = [m for m in working if fits_budget(profiles[m], budget)]
+    prefer = budget.get("prefer", "quality")
+    field = "rtf"
+    if prefer == "memory" or (prefer == "quality" and budget.get("max_ram_mb") and not budget.get("max_rtf")):
+        field = "ram_mb"
+    if fitting and prefer == "quality":
+        return fitting[0]
+    pool = fitting or working
+    if not fitting:
+        LOG.warning(f"no model fits the auto_select budget {budget}, using the best available")
+    return min(pool, key=lambda m: profiles[m].get(field) or float("inf"))
+
+
+class ModelSelector:
+    """Chooses the model of a language among its LANG2MODEL candidates by measured speed
+
+    candidates are profiled once per host, model version and settings,
+    the measurements are persisted in ModelProfiles and the choice is
+    remembered for the lifetime of the process
+
+    choices already made are returned while other languages are profiled,
+    one model is measured at a time so measurements do not compete for the CPU
+    """
+
+    def __init__(self, profiles: ModelProfiles = None):
+        self.profiles = profiles or ModelProfiles()
+        self._choices: Dict[str, str] = {}
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._measure_lock = threading.Lock()
+
+    def select(self, lang: str, candidates: List[str], budget: dict, host: dict,
+               settings: Callable[[str], str], profile: Callable[[str], dict]) -> str:
+        """return the model to use for lang
+
+        - settings(model) identifies the runtime settings a profile is valid for
+          (backend, quantization...)
+        - profile(model) loads the model and measures it, returns a profile dict
+        """
+        choice_key = json.dumps([lang, candidates, budget, host], sort_keys=True)
+        with self._lock:
+            if choice_key in self._choices:
+                return self._choices[choice_key]
+            key_lock = self._key_locks.setdefault(choice_key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                if choice_key in self._choices:  # chosen while we waited
+                    return self._choices[choice_key]
+            choice = self._choose(lang, candidates, budget, host, settings, profile)
+            with self._lock:
+                self._choices[choice_key] = choice
+                self._key_locks.pop(choice_key, None)
+            return choice
+
+    def _choose(self, lang: str, candidates: List[str], budget: dict, host: dict,
+                settings: Callable[[str], str], profile: Callable[[str], dict]) -> str:
+        host_id = fingerprint_id(host)
+        measured = {}
+        for model in candidates:
+            if budget.get("download") is not True and not is_downloaded(model) and model != candidates[0]:
+                continue  # only the default model is downloaded automatically
+            if model in budget.get("exclude", []):
+                continue
+            name = f"{model}|{settings(model)}"
+            version = model_version(model)
+            cached = self.profiles.get(host_id, name)
+            if cached is None or cached.get("model_version") != version:
+                cached = self._measure(lang, model, profile)
+                cached.update(model_version=version, profiled_at=time.time())
+                self.profiles.put(host_id, name, cached)
+            measured[model] = cached
+        choice = choose_model(candidates, measured, budget) or candidates[0]
+        LOG.info(f"auto selected {choice} for '{lang}'")
+        return choice
+
+    def _measure(self, lang: str, model: str, profile: Callable[[str], dict]) -> dict:
+        with self._measure_lock:
+            LOG.info(f"profiling {model} for '{lang}' on this host")
+            try:
+                return dict(profile(model), ok=True)
+            except Exception as e:
+                LOG.warning(f"profiling {model} failed: {e}")
+                return {"ok": False, "error": f"{e.__class__.__name__}: {e}"}
+
+    def forget(self):
+        """choose again on the next request, eg. after changing the budget"""
+        with self._lock:
+            self._choices.clear()
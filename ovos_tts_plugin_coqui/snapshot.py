@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+from typing import TYPE_CHECKING, Callable, Optional
+
+from ovos_utils.log import LOG
+
+from ovos_tts_plugin_coqui.pool import ModelKey
+from ovos_tts_plugin_coqui.selection import host_fingerprint, model_version
+from ovos_tts_plugin_coqui.util import get_cache_dir
+
+if TYPE_CHECKING:
+    from ovos_tts_plugin_coqui.metrics import Metrics
+
+SNAPSHOT_FILE = "model.pt"
+META_FILE = "meta.json"
+
+
+def _safe_name(model: str) -> str:
+    return "".join(c if c.isalnum() or c in "_." else "-" for c in model)[-64:]
+
+
+class ModelSnapshots:
+    """Snapshots of fully constructed coqui models in a local cache folder
+
+    the first load of a model pickles the whole TTS object (config,
+    tokenizer and phonemizer state, vocoder and weights) with torch.save,
+    later loads restore it with torch.load(mmap=True): no manifest lookup,
+    config parsing or checkpoint conversion, and the weights are mapped
+    from the snapshot file instead of copied to the heap, so processes
+    using the same model share its pages through the page cache
+
+    snapshots are keyed by the model, its version and the torch, coqui and
+    python versions, a snapshot of an older version is replaced, models
+    that can not be pickled are remembered and always built normally
+
+    only cpu models are snapshotted, quantization and other settings are
+    applied to the restored model like to a freshly built one, onnx backend
+    models are not snapshotted, torch only loads them to export the graph
+
+    a snapshot is a pickle, restoring it (weights_only=False) runs whatever
+    code the file contains, so the snapshot folder must only be writable by
+    the user running the plugin, folders are created 0700 and snapshots in
+    folders that other users can write to are never loaded
+    """
+
+    def __init__(self, path: str = None, enabled: bool = False, mmap: bool = True,
+                 metrics: "Metrics" = None):
+        self._path = path
+        self.enabled = enabled
+        self.mmap = mmap
+        self.metrics = metrics
+
+    @property
+    def path(self) -> str:
+        if not self._path:
+            self._path = get_cache_dir("snapshots")
+        return self._path
+
+    def configure(self, enabled: bool = None, path: str = None, mmap: bool = None):
+        """update the settings from the plugin "snapshots" config, None values are left unchanged"""
+        if enabled is not None:
+            self.enabled = bool(enabled)
+        if path:
+            self._path = os.path.expanduser(path)
+        if mmap is not None:
+            self.mmap = bool(mmap)
+
+    def folder_for(self, key: ModelKey) -> str:
+        host = host_fingerprint()
+        identity = {"model": [key.model, key.model_config, key.vocoder, key.vocoder_config],
+                    "version": [model_version(key.model), model_version(key.vocoder) if key.vocoder else None],
+                    "torch": host["torch"],
+                    "coqui": host["coqui"],
+                    "python": list(sys.version_info[:2])}
+        digest = hashlib.sha256(json.dumps(identity, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.path, f"{_safe_name(key.model)}-{digest}")
+
+    @staticmethod
+    def _read_meta(folder: str) -> Optional[dict]:
+        try:
+            with open(os.path.join(folder, META_FILE), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def load(self, key: ModelKey, build: Callable[[], object]):
+        """return the model for key from its snapshot, calling build() and snapshotting the result if needed"""
+        if not self.enabled or key.device != "cpu" or key.backend == "onnx":
+            return build()
+        folder = self.folder_for(key)
+        meta = self._read_meta(folder)
+        if meta and meta.get("ok") and not self._is_private(folder):
+            LOG.warning(f"not loading the snapshot in {folder}, other users can write to it")
+            meta = {"ok": False}
+        elif meta and meta.get("ok"):
+            try:
+                start = time.perf_counter()
+                tts = self._restore(os.path.join(folder, SNAPSHOT_FILE))
+                LOG.info(f"restored {key.model} from snapshot in {time.perf_counter() - start:.2f}s")
+                self._count("hit", key)
+                return tts
+            except Exception as e:
+                LOG.warning(f"snapshot of {key.model} is unusable, rebuilding it: {e}")
+        self._count("miss", key)
+        tts = build()
+        if meta is None or meta.get("ok"):
+            self.save(key, tts, folder)
+        return tts
+
+    @staticmethod
+    def _is_private(folder: str) -> bool:
+        """the folder and its parent are owned by this user and nobody else can write to them"""
+        for path in (folder, os.path.dirname(folder)):
+            st = os.stat(path)
+            if (hasattr(os, "getuid") and st.st_uid != os.getuid()) or st.st_mode & 0o022:
+                return False
+        return True
+
+    def _restore(self, path: str):
+        import torch
+        try:
+            return torch.load(path, map_location="cpu", mmap=self.mmap, weights_only=False)
+        except TypeError:  # torch < 2.1, no mmap support
+            return torch.load(path, map_location="cpu")
+
+    def save(self, key: ModelKey, tts, folder: str = None):
+        """write the snapshot of a freshly built (not yet instrumented or quantized) model"""
+        import torch
+        folder = folder or self.folder_for(key)
+        for path in (self.path, folder):
+            os.makedirs(path, mode=0o700, exist_ok=True)
+            os.chmod(path, 0o700)  # also when the folder already existed
+        path = os.path.join(folder, SNAPSHOT_FILE)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        meta = {"model": key.model, "key": [key.model, key.model_config, key.vocoder, key.vocoder_config],
+                "created": time.time()}
+        try:
+            torch.save(tts, tmp)
+            os.replace(tmp, path)
+            meta.update(ok=True, size_mb=round(os.path.getsize(path) / 1024 / 1024, 1))
+            LOG.info(f"saved snapshot of {key.model} to {folder}")
+        except Exception as e:
+            LOG.warning(f"{key.model} can not be snapshotted, it will be built on every start: {e}")
+            meta.update(ok=False, error=f"{e.__class__.__name__}: {e}")
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        meta_tmp = os.path.join(folder, f"{META_FILE}.{os.getpid()}.tmp")
+        with open(meta_tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(meta_tmp, os.path.join(folder, META_FILE))
+        self._remove_outdated(folder)
+
+    def _remove_outdated(self, folder: str):
+        """delete snapshots of older versions of the same model"""
+        name = os.path.basename(folder)
+        prefix = name.rsplit("-", 1)[0] + "-"
+        identity = (self._read_meta(folder) or {}).get("key")
+        for other in os.listdir(self.path):
+            if other == name or not other.startswith(prefix):
+                continue
+            other_folder = os.path.join(self.path, other)
+            if (self._read_meta(other_folder) or {}).get("key") == identity:
+                shutil.rmtree(other_folder, ignore_errors=True)
+
+    def clear(self):
+        """delete all snapshots"""
+        for name in os.listdir(self.path):
+            shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+
+    def _count(self, result: str, key: ModelKey):
+        if self.metrics is not None:
+            self.metrics.count("model_snapshots", result=result, model=key.model)
@@ -0,0 +1,131 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict
+
+from ovos_utils.log import LOG
+
+from ovos_tts_plugin_coqui.util import file_hash, get_cache_dir
+
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".flac", ".ogg")
+
+
+class SpeakerCache:
+    """Caches voices computed from reference audio for voice cloning
+
+    a voice is a dict of conditioning tensors, eg. the gpt latents and
+    speaker embedding for XTTS or a d-vector for YourTTS, in the same format
+    coqui uses for its own voice files
+
+    voices are keyed by a content hash of the reference audio plus the model id
+    and kept in a bounded in memory LRU backed by .pth files on disk,
+    the disk folder can be passed to coqui as a voice_dir
+    """
+
+    def __init__(self, cache_dir: str = None, max_items: int = 32):
+        self._cache_dir = cache_dir
+        self.max_items = max_items
+        self._voices: Dict[str, dict] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def cache_dir(self) -> str:
+        if not self._cache_dir:
+            self._cache_dir = get_cache_dir("voices")
+        os.makedirs(self._cache_dir, exist_ok=True)
+        return self._cache_dir
+
+    def configure(self, cache_dir: str = None, max_items: int = None):
+        if cache_dir:
+            self._cache_dir = cache_dir
+        if max_items is not None:
+            self.max_items = max_items
+
+    @staticmethod
+    def voice_id(model_id: str, speaker_wav: str) -> str:
+        """filename safe identifier of the voice for speaker_wav under model_id"""
+        h = hashlib.sha256(f"{model_id}|{file_hash(speaker_wav)}".encode("utf-8"))
+        return h.hexdigest()[:32]
+
+    def get(self, model_id: str, speaker_wav: str,
+            compute: Callable[[str], dict], device: str = "cpu") -> dict:
+        """return the cached voice, calling compute(speaker_wav) only on a full miss"""
+        import torch
+
+        voice_id = self.voice_id(model_id, speaker_wav)
+        with self._lock:
+            if voice_id in self._voices:
+                self._voices.move_to_end(voice_id)
+                return self._voices[voice_id]
+
+        path = os.path.join(self.cache_dir, f"{voice_id}.pth")
+        voice = None
+        try:
+            voice = torch.load(path, map_location=device)
+        except FileNotFoundError:
+            pass
+        except Exception as e:  # truncated, unreadable or from an incompatible torch, recompute it
+            LOG.warning(f"unreadable voice cache file {path}: {e}")
+        if voice is None:
+            LOG.debug(f"computing voice for {speaker_wav} ({model_id})")
+            voice = compute(speaker_wav)
+            self._save(voice, path)
+
+        with self._lock:
+            self._voices[voice_id] = voice
+            while self.max_items and len(self._voices) > self.max_items:
+                self._voices.popitem(last=False)
+        return voice
+
+    @staticmethod
+    def _save(voice: dict, path: str):
+        """write the voice file atomically, a reader never sees a partial file"""
+        import torch
+
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            torch.save(voice, tmp)
+            os.replace(tmp, path)
+        except Exception as e:
+            LOG.warning(f"failed to cache voice {path}: {e}")
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def precompute(self, model_id: str, voices_dir: str,
+                   compute: Callable[[str], dict], device: str = "cpu") -> int:
+        """compute (or load) the voices of all audio files in voices_dir, returns how many"""
+        count = 0
+        for f in sorted(os.listdir(voices_dir)):
+            if not f.lower().endswith(AUDIO_EXTENSIONS):
+                continue
+            try:
+                self.get(model_id, os.path.join(voices_dir, f), compute, device)
+                count += 1
+            except Exception as e:
+                LOG.error(f"failed to compute voice for {f}: {e}")
+        return count
+
+
+def supports_voice_cache(tts) -> bool:
+    """XTTS models and models with a speaker encoder (eg. YourTTS) clone voices from conditioning tensors"""
+    model = tts.synthesizer.tts_model
+    if model.__class__.__name__ == "Xtts":
+        return True
+    speaker_manager = getattr(model, "speaker_manager", None)
+    return getattr(speaker_manager, "encoder", None) is not None and hasattr(model, "clone_voice")
+
+
+def compute_voice(tts, speaker_wav: str) -> dict:
+    """run the speaker encoder of the model on speaker_wav"""
+    model = tts.synthesizer.tts_model
+    if model.__class__.__name__ == "Xtts":
+        gpt_cond_latent, speaker_embedding = model.get_conditioning_latents(
+            audio_path=speaker_wav,
+            gpt_cond_len=model.config.gpt_cond_len,
+            gpt_cond_chunk_len=model.config.gpt_cond_chunk_len,
+            max_ref_length=model.config.max_ref_len,
+            sound_norm_refs=model.config.sound_norm_refs)
+        return {"gpt_conditioning_latents": gpt_cond_latent,
+                "speaker_embedding": speaker_embedding}
+    return {"d_vector": model.speaker_manager.compute_embedding_from_clip(speaker_wav)}
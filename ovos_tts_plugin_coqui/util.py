@@ -0,0 +1,27 @@
+import hashlib
+import os
+from functools import lru_cache
+
+from ovos_config.locations import get_xdg_cache_save_path
+
+
+def get_cache_dir(*subfolders: str) -> str:
+    """return (and create) a folder under the ovos XDG cache for this plugin"""
+    path = os.path.join(get_xdg_cache_save_path(), "coqui", *subfolders)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+@lru_cache(maxsize=1024)
+def _hash_content(path: str, mtime_ns: int, size: int) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def file_hash(path: str) -> str:
+    """sha256 of a file's content, memoized (for the 1024 most recent files) while the file is unchanged"""
+    st = os.stat(path)
+    return _hash_content(os.path.abspath(path), st.st_mtime_ns, st.st_size)
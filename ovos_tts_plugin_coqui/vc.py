@@ -0,0 +1,28 @@
+import numpy as np
+
+FREEVC_MODEL = "voice_conversion_models/multilingual/vctk/freevc24"
+
+
+def freevc_sample_rate(vc_tts) -> int:
+    return vc_tts.voice_converter.vc_model.config.audio.output_sample_rate
+
+
+def freevc_target_voice(vc_tts, target_wav: str) -> dict:
+    """compute the target speaker embedding of target_wav"""
+    return vc_tts.voice_converter.vc_model.clone_voice(target_wav)
+
+
+def freevc_convert(vc_tts, wav: np.ndarray, sample_rate: int, voice: dict) -> np.ndarray:
+    """convert a waveform to the voice returned by freevc_target_voice, without touching the disk"""
+    import librosa
+    import torch
+
+    model = vc_tts.voice_converter.vc_model
+    input_sample_rate = model.config.audio.input_sample_rate
+    wav = np.asarray(wav, dtype=np.float32)
+    if sample_rate != input_sample_rate:
+        wav = librosa.resample(wav, orig_sr=sample_rate, target_sr=input_sample_rate)
+    with torch.inference_mode():
+        c = model.extract_wavlm_features(model.load_audio(wav))
+        audio = model.inference(c, g=voice["speaker_embedding"])
+    return audio[0][0].data.cpu().float().numpy()
@@ -0,0 +1,69 @@
+from typing import TYPE_CHECKING, List
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from TTS.api import TTS as CTTS
+
+
+def is_vits(tts: "CTTS") -> bool:
+    """VITS family models, this includes the fairseq (MMS) checkpoints"""
+    synthesizer = getattr(tts, "synthesizer", None)
+    model = getattr(synthesizer, "tts_model", None)
+    return model is not None and model.__class__.__name__ == "Vits"
+
+
+def synth_vits_batch(tts: "CTTS", texts: List[str],
+                     speaker: str = None,
+                     language: str = None,
+                     voice_dir: str = None) -> List[np.ndarray]:
+    """synthesize several texts with a single forward pass of a VITS model
+
+    every text is split into sentences like coqui does, all sentences are
+    padded into one batch and the output is trimmed back per sentence,
+    returns one float waveform per text
+    """
+    import torch
+    from TTS.utils.synthesizer import PAD_SILENCE_SAMPLES
+
+    synthesizer = tts.synthesizer
+    model = synthesizer.tts_model
+    device = model.device
+
+    sentences, owners = [], []
+    for idx, text in enumerate(texts):
+        for sentence in synthesizer.split_into_sentences(text):
+            sentences.append(sentence)
+            owners.append(idx)
+    ids = [model.tokenizer.text_to_ids(s, language=language) for s in sentences]
+    batch_size = len(ids)
+    lengths = torch.tensor([len(i) for i in ids], dtype=torch.long, device=device)
+    x = torch.zeros((batch_size, int(lengths.max())), dtype=torch.long, device=device)
+    for i, seq in enumerate(ids):
+        x[i, :len(seq)] = torch.as_tensor(seq, dtype=torch.long, device=device)
+
+    speaker_id, d_vector = model._get_speaker_id_or_dvector(speaker, None, voice_dir)
+    language_id = model._get_language_id(language)
+    aux_input = {
+        "x_lengths": lengths,
+        "speaker_ids": speaker_id.reshape(1).expand(batch_size) if speaker_id is not None else None,
+        "d_vectors": d_vector.expand(batch_size, -1) if d_vector is not None else None,
+        "language_ids": torch.tensor(language_id, device=device).reshape(1).expand(batch_size)
+        if language_id is not None else None
+    }
+    with torch.inference_mode():
+        outputs = model.inference(x, aux_input=aux_input)
+
+    wavs = outputs["model_outputs"].squeeze(1).cpu().numpy()
+    frames = outputs["y_mask"].squeeze(1).sum(dim=1).long().tolist()
+    hop = int(np.prod(model.args.upsample_rates_decoder))
+    trim = "do_trim_silence" in synthesizer.tts_config.audio and synthesizer.tts_config.audio["do_trim_silence"]
+    pad = np.zeros(PAD_SILENCE_SAMPLES, dtype=np.float32)
+
+    results = [[] for _ in texts]
+    for wav, n_frames, owner in zip(wavs, frames, owners):
+        wav = wav[:n_frames * hop]
+        if trim:
+            wav = wav[:model.ap.find_endpoint(wav)]
+        results[owner] += [wav.astype(np.float32), pad]
+    return [np.concatenate(r) for r in results]
@@ -0,0 +1,387 @@
+"""Out of process synthesis
+
+a pool of local worker processes owns the models and serves synthesis
+requests over a Unix domain socket, plugins configured with "worker"
+forward their requests to it instead of loading models themselves
+
+    python -m ovos_tts_plugin_coqui.worker --socket /run/user/1000/ovos-coqui.sock --workers 2
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import socketserver
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+from ovos_utils.log import LOG
+
+DEFAULT_SOCKET = os.path.join(os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir(), "ovos-coqui.sock")
+
+_HEADER = struct.Struct(">I")
+
+# plugin settings a client may choose per request, everything else (cache folders, metrics
+# callbacks, thread counts, files to read or programs to run) is the worker's own configuration
+REMOTE_CONFIG_KEYS = ("model", "model_config", "vocoder", "vocoder_config", "voice", "reference_speaker",
+                      "use_freeVC", "gpu", "quantize", "backend", "inference_mode",
+                      "pipeline", "pipeline_lookahead", "sentence_silence", "max_segment_chars",
+                      "streaming", "stream_chunk_size", "stream_overlap", "audio_output")
+REMOTE_AUDIO_OUTPUT_KEYS = ("encoder", "bitrate")
+
+
+@contextmanager
+def _socket_umask():
+    """unix sockets bound in this block are created owner and group only (0660), never with the process umask"""
+    previous = os.umask(0o117)
+    try:
+        yield
+    finally:
+        os.umask(previous)
+
+
+def send_msg(sock: socket.socket, header: dict, payload: bytes = b""):
+    """send a json header followed by an optional binary payload"""
+    header = dict(header, size=len(payload))
+    data = json.dumps(header).encode("utf-8")
+    sock.sendall(_HEADER.pack(len(data)) + data + payload)
+
+
+def recv_msg(sock: socket.socket) -> Tuple[Optional[dict], bytes]:
+    """receive a message sent by send_msg, returns (None, b"") if the connection was closed"""
+    raw = _recv_exact(sock, _HEADER.size)
+    if raw is None:
+        return None, b""
+    header = json.loads(_recv_exact(sock, _HEADER.unpack(raw)[0]).decode("utf-8"))
+    payload = _recv_exact(sock, header["size"]) if header.get("size") else b""
+    return header, payload
+
+
+def _recv_exact(sock: socket.socket, n: int) -> Optional[bytes]:
+    buf = b""
+    while len(buf) < n:
+        data = sock.recv(n - len(buf))
+        if not data:
+            if buf:
+                raise ConnectionError("connection closed mid message")
+            return None
+        buf += data
+    return buf
+
+
+def remote_config(config: dict) -> dict:
+    """the part of a client's plugin config that a worker applies, unknown keys are dropped"""
+    config = {k: v for k, v in (config or {}).items() if k in REMOTE_CONFIG_KEYS}
+    if isinstance(config.get("audio_output"), dict):
+        config["audio_output"] = {k: v for k, v in config["audio_output"].items()
+                                  if k in REMOTE_AUDIO_OUTPUT_KEYS}
+    return config
+
+
+class WorkerClient:
+    """client side of the worker pool, used by plugins configured with "worker" """
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET, timeout: float = 120):
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    @classmethod
+    def from_config(cls, config: Union[str, dict, None]) -> Optional["WorkerClient"]:
+        """return a client for a plugin "worker" config, or None if running in process"""
+        if not config:
+            return None
+        if config is True:
+            config = {}
+        if isinstance(config, str):
+            config = {"socket": config}
+        return cls(config.get("socket") or DEFAULT_SOCKET, config.get("timeout", 120))
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        return sock
+
+    def request(self, method: str, **params) -> Tuple[dict, bytes]:
+        with self._connect() as sock:
+            send_msg(sock, {"method": method, "params": params})
+            header, payload = recv_msg(sock)
+        return self._check(header), payload
+
+    def stream(self, method: str, **params) -> Iterator[bytes]:
+        with self._connect() as sock:
+            send_msg(sock, {"method": method, "params": params})
+            while True:
+                header, payload = recv_msg(sock)
+                self._check(header)
+                if not header.get("chunk"):
+                    return
+                yield payload
+
+    @staticmethod
+    def _check(header: Optional[dict]) -> dict:
+        if header is None:
+            raise RuntimeError("coqui worker closed the connection")
+        if not header.get("ok"):
+            raise RuntimeError(f"coqui worker error: {header.get('error')}")
+        return header
+
+    def ping(self) -> dict:
+        return self.request("ping")[0]
+
+
+# worker process
+class _WorkerHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                header, _ = recv_msg(self.request)
+            except (ConnectionError, OSError):
+                return
+            if header is None:
+                return
+            try:
+                self.server.dispatch(self.request, header.get("method"), header.get("params") or {})
+            except Exception as e:
+                LOG.exception(f"coqui worker request failed: {header.get('method')}")
+                send_msg(self.request, {"ok": False, "error": f"{e.__class__.__name__}: {e}"})
+
+
+class _WorkerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str):
+        with _socket_umask():
+            super().__init__(path, _WorkerHandler)
+        self._plugins = {}
+        self._lock = threading.Lock()
+
+    def plugin(self, lang: str, config: dict):
+        """plugin instances are cheap, models are shared between them through the model pool"""
+        from ovos_tts_plugin_coqui import CoquiTTSPlugin
+        config = remote_config(config)
+        cache_key = json.dumps([lang, config], sort_keys=True, default=str)
+        with self._lock:
+            if cache_key not in self._plugins:
+                self._plugins[cache_key] = CoquiTTSPlugin(lang=lang, config=dict(config))
+            return self._plugins[cache_key]
+
+    def dispatch(self, sock: socket.socket, method: str, params: dict):
+        if method == "ping":
+            from ovos_tts_plugin_coqui import CoquiTTSPlugin
+            send_msg(sock, {"ok": True, "pid": os.getpid(),
+                            "models": [k.model for k in CoquiTTSPlugin._POOL.loaded_models]})
+            return
+        params.pop("model_key", None)  # only used by the pool to pick a worker
+        plugin = self.plugin(params.pop("plugin_lang"), params.pop("config"))
+        if method == "get_tts":
+            # rendered to a private file and returned, the worker never writes to client chosen paths
+            params.pop("wav_file", None)
+            with tempfile.TemporaryDirectory(prefix="coqui-worker-") as tmpdir:
+                wav_file, phonemes = plugin.get_tts(wav_file=os.path.join(tmpdir, "output.wav"), **params)
+                with open(wav_file, "rb") as f:
+                    audio = f.read()
+            send_msg(sock, {"ok": True, "phonemes": phonemes}, audio)
+        elif method == "get_waveform":
+            wav, sample_rate = plugin.get_waveform(**params)
+            send_msg(sock, {"ok": True, "sample_rate": sample_rate},
+                     np.asarray(wav, dtype="<f4").tobytes())
+        elif method == "stream_tts":
+            for pcm in plugin.stream_tts(**params):
+                send_msg(sock, {"ok": True, "chunk": True}, pcm)
+            send_msg(sock, {"ok": True})
+        elif method == "get_sample_rate":
+            send_msg(sock, {"ok": True, "sample_rate": plugin.get_sample_rate(**params)})
+        else:
+            raise ValueError(f"unknown method: {method}")
+
+
+def _worker_main(path: str):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the pool handles shutdown
+    if os.path.exists(path):
+        os.remove(path)
+    server = _WorkerServer(path)
+    LOG.info(f"coqui worker {os.getpid()} listening on {path}")
+    server.serve_forever()
+
+
+# supervisor
+class _ProxyHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                header, payload = recv_msg(self.request)
+            except (ConnectionError, OSError):
+                return
+            if header is None:
+                return
+            try:
+                self.server.pool.forward(self.request, header, payload)
+            except Exception as e:
+                LOG.error(f"failed to forward request to coqui worker: {e}")
+                send_msg(self.request, {"ok": False, "error": f"{e.__class__.__name__}: {e}"})
+
+
+class _ProxyServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _Worker:
+    def __init__(self, idx: int, path: str):
+        self.idx = idx
+        self.path = path
+        self.process: Optional[multiprocessing.Process] = None
+        self.restarts = 0
+
+
+class WorkerPool:
+    """Supervises a pool of synthesis worker processes behind a single Unix socket
+
+    - workers: number of worker processes
+    - pinning: {model id: worker index}, models not listed are assigned
+      to a worker by hash, so every model is only loaded by one worker
+    - health_interval: seconds between health checks, workers that died
+      or stopped answering pings are restarted
+    """
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET, workers: int = 2,
+                 pinning: Dict[str, int] = None, health_interval: float = 10,
+                 timeout: float = 120):
+        self.socket_path = socket_path
+        self.pinning = pinning or {}
+        self.health_interval = health_interval
+        self.timeout = timeout
+        self.workers: List[_Worker] = [_Worker(i, f"{socket_path}.{i}") for i in range(max(1, workers))]
+        self._ctx = multiprocessing.get_context("spawn")  # torch does not survive fork
+        self._server: Optional[_ProxyServer] = None
+        self._stop = threading.Event()
+        self._restart_lock = threading.Lock()
+
+    def worker_for(self, model: str = None) -> _Worker:
+        if model in self.pinning:
+            return self.workers[int(self.pinning[model]) % len(self.workers)]
+        return self.workers[zlib.crc32((model or "").encode("utf-8")) % len(self.workers)]
+
+    def start(self):
+        for worker in self.workers:
+            self._spawn(worker)
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        with _socket_umask():
+            self._server = _ProxyServer(self.socket_path, _ProxyHandler)
+        self._server.pool = self
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        threading.Thread(target=self._health_loop, daemon=True).start()
+        LOG.info(f"coqui worker pool listening on {self.socket_path} with {len(self.workers)} workers")
+
+    def stop(self):
+        self._stop.set()
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+        for worker in self.workers:
+            self._kill(worker)
+        for path in [self.socket_path] + [w.path for w in self.workers]:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def forward(self, client: socket.socket, header: dict, payload: bytes):
+        """relay one request to its worker and the response frames back to the client"""
+        worker = self.worker_for((header.get("params") or {}).get("model_key"))
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(worker.path)
+            send_msg(sock, header, payload)
+            while True:
+                response, data = recv_msg(sock)
+                if response is None:
+                    raise ConnectionError(f"worker {worker.idx} closed the connection")
+                response.pop("size", None)
+                send_msg(client, response, data)
+                if not response.get("chunk"):
+                    return
+
+    def is_healthy(self, worker: _Worker) -> bool:
+        if worker.process is None or not worker.process.is_alive():
+            return False
+        try:
+            WorkerClient(worker.path, timeout=self.timeout).ping()
+            return True
+        except Exception:
+            return False
+
+    def _spawn(self, worker: _Worker, startup_timeout: float = 60):
+        worker.process = self._ctx.Process(target=_worker_main, args=(worker.path,),
+                                           name=f"coqui-worker-{worker.idx}", daemon=True)
+        worker.process.start()
+        deadline = time.monotonic() + startup_timeout
+        while time.monotonic() < deadline:
+            if self.is_healthy(worker):
+                return
+            if not worker.process.is_alive():
+                break
+            time.sleep(0.1)
+        raise RuntimeError(f"coqui worker {worker.idx} failed to start")
+
+    @staticmethod
+    def _kill(worker: _Worker):
+        if worker.process is not None and worker.process.is_alive():
+            worker.process.terminate()
+            worker.process.join(5)
+            if worker.process.is_alive():
+                worker.process.kill()
+                worker.process.join()
+
+    def restart(self, worker: _Worker):
+        with self._restart_lock:
+            LOG.warning(f"restarting coqui worker {worker.idx}")
+            self._kill(worker)
+            worker.restarts += 1
+            self._spawn(worker)
+
+    def _health_loop(self):
+        while not self._stop.wait(self.health_interval):
+            for worker in self.workers:
+                if self._stop.is_set() or self.is_healthy(worker):
+                    continue
+                try:
+                    self.restart(worker)
+                except Exception as e:
+                    LOG.error(f"failed to restart coqui worker {worker.idx}: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="shared coqui synthesis worker pool")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="unix socket the plugins connect to")
+    parser.add_argument("--workers", type=int, default=2, help="number of worker processes")
+    parser.add_argument("--pin", action="append", default=[], metavar="MODEL=WORKER",
+                        help="always serve MODEL from worker number WORKER")
+    parser.add_argument("--health-interval", type=float, default=10,
+                        help="seconds between worker health checks")
+    args = parser.parse_args()
+
+    pinning = {}
+    for pin in args.pin:
+        model, idx = pin.rsplit("=", 1)
+        pinning[model] = int(idx)
+    pool = WorkerPool(args.socket, args.workers, pinning, args.health_interval)
+    pool.start()
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    try:
+        while not stop.wait(1):
+            pass
+    except KeyboardInterrupt:
+        pass
+    pool.stop()
+
+
+if __name__ == "__main__":
+    main()
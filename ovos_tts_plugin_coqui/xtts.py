@@ -0,0 +1,58 @@
+from typing import Iterator, Tuple
+
+import numpy as np
+
+
+def is_xtts(tts) -> bool:
+    synth = getattr(tts, "synthesizer", None)
+    return synth is not None and synth.tts_model.__class__.__name__ == "Xtts"
+
+
+def get_conditioning(tts, speaker: str = None) -> Tuple:
+    """return (gpt_cond_latent, speaker_embedding) for a builtin speaker"""
+    speakers = tts.synthesizer.tts_model.speaker_manager.speakers
+    speaker = speaker or next(iter(speakers))
+    gpt_cond_latent, speaker_embedding = speakers[speaker].values()
+    return gpt_cond_latent, speaker_embedding
+
+
+def _inference_settings(model) -> dict:
+    return {"temperature": model.config.temperature,
+            "length_penalty": model.config.length_penalty,
+            "repetition_penalty": model.config.repetition_penalty,
+            "top_k": model.config.top_k,
+            "top_p": model.config.top_p,
+            "enable_text_splitting": True}
+
+
+def synth_xtts(tts, text: str, language: str, conditioning: Tuple) -> np.ndarray:
+    """synthesize text with precomputed conditioning, skipping the speaker encoder"""
+    model = tts.synthesizer.tts_model
+    gpt_cond_latent, speaker_embedding = conditioning
+    out = model.inference(text, language, gpt_cond_latent, speaker_embedding,
+                          **_inference_settings(model))
+    return np.asarray(out["wav"])
+
+
+def stream_xtts(tts, text: str, language: str, conditioning: Tuple,
+                chunk_size: int = 20, overlap: int = 1024) -> Iterator[np.ndarray]:
+    """yield float waveform chunks as the XTTS decoder produces them
+
+    chunk_size is the number of GPT tokens decoded per chunk,
+    overlap the number of samples crossfaded between chunks
+    """
+    import torch
+
+    model = tts.synthesizer.tts_model
+    gpt_cond_latent, speaker_embedding = conditioning
+    chunks = model.inference_stream(text, language, gpt_cond_latent, speaker_embedding,
+                                    stream_chunk_size=chunk_size,
+                                    overlap_wav_len=overlap,
+                                    **_inference_settings(model))
+    while True:
+        # inference mode only while generating, never while the consumer holds the chunk
+        with torch.inference_mode():
+            chunk = next(chunks, None)
+        if chunk is None:
+            return
+        yield chunk.cpu().numpy()
@@ -54,6 +54,11 @@ PLUGIN_ENTRY_POINT = (
     'ovos-tts-plugin-coqui-freevc = ovos_tts_plugin_coqui:CoquiFreeVCTTS',
     'ovos-tts-plugin-coqui-fairseq = ovos_tts_plugin_coqui:CoquiFairSeqTTSPlugin'
 )
+CONSOLE_ENTRY_POINT = (
+    'ovos-coqui-worker-pool = ovos_tts_plugin_coqui.worker:main',
+    'ovos-coqui-benchmark = ovos_tts_plugin_coqui.benchmark:main',
+    'ovos-coqui-render = ovos_tts_plugin_coqui.bulk:main',
+)
 
 
 setup(
@@ -66,6 +71,7 @@ setup(
     license='Apache-2.0',
     packages=['ovos_tts_plugin_coqui'],
     install_requires=required("requirements.txt"),
+    extras_require={"onnx": ["onnx", "onnxruntime"]},
     zip_safe=True,
     classifiers=[
         'Development Status :: 3 - Alpha',
@@ -85,5 +91,6 @@ setup(
         'Programming Language :: Python :: 3.6',
     ],
     keywords='mycroft ovos plugin tts',
-    entry_points={'mycroft.plugin.tts': PLUGIN_ENTRY_POINT}
+    entry_points={'mycroft.plugin.tts': PLUGIN_ENTRY_POINT,
+                  'console_scripts': CONSOLE_ENTRY_POINT}
 )
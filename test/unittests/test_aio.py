@@ -0,0 +1,126 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+import unittest
+import wave
+
+import numpy as np
+
+from ovos_tts_plugin_coqui.aio import (SynthesisCancelled, collect_chunks, iterate_cancellable, run_cancellable,
+                                       write_chunks)
+
+
+class Chunks:
+    """a synthesis generator, records how far it got and whether it was closed"""
+
+    def __init__(self, n: int = 5, delay: float = 0.0, cancel: threading.Event = None):
+        self.n = n
+        self.delay = delay
+        self.cancel = cancel
+        self.produced = 0
+        self.closed = False
+
+    def __iter__(self):
+        try:
+            for _ in range(self.n):
+                time.sleep(self.delay)
+                self.produced += 1
+                if self.cancel is not None and self.produced == 2:
+                    self.cancel.set()  # barge in while the second chunk is produced
+                yield np.full(100, 0.1, dtype=np.float32)
+        finally:
+            self.closed = True
+
+
+class TestRunCancellable(unittest.TestCase):
+    def test_result(self):
+        self.assertEqual(asyncio.run(run_cancellable(lambda cancel: 42)), 42)
+
+    def test_cancel_waits_for_the_worker(self):
+        state = {}
+
+        def synthesize(cancel: threading.Event):
+            state["started"] = True
+            while not cancel.wait(0.01):
+                pass
+            time.sleep(0.05)  # releasing the model takes a moment
+            state["released"] = True
+
+        async def main():
+            task = asyncio.ensure_future(run_cancellable(synthesize))
+            while not state.get("started"):
+                await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            return state.get("released")
+
+        self.assertTrue(asyncio.run(main()))
+
+
+class TestIterateCancellable(unittest.TestCase):
+    def test_items(self):
+        async def main():
+            return [chunk async for chunk in iterate_cancellable(lambda: iter(Chunks(3)))]
+
+        self.assertEqual(len(asyncio.run(main())), 3)
+
+    def test_cancel_stops_at_the_next_chunk(self):
+        chunks = Chunks(n=100, delay=0.01)
+        generator = iter(chunks)
+
+        async def consume(received: list):
+            async for chunk in iterate_cancellable(lambda: generator):
+                received.append(chunk)
+
+        async def main():
+            received = []
+            task = asyncio.ensure_future(consume(received))
+            while len(received) < 2:
+                await asyncio.sleep(0.005)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            return received
+
+        received = asyncio.run(main())
+        self.assertTrue(chunks.closed)
+        self.assertLessEqual(chunks.produced, len(received) + 1)
+        self.assertLess(chunks.produced, 100)
+
+
+class TestWriteChunks(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.wav_file = os.path.join(self.dir.name, "out.wav")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_write(self):
+        self.assertEqual(write_chunks(iter(Chunks(3)), 16000, self.wav_file), 300)
+        with wave.open(self.wav_file) as f:
+            self.assertEqual((f.getframerate(), f.getnframes()), (16000, 300))
+
+    def test_cancelled_write_leaves_no_file(self):
+        cancel = threading.Event()
+        chunks = Chunks(5, cancel=cancel)
+        with self.assertRaises(SynthesisCancelled):
+            write_chunks(iter(chunks), 16000, self.wav_file, cancel)
+        self.assertEqual(chunks.produced, 2)  # nothing is produced after the barge in
+        self.assertTrue(chunks.closed)
+        self.assertEqual(os.listdir(self.dir.name), [])
+
+    def test_collect(self):
+        self.assertEqual(collect_chunks(iter(Chunks(3))).shape, (300,))
+        self.assertEqual(collect_chunks(iter([])).shape, (0,))
+
+    def test_cancelled_collect(self):
+        cancel = threading.Event()
+        chunks = Chunks(5, cancel=cancel)
+        with self.assertRaises(SynthesisCancelled):
+            collect_chunks(iter(chunks), cancel)
+        self.assertTrue(chunks.closed)
+        self.assertLess(chunks.produced, 5)
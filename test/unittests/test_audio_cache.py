@@ -0,0 +1,101 @@
+import os
+import tempfile
+import unittest
+
+from ovos_tts_plugin_coqui import CoquiTTSPlugin
+from ovos_tts_plugin_coqui.cache import AudioCache
+
+
+def write_file(path: str, size: int) -> str:
+    with open(path, "wb") as f:
+        f.write(b"\0" * size)
+    return path
+
+
+class TestCacheKeys(unittest.TestCase):
+    def test_text_is_normalized(self):
+        self.assertEqual(AudioCache.make_key(text="hello  world", model="m"),
+                         AudioCache.make_key(text=" hello world\n", model="m"))
+
+    def test_field_order_does_not_matter(self):
+        self.assertEqual(AudioCache.make_key(text="hi", model="m", voice="v"),
+                         AudioCache.make_key(voice="v", model="m", text="hi"))
+
+    def test_every_field_changes_the_key(self):
+        base = dict(text="hi", model=["m", None], lang="en", voice=None, settings={"quantize": False})
+        key = AudioCache.make_key(**base)
+        for field, value in [("text", "hello"), ("model", ["m", "config.json"]), ("lang", "pt"),
+                             ("voice", "p232"), ("settings", {"quantize": True})]:
+            self.assertNotEqual(key, AudioCache.make_key(**dict(base, **{field: value})), field)
+
+
+class TestAudioCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = self.tmp.name
+        self.cache = AudioCache(os.path.join(self.dir, "cache"), max_bytes=250)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_put_and_get(self):
+        self.cache.put("a", write_file(os.path.join(self.dir, "a.wav"), 100))
+        out = os.path.join(self.dir, "out.wav")
+        self.assertTrue(self.cache.get("a", out))
+        self.assertEqual(os.path.getsize(out), 100)
+        self.assertFalse(self.cache.get("missing", out))
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_least_recently_used_is_evicted(self):
+        for key in "abc":
+            self.cache.put(key, write_file(os.path.join(self.dir, f"{key}.wav"), 100))
+            if key == "b":
+                self.cache.get("a", os.path.join(self.dir, "out.wav"))  # a is now more recent than b
+        self.assertIn("a", self.cache)
+        self.assertNotIn("b", self.cache)
+        self.assertIn("c", self.cache)
+        self.assertLessEqual(self.cache.size_bytes, 250)
+        self.assertFalse(os.path.exists(self.cache._path("b")))
+
+    def test_index_survives_a_restart(self):
+        self.cache.put("a", write_file(os.path.join(self.dir, "a.wav"), 100))
+        reloaded = AudioCache(self.cache.cache_dir, max_bytes=250)
+        self.assertIn("a", reloaded)
+        self.assertEqual(reloaded.size_bytes, 100)
+
+    def test_file_deleted_behind_the_cache(self):
+        self.cache.put("a", write_file(os.path.join(self.dir, "a.wav"), 100))
+        os.remove(self.cache._path("a"))
+        self.assertFalse(self.cache.get("a", os.path.join(self.dir, "out.wav")))
+        self.assertNotIn("a", self.cache)
+
+    def test_from_config(self):
+        self.assertIsNone(AudioCache.from_config(None))
+        self.assertIsNone(AudioCache.from_config({"enabled": False}))
+        path = os.path.join(self.dir, "shared")
+        self.assertIs(AudioCache.from_config({"path": path}), AudioCache.from_config({"path": path}))
+
+
+class TestPluginCacheKey(unittest.TestCase):
+    MODEL = "tts_models/en/ljspeech/vits"
+
+    def plugin(self, **config) -> CoquiTTSPlugin:
+        # nothing is loaded until the first synthesis
+        return CoquiTTSPlugin(lang="en-us", config=dict(config, model=self.MODEL, preload=False, prerender=False))
+
+    def test_defaults_are_explicit(self):
+        self.assertEqual(self.plugin().get_cache_key("hello"),
+                         self.plugin(pipeline=False, sentence_silence=0.2, max_segment_chars=250,
+                                     streaming=False).get_cache_key("hello"))
+
+    def test_output_settings_change_the_key(self):
+        key = self.plugin().get_cache_key("hello")
+        for setting, value in [("pipeline", True), ("sentence_silence", 0.5), ("max_segment_chars", 100),
+                               ("streaming", True), ("stream_chunk_size", 10), ("stream_overlap", 512),
+                               ("quantize", True), ("backend", "onnx")]:
+            self.assertNotEqual(key, self.plugin(**{setting: value}).get_cache_key("hello"), setting)
+
+    def test_unrelated_settings_share_the_key(self):
+        self.assertEqual(self.plugin().get_cache_key("hello"),
+                         self.plugin(warmup_timeout=5, num_threads=2,
+                                     audio_output={"bitrate": "64k"}).get_cache_key("hello"))
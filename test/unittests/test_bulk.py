@@ -0,0 +1,127 @@
+import json
+import os
+import tempfile
+import unittest
+
+from ovos_tts_plugin_coqui.bulk import Checkpoint, ManifestItem, _batches, output_format, read_manifest
+
+
+def item(idx: int, output: str, signature: str = "sig", group: str = "m") -> ManifestItem:
+    it = ManifestItem(idx, {"text": f"line {idx}", "output": output}, "/")
+    it.signature = signature
+    it.group = group
+    return it
+
+
+class TestManifest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_jsonl(self):
+        path = os.path.join(self.dir, "prompts.jsonl")
+        with open(path, "w") as f:
+            f.write(json.dumps({"text": "hello", "output": "out/a.wav", "lang": "pt-pt"}) + "\n\n")
+            f.write(json.dumps({"id": "b", "text": "world", "output": "/abs/b.ogg"}) + "\n")
+        items = read_manifest(path)
+        self.assertEqual([i.id for i in items], ["0", "b"])
+        self.assertEqual(items[0].output, os.path.join(self.dir, "out/a.wav"))
+        self.assertEqual(items[0].lang, "pt-pt")
+        self.assertEqual(items[1].output, "/abs/b.ogg")
+        self.assertIsNone(items[1].lang)
+
+    def test_csv_and_output_dir(self):
+        path = os.path.join(self.dir, "prompts.csv")
+        with open(path, "w") as f:
+            f.write("text,output,voice\nhello,a.flac,p232\n")
+        items = read_manifest(path, output_dir="/renders")
+        self.assertEqual(items[0].output, "/renders/a.flac")
+        self.assertEqual(items[0].voice, "p232")
+
+    def test_invalid_lines(self):
+        path = os.path.join(self.dir, "prompts.jsonl")
+        for line in ({"text": "no output"}, {"text": "bad format", "output": "a.txt"}):
+            with open(path, "w") as f:
+                f.write(json.dumps(line) + "\n")
+            with self.assertRaises(ValueError):
+                read_manifest(path)
+
+    def test_output_format(self):
+        self.assertEqual(output_format("a.WAV"), "wav")
+        self.assertEqual(output_format("a.opus"), "opus")
+        self.assertIsNone(output_format("a.pcm16"))
+        self.assertIsNone(output_format("a"))
+
+    def test_batches_do_not_mix_models(self):
+        items = [item(i, f"/{i}.wav", group="ab"[i % 2]) for i in range(5)]
+        batches = list(_batches(items, 2))
+        self.assertEqual([[i.idx for i in b] for b in batches], [[0, 2], [4], [1, 3]])
+
+
+class TestCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = self.tmp.name
+        self.path = os.path.join(self.dir, "progress.jsonl")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def rendered(self, name: str, signature: str = "sig") -> ManifestItem:
+        it = item(0, os.path.join(self.dir, name), signature)
+        with open(it.output, "wb") as f:
+            f.write(b"RIFF")
+        return it
+
+    def test_resume(self):
+        a, b = self.rendered("a.wav"), self.rendered("b.wav")
+        progress = Checkpoint(self.path)
+        progress.add(a)
+        progress.close()
+
+        resumed = Checkpoint(self.path)
+        try:
+            self.assertTrue(resumed.is_done(a))
+            self.assertFalse(resumed.is_done(b))
+        finally:
+            resumed.close()
+
+    def test_changed_request_is_rendered_again(self):
+        a = self.rendered("a.wav")
+        progress = Checkpoint(self.path)
+        progress.add(a)
+        progress.close()
+        resumed = Checkpoint(self.path)
+        try:
+            self.assertFalse(resumed.is_done(self.rendered("a.wav", signature="other voice")))
+        finally:
+            resumed.close()
+
+    def test_deleted_output_is_rendered_again(self):
+        a = self.rendered("a.wav")
+        progress = Checkpoint(self.path)
+        progress.add(a)
+        progress.close()
+        os.remove(a.output)
+        resumed = Checkpoint(self.path)
+        try:
+            self.assertFalse(resumed.is_done(a))
+        finally:
+            resumed.close()
+
+    def test_torn_last_line(self):
+        a = self.rendered("a.wav")
+        progress = Checkpoint(self.path)
+        progress.add(a)
+        progress.close()
+        with open(self.path, "a") as f:
+            f.write('{"id": "1", "output": "/b.w')  # interrupted mid write
+        resumed = Checkpoint(self.path)
+        try:
+            self.assertTrue(resumed.is_done(a))
+            self.assertEqual(len(resumed.done), 1)
+        finally:
+            resumed.close()
@@ -0,0 +1,66 @@
+import unittest
+from types import SimpleNamespace
+
+import numpy as np
+
+from ovos_tts_plugin_coqui import CoquiTTSPlugin
+from ovos_tts_plugin_coqui.cpu import can_quantize, compare_audio
+
+SR = 22050
+
+
+def tone(freq: float, seconds: float = 1.0) -> np.ndarray:
+    t = np.arange(int(SR * seconds)) / SR
+    return (0.5 * np.sin(2 * np.pi * freq * t)).astype(np.float32)
+
+
+def fake_tts(architecture: str):
+    model = type(architecture, (), {})()
+    return SimpleNamespace(synthesizer=SimpleNamespace(tts_model=model))
+
+
+class TestCompareAudio(unittest.TestCase):
+    def test_identical(self):
+        ratio, distance = compare_audio(tone(440), tone(440))
+        self.assertEqual(ratio, 1.0)
+        self.assertAlmostEqual(distance, 0.0, places=3)
+
+    def test_small_noise_is_close(self):
+        noisy = tone(440) + np.random.default_rng(0).normal(0, 1e-4, SR).astype(np.float32)
+        self.assertLess(compare_audio(tone(440), noisy)[1], 3.0)
+
+    def test_different_audio_is_far(self):
+        self.assertGreater(compare_audio(tone(440), tone(2000))[1], 3.0)
+        noise = np.random.default_rng(0).normal(0, 0.3, SR).astype(np.float32)
+        self.assertGreater(compare_audio(tone(440), noise)[1], 3.0)
+
+    def test_length_ratio(self):
+        self.assertAlmostEqual(compare_audio(tone(440, 1.0), tone(440, 0.5))[0], 0.5, places=3)
+
+    def test_empty(self):
+        self.assertEqual(compare_audio(np.zeros(0), tone(440)), (0.0, float("inf")))
+
+
+class TestQuantization(unittest.TestCase):
+    def plugin(self, **config) -> CoquiTTSPlugin:
+        return CoquiTTSPlugin(lang="en-us", config=dict(config, model="tts_models/en/ljspeech/vits",
+                                                        preload=False, prerender=False))
+
+    def test_supported_architectures(self):
+        self.assertTrue(can_quantize(fake_tts("Vits")))
+        self.assertTrue(can_quantize(fake_tts("ForwardTTS")))
+        self.assertFalse(can_quantize(fake_tts("Xtts")))
+
+    def test_close_output_keeps_int8(self):
+        self.assertTrue(self.plugin().check_quantization(tone(440), tone(440) * 0.99))
+
+    def test_different_output_falls_back_to_fp32(self):
+        self.assertFalse(self.plugin().check_quantization(tone(440), tone(2000)))
+
+    def test_truncated_output_falls_back_to_fp32(self):
+        self.assertFalse(self.plugin().check_quantization(tone(440, 1.0), tone(440, 0.5)))
+        self.assertTrue(self.plugin(quantize_max_length_diff=0.6).check_quantization(tone(440, 1.0),
+                                                                                      tone(440, 0.5)))
+
+    def test_silent_output_falls_back_to_fp32(self):
+        self.assertFalse(self.plugin().check_quantization(tone(440), np.zeros(0, dtype=np.float32)))
@@ -0,0 +1,143 @@
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+from ovos_tts_plugin_coqui import CoquiTTSPlugin
+from ovos_tts_plugin_coqui.frontend import FrontendCache
+from ovos_tts_plugin_coqui.pool import ModelKey
+
+
+class FakeTokenizer:
+    def __init__(self, phonemizer=None):
+        self.calls = []
+        self.phonemizer = phonemizer
+        self.use_phonemes = phonemizer is not None
+
+    def text_to_ids(self, text: str, language: str = None):
+        self.calls.append(text)
+        return [ord(c) for c in text]
+
+
+class FakePhonemizer:
+    language = "en-us"
+
+    def __init__(self):
+        self.calls = []
+
+    @staticmethod
+    def name():
+        return "espeak"
+
+    def _phonemize(self, text: str, separator: str = "") -> str:
+        self.calls.append(text)
+        return " ".join(w.upper() if w != "42" else "FORTY TWO" for w in text.split())
+
+
+def fake_tts(tokenizer: FakeTokenizer):
+    return SimpleNamespace(synthesizer=SimpleNamespace(tts_model=SimpleNamespace(tokenizer=tokenizer)))
+
+
+class TestFrontendCache(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_memory_lru(self):
+        cache = FrontendCache(max_items=2)
+        cache.put("model", "ids:", "a", [1])
+        cache.put("model", "ids:", "b", [2])
+        self.assertEqual(cache.get("model", "ids:", "a"), [1])  # a is now more recent than b
+        cache.put("model", "ids:", "c", [3])
+        self.assertIsNone(cache.get("model", "ids:", "b"))
+        self.assertEqual(cache.get("other model", "ids:", "a"), None)
+        self.assertEqual(cache.stats, {"hits": 1, "misses": 2, "items": 2})
+
+    def test_disk_is_shared(self):
+        path = os.path.join(self.dir.name, "frontend.sqlite")
+        FrontendCache(disk=path).put_many("model", "word:en", {"hello": "HELLO", "world": "WORLD"})
+        other = FrontendCache(disk=path)  # eg. another process
+        self.assertEqual(other.get("model", "word:en", "world"), "WORLD")
+        other.clear()
+        self.assertIsNone(FrontendCache(disk=path).get("model", "word:en", "hello"))
+
+    def test_sentences_are_memoized(self):
+        cache = FrontendCache()
+        tokenizer = FakeTokenizer()
+        cache.install(fake_tts(tokenizer), "model")
+        self.assertEqual(tokenizer.text_to_ids("hi"), [104, 105])
+        self.assertEqual(tokenizer.text_to_ids("hi"), [104, 105])
+        tokenizer.text_to_ids("hi", language="pt")
+        self.assertEqual(tokenizer.calls, ["hi", "hi"])
+        cache.configure(enabled=False)
+        tokenizer.text_to_ids("hi")
+        self.assertEqual(len(tokenizer.calls), 3)
+
+    def test_installed_once(self):
+        cache = FrontendCache()
+        tokenizer = FakeTokenizer()
+        cache.install(fake_tts(tokenizer), "model")
+        wrapped = tokenizer.text_to_ids
+        cache.install(fake_tts(tokenizer), "model")
+        self.assertIs(tokenizer.text_to_ids, wrapped)
+
+    def test_words_are_memoized(self):
+        cache = FrontendCache(words=True)
+        phonemizer = FakePhonemizer()
+        cache.install(fake_tts(FakeTokenizer(phonemizer)), "model")
+        self.assertEqual(phonemizer._phonemize("set a timer"), "SET A TIMER")
+        self.assertEqual(phonemizer._phonemize("set a timer for five minutes"), "SET A TIMER FOR FIVE MINUTES")
+        self.assertEqual(phonemizer.calls, ["set a timer", "for five minutes"])
+
+    def test_words_that_expand_are_phonemized_in_context(self):
+        cache = FrontendCache(words=True)
+        phonemizer = FakePhonemizer()
+        cache.install(fake_tts(FakeTokenizer(phonemizer)), "model")
+        self.assertEqual(phonemizer._phonemize("wait 42 seconds"), "WAIT FORTY TWO SECONDS")
+        self.assertIsNone(cache.get("model", "word:en-us", "42"))
+
+
+class TestPluginScope(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.model = self.file("model.pth", "weights")
+        self.tokenizers = []
+        tokenizers = self.tokenizers
+
+        class Plugin(CoquiTTSPlugin):
+            def _prepare_model(self, key, lang=None):
+                tokenizers.append(FakeTokenizer())
+                return fake_tts(tokenizers[-1])
+
+        self.plugin = Plugin(lang="en-us", config={"model": self.model, "preload": False, "prerender": False})
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def file(self, name: str, content: str) -> str:
+        path = os.path.join(self.dir.name, name)
+        with open(path, "w") as f:
+            f.write(content)
+        return path
+
+    def tokenize(self, model_config: str) -> FakeTokenizer:
+        self.plugin._load_instrumented(ModelKey(self.model, model_config))
+        self.tokenizers[-1].text_to_ids("hello")
+        return self.tokenizers[-1]
+
+    def test_same_model_shares_the_cache(self):
+        config = self.file("config.json", '{"phonemizer": "espeak"}')
+        self.assertEqual(self.tokenize(config).calls, ["hello"])
+        self.assertEqual(self.tokenize(config).calls, [])
+
+    def test_model_config_is_part_of_the_scope(self):
+        self.tokenize(self.file("a.json", '{"phonemizer": "espeak"}'))
+        self.assertEqual(self.tokenize(self.file("b.json", '{"phonemizer": "gruut"}')).calls, ["hello"])
+
+    def test_edited_model_config_is_a_new_scope(self):
+        config = self.file("config.json", '{"phonemizer": "espeak"}')
+        self.tokenize(config)
+        self.file("config.json", '{"phonemizer": "gruut", "text_cleaner": "basic_cleaners"}')
+        self.assertEqual(self.tokenize(config).calls, ["hello"])
@@ -0,0 +1,98 @@
+import threading
+import unittest
+
+from ovos_tts_plugin_coqui.loader import LoadState, ModelLoader
+
+
+class FlakyLoad:
+    """fails the first `failures` calls"""
+
+    def __init__(self, failures: int = 1):
+        self.failures = failures
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise OSError("download failed")
+
+
+class TestModelLoader(unittest.TestCase):
+    def test_unloaded_until_marked(self):
+        loader = ModelLoader()
+        self.assertEqual(loader.state, LoadState.UNLOADED)
+        loader.wait(0)  # nothing to wait for
+        loader.mark_ready()
+        self.assertTrue(loader.is_ready)
+
+    def test_foreground_load(self):
+        loader = ModelLoader()
+        load = FlakyLoad(0)
+        loader.run(load)
+        self.assertEqual(loader.state, LoadState.READY)
+        self.assertEqual(load.calls, 1)
+
+    def test_foreground_error_is_raised(self):
+        loader = ModelLoader()
+        with self.assertRaises(OSError):
+            loader.run(FlakyLoad())
+        self.assertEqual(loader.state, LoadState.ERROR)
+
+    def test_background_load(self):
+        loader = ModelLoader()
+        release = threading.Event()
+        loader.run(lambda: release.wait(5), background=True)
+        self.assertEqual(loader.state, LoadState.LOADING)
+        with self.assertRaises(TimeoutError):
+            loader.wait(0.01)
+        release.set()
+        loader.wait(5)
+        self.assertEqual(loader.state, LoadState.READY)
+
+    def test_wait_retries_a_failed_load(self):
+        loader = ModelLoader()
+        load = FlakyLoad()
+        loader.run(load, background=True)
+        loader._ready.wait(5)
+        self.assertEqual(loader.state, LoadState.ERROR)
+        loader.wait(5)
+        self.assertEqual(loader.state, LoadState.READY)
+        self.assertEqual(load.calls, 2)
+        self.assertIsNone(loader.error)
+
+    def test_wait_raises_while_the_load_keeps_failing(self):
+        loader = ModelLoader()
+        load = FlakyLoad(failures=2)
+        with self.assertRaises(OSError):
+            loader.run(load)
+        with self.assertRaises(RuntimeError) as e:
+            loader.wait(5)
+        self.assertIsInstance(e.exception.__cause__, OSError)
+        self.assertEqual(loader.state, LoadState.ERROR)
+        loader.wait(5)  # third attempt succeeds
+        self.assertEqual(load.calls, 3)
+        self.assertTrue(loader.is_ready)
+
+    def test_mark_ready_clears_an_error(self):
+        loader = ModelLoader()
+        with self.assertRaises(OSError):
+            loader.run(FlakyLoad())
+        loader.mark_ready()  # eg. get_model() loaded the model lazily
+        self.assertEqual(loader.state, LoadState.READY)
+        self.assertIsNone(loader.error)
+        loader.wait(0)
+
+    def test_mark_ready_does_not_interrupt_a_load(self):
+        loader = ModelLoader()
+        release = threading.Event()
+        loader.run(lambda: release.wait(5), background=True)
+        loader.mark_ready()
+        self.assertEqual(loader.state, LoadState.LOADING)
+        release.set()
+        loader.wait(5)
+
+    def test_retry_only_after_an_error(self):
+        loader = ModelLoader()
+        self.assertFalse(loader.retry())
+        loader.run(FlakyLoad(0))
+        self.assertFalse(loader.retry())
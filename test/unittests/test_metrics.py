@@ -0,0 +1,121 @@
+import threading
+import time
+import unittest
+
+from ovos_tts_plugin_coqui.metrics import Metrics
+from ovos_tts_plugin_coqui.pool import ModelKey
+from ovos_tts_plugin_coqui.scheduler import ModelScheduler
+
+
+def parse(text: str) -> dict:
+    """sample name with labels -> value"""
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.metrics = Metrics(buckets=(0.1, 1))
+        self.metrics.configure(enabled=True)
+
+    def test_disabled_records_nothing(self):
+        metrics = Metrics()
+        metrics.count("requests")
+        metrics.observe("stage_seconds", 1)
+        with metrics.request("get_tts", "CoquiTTSPlugin"):
+            with metrics.stage("acoustic"):
+                pass
+        self.assertEqual(metrics.prometheus_text(), "\n")
+
+    def test_counters(self):
+        self.metrics.count("audio_cache", result="hit")
+        self.metrics.count("audio_cache", result="hit")
+        self.metrics.count("audio_cache", result="miss")
+        text = self.metrics.prometheus_text()
+        self.assertIn("# TYPE coqui_audio_cache_total counter", text)
+        samples = parse(text)
+        self.assertEqual(samples['coqui_audio_cache_total{result="hit"}'], 2)
+        self.assertEqual(samples['coqui_audio_cache_total{result="miss"}'], 1)
+
+    def test_histograms(self):
+        for value in (0.05, 0.5, 5):
+            self.metrics.observe("stage_seconds", value, stage="acoustic")
+        text = self.metrics.prometheus_text()
+        self.assertIn("# TYPE coqui_stage_seconds histogram", text)
+        samples = parse(text)
+        self.assertEqual(samples['coqui_stage_seconds_bucket{stage="acoustic",le="0.1"}'], 1)
+        self.assertEqual(samples['coqui_stage_seconds_bucket{stage="acoustic",le="1"}'], 2)
+        self.assertEqual(samples['coqui_stage_seconds_bucket{stage="acoustic",le="+Inf"}'], 3)
+        self.assertEqual(samples['coqui_stage_seconds_count{stage="acoustic"}'], 3)
+        self.assertAlmostEqual(samples['coqui_stage_seconds_sum{stage="acoustic"}'], 5.55)
+
+    def test_gauges(self):
+        self.metrics.add_gauge("models_loaded", lambda: 2)
+        self.metrics.add_gauge("broken", lambda: 1 / 0)
+        text = self.metrics.prometheus_text()
+        self.assertIn("# TYPE coqui_models_loaded gauge\ncoqui_models_loaded 2\n", text)
+        self.assertNotIn("coqui_broken", text)
+
+    def test_label_values_are_escaped(self):
+        self.metrics.count("model_loads", model='/models/my "best"\\voice\nv2.pth')
+        text = self.metrics.prometheus_text()
+        self.assertIn('coqui_model_loads_total{model="/models/my \\"best\\"\\\\voice\\nv2.pth"} 1', text)
+        self.assertEqual(len(text.strip().splitlines()), 2)
+
+    def test_request_record(self):
+        records = []
+        self.metrics.add_sink(records.append)
+        with self.metrics.request("get_tts", "CoquiTTSPlugin", "model", "en-us"):
+            with self.metrics.stage("acoustic"):
+                time.sleep(0.01)
+            with self.metrics.request("get_waveform", "CoquiTTSPlugin"):  # nested, same record
+                self.metrics.add_audio(1.0)
+            self.metrics.add_audio(2.0)
+            self.metrics.tag("cache", "miss")
+        self.assertEqual(len(records), 1)
+        record = records[0]
+        self.assertEqual(record["audio_s"], 2.0)
+        self.assertEqual(record["cache"], "miss")
+        self.assertGreaterEqual(record["stages"]["acoustic"], 0.01)
+        samples = parse(self.metrics.prometheus_text())
+        self.assertEqual(samples['coqui_requests_total{method="get_tts",status="ok"}'], 1)
+
+    def test_failed_request(self):
+        with self.assertRaises(RuntimeError):
+            with self.metrics.request("get_tts", "CoquiTTSPlugin"):
+                raise RuntimeError("boom")
+        samples = parse(self.metrics.prometheus_text())
+        self.assertEqual(samples['coqui_requests_total{method="get_tts",status="error"}'], 1)
+
+    def test_stages_are_reported_by_the_submitting_request(self):
+        # a failed micro batch runs every request on the thread holding the model
+        scheduler = ModelScheduler(max_batch_size=4, window_ms=50, metrics=self.metrics)
+        records = []
+        self.metrics.add_sink(records.append)
+        ran_on = {}
+
+        def synthesize(i):
+            ran_on[i] = threading.get_ident()
+            self.metrics.add_stage(f"acoustic_{i}", 0.01)
+
+        def batch_fn(items):
+            raise RuntimeError("out of memory")
+
+        def call(i):
+            with self.metrics.request("get_tts", "CoquiTTSPlugin", model=str(i)):
+                scheduler.submit(ModelKey("model"), lambda: synthesize(i), batch=("group", batch_fn, i))
+            threads[i] = threading.get_ident()
+
+        threads = {}
+        workers = [threading.Thread(target=call, args=(i,)) for i in range(3)]
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join(5)
+        self.assertTrue(any(ran_on[i] != threads[i] for i in range(3)), "no request ran on another thread")
+        for record in records:
+            self.assertEqual(set(record["stages"]), {"queue_wait", f"acoustic_{record['model']}"})
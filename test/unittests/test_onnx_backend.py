@@ -0,0 +1,94 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+from types import SimpleNamespace
+
+from ovos_tts_plugin_coqui import CoquiTTSPlugin
+from ovos_tts_plugin_coqui.onnx_backend import ONNX_FILE, _check_supported, _is_stale, load_onnx_vits, onnx_path_for
+from ovos_tts_plugin_coqui.pool import ModelKey
+
+
+class Vits:
+    """a torch VITS model whose export fails half way, like coqui's export_onnx can"""
+
+    def forward(self, *args):
+        return "torch"
+
+    def export_onnx(self, output_path: str, verbose: bool = False):
+        self.forward = lambda *args: "onnx export"
+        with open(output_path, "wb") as f:
+            f.write(b"partial")
+        raise RuntimeError("unsupported operator")
+
+
+class TestOnnxFallback(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.model_path = os.path.join(self.dir.name, "model.pth")
+        with open(self.model_path, "wb") as f:
+            f.write(b"weights")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def config(self, **config) -> str:
+        path = os.path.join(self.dir.name, "config.json")
+        with open(path, "w") as f:
+            json.dump(config, f)
+        return path
+
+    def test_supported_configs(self):
+        _check_supported(self.model_path, self.config(model="vits", model_args={}))
+        _check_supported(self.dir.name)  # fairseq folders are checked when loaded
+        with self.assertRaises(ValueError):
+            _check_supported(self.model_path, self.config(model="glow_tts"))
+        with self.assertRaises(ValueError):
+            _check_supported(self.model_path, self.config(model="vits", model_args={"use_d_vector_file": True}))
+
+    def test_unsupported_model_fails_before_loading(self):
+        key = ModelKey(self.model_path, self.config(model="tacotron2"), backend="onnx")
+        loads = []
+        with self.assertRaises(ValueError):
+            load_onnx_vits(key, lambda: loads.append(1))
+        self.assertEqual(loads, [])
+
+    def test_failed_export_leaves_a_usable_torch_model(self):
+        model = Vits()
+        tts = SimpleNamespace(synthesizer=SimpleNamespace(tts_model=model))
+        key = ModelKey(self.model_path, self.config(model="vits", model_args={}), backend="onnx")
+        with self.assertRaises(RuntimeError):
+            load_onnx_vits(key, lambda: tts)
+        self.assertEqual(model.forward(), "torch")
+        self.assertNotIn("forward", vars(model))
+        self.assertFalse(any(f.endswith(".tmp") for f in os.listdir(self.dir.name)))
+        self.assertFalse(os.path.exists(onnx_path_for(self.model_path)))
+
+    def test_exported_graph_is_reused_until_the_model_changes(self):
+        onnx_path = onnx_path_for(self.model_path)
+        self.assertEqual(onnx_path, os.path.join(self.dir.name, ONNX_FILE))
+        self.assertTrue(_is_stale(onnx_path, self.model_path))
+        with open(onnx_path, "wb") as f:
+            f.write(b"graph")
+        self.assertFalse(_is_stale(onnx_path, self.model_path))
+        later = time.time() + 10
+        os.utime(self.model_path, (later, later))
+        self.assertTrue(_is_stale(onnx_path, self.model_path))
+
+    def test_plugin_falls_back_to_torch(self):
+        tts = SimpleNamespace(synthesizer=SimpleNamespace(tts_model=Vits()))
+        loads = []
+
+        class Plugin(CoquiTTSPlugin):
+            @staticmethod
+            def _load_model(key):
+                loads.append(key)
+                return tts
+
+        plugin = Plugin(lang="en-us", config={"model": self.model_path, "preload": False, "prerender": False})
+        for config in (self.config(model="vits", model_args={}), self.config(model="glow_tts")):
+            loads.clear()
+            key = ModelKey(self.model_path, config, backend="onnx")
+            self.assertIs(plugin._prepare_model(key), tts)
+            self.assertEqual(len(loads), 1)  # the model loaded for the export is reused
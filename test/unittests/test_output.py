@@ -0,0 +1,79 @@
+import io
+import os
+import tempfile
+import unittest
+import wave
+
+import numpy as np
+
+from ovos_tts_plugin_coqui.output import AudioEncoder, AudioSink, FileSink
+
+SR = 22050
+WAV = (0.25 * np.sin(2 * np.pi * 440 * np.arange(SR) / SR)).astype(np.float32)
+
+
+def read_wav(data: bytes):
+    with wave.open(io.BytesIO(data)) as f:
+        return f.getnchannels(), f.getsampwidth(), f.getframerate(), f.readframes(f.getnframes())
+
+
+class TestAudioSink(unittest.TestCase):
+    def test_float32_is_returned_as_synthesized(self):
+        audio, sample_rate = AudioSink("float32").render(WAV, SR)
+        self.assertEqual(sample_rate, SR)
+        np.testing.assert_array_equal(audio, WAV)
+
+    def test_pcm16_is_peak_normalized(self):
+        pcm, sample_rate = AudioSink("pcm16").render(WAV, SR)
+        samples = np.frombuffer(pcm, dtype="<i2")
+        self.assertEqual((len(samples), sample_rate), (SR, SR))
+        self.assertEqual(int(np.abs(samples).max()), 32767)
+
+    def test_wav(self):
+        data, sample_rate = AudioSink("wav").render(WAV, SR)
+        channels, width, rate, frames = read_wav(data)
+        self.assertEqual((channels, width, rate, sample_rate), (1, 2, SR, SR))
+        self.assertEqual(frames, AudioSink("pcm16").render(WAV, SR)[0])
+
+    def test_same_rate_is_not_resampled(self):
+        self.assertEqual(AudioSink("pcm16", sample_rate=SR).render(WAV, SR)[1], SR)
+
+    def test_opus_rates(self):
+        self.assertEqual(AudioEncoder.sample_rate_for("opus", 22050), 24000)
+        self.assertEqual(AudioEncoder.sample_rate_for("opus", 16000), 16000)
+        self.assertEqual(AudioEncoder.sample_rate_for("opus", 96000), 48000)
+        self.assertEqual(AudioEncoder.sample_rate_for("ogg", 22050), 22050)
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            AudioSink("aiff")
+        with self.assertRaises(ValueError):
+            AudioEncoder().encode(WAV, SR, "wav")
+
+    def test_missing_ffmpeg(self):
+        encoder = AudioEncoder.from_config({"encoder": "ffmpeg", "ffmpeg": "no-such-ffmpeg-binary"})
+        with self.assertRaises(RuntimeError):
+            AudioSink("mp3", encoder=encoder).render(WAV, SR)
+
+
+class TestFileSink(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_format_from_extension(self):
+        self.assertEqual(FileSink(os.path.join(self.dir.name, "a.FLAC")).audio_format, "flac")
+        self.assertEqual(FileSink(os.path.join(self.dir.name, "a")).audio_format, "wav")
+        self.assertEqual(FileSink(os.path.join(self.dir.name, "a.mp3"), "wav").audio_format, "wav")
+
+    def test_raw_formats_are_not_files(self):
+        with self.assertRaises(ValueError):
+            FileSink(os.path.join(self.dir.name, "a.pcm16"))
+
+    def test_write(self):
+        path = os.path.join(self.dir.name, "out.wav")
+        self.assertEqual(FileSink(path).write(WAV, SR), (path, SR))
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), AudioSink("wav").render(WAV, SR)[0])
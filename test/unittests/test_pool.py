@@ -0,0 +1,131 @@
+import threading
+import time
+import unittest
+
+from ovos_tts_plugin_coqui.pool import ModelKey, ModelPool, estimate_model_size
+
+MB = 1024 * 1024
+
+
+class FakeModel:
+    """stands in for a loaded model, estimate_model_size reads nbytes"""
+
+    def __init__(self, name: str, size_mb: float = 1):
+        self.name = name
+        self.nbytes = int(size_mb * MB)
+
+
+def key(name: str) -> ModelKey:
+    return ModelKey(name)
+
+
+class TestModelPool(unittest.TestCase):
+    def test_model_key_defaults(self):
+        k = key("tts_models/en/ljspeech/vits")
+        self.assertEqual((k.device, k.quantize, k.backend), ("cpu", False, "torch"))
+        self.assertNotEqual(k, k._replace(backend="onnx"))
+
+    def test_estimate_model_size(self):
+        self.assertEqual(estimate_model_size(FakeModel("a", 2)), 2 * MB)
+        self.assertEqual(estimate_model_size(object()), 0)
+
+    def test_loaded_once(self):
+        pool = ModelPool()
+        calls = []
+        first = pool.get(key("a"), lambda: calls.append(1) or FakeModel("a"))
+        self.assertIs(pool.get(key("a"), lambda: calls.append(1) or FakeModel("a")), first)
+        self.assertEqual(len(calls), 1)
+        self.assertIn(key("a"), pool)
+
+    def test_concurrent_loads_of_a_key_are_deduplicated(self):
+        pool = ModelPool()
+        calls = []
+        started = threading.Event()
+
+        def slow_load():
+            calls.append(1)
+            started.set()
+            time.sleep(0.1)
+            return FakeModel("a")
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(pool.get(key("a"), slow_load)))
+                   for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len({id(r) for r in results}), 1)
+
+    def test_other_keys_load_in_parallel(self):
+        pool = ModelPool()
+        release = threading.Event()
+        slow = threading.Thread(target=pool.get, args=(key("slow"), lambda: release.wait(5) and FakeModel("slow")))
+        slow.start()
+        time.sleep(0.02)
+        start = time.monotonic()
+        pool.get(key("fast"), lambda: FakeModel("fast"))
+        self.assertLess(time.monotonic() - start, 1)
+        release.set()
+        slow.join(5)
+        self.assertEqual(set(pool.loaded_models), {key("slow"), key("fast")})
+
+    def test_failed_load_can_be_retried(self):
+        pool = ModelPool()
+        with self.assertRaises(RuntimeError):
+            pool.get(key("a"), lambda: (_ for _ in ()).throw(RuntimeError("download failed")))
+        self.assertNotIn(key("a"), pool)
+        self.assertEqual(pool.get(key("a"), lambda: FakeModel("a")).name, "a")
+
+    def test_max_models_evicts_least_recently_used(self):
+        pool = ModelPool(max_models=2)
+        pool.get(key("a"), lambda: FakeModel("a"))
+        pool.get(key("b"), lambda: FakeModel("b"))
+        pool.get(key("a"), lambda: FakeModel("a"))  # a is now more recent than b
+        pool.get(key("c"), lambda: FakeModel("c"))
+        self.assertEqual(pool.loaded_models, [key("a"), key("c")])
+
+    def test_memory_budget(self):
+        pool = ModelPool(max_ram_mb=5)
+        pool.get(key("a"), lambda: FakeModel("a", 2))
+        pool.get(key("b"), lambda: FakeModel("b", 2))
+        self.assertAlmostEqual(pool.ram_usage_mb, 4)
+        pool.get(key("c"), lambda: FakeModel("c", 2))
+        self.assertEqual(pool.loaded_models, [key("b"), key("c")])
+        self.assertLessEqual(pool.ram_usage_mb, 5)
+
+    def test_model_larger_than_the_budget_is_kept(self):
+        pool = ModelPool(max_ram_mb=1)
+        pool.get(key("a"), lambda: FakeModel("a", 1))
+        model = pool.get(key("big"), lambda: FakeModel("big", 3))
+        self.assertEqual(pool.loaded_models, [key("big")])
+        self.assertEqual(model.name, "big")
+
+    def test_configure_enforces_the_new_budget(self):
+        pool = ModelPool()
+        for name in "abc":
+            pool.get(key(name), lambda: FakeModel(name))
+        pool.configure(max_models=1)
+        self.assertEqual(pool.loaded_models, [key("c")])
+
+    def test_idle_models_are_reaped(self):
+        pool = ModelPool(idle_timeout=0.05)
+        pool.get(key("a"), lambda: FakeModel("a"))
+        time.sleep(0.1)
+        pool.get(key("b"), lambda: FakeModel("b"))
+        pool.reap()
+        self.assertEqual(pool.loaded_models, [key("b")])
+
+    def test_evict_and_clear(self):
+        pool = ModelPool()
+        for name in "abc":
+            pool.get(key(name), lambda: FakeModel(name))
+        self.assertTrue(pool.evict(key("a")))
+        self.assertFalse(pool.evict(key("a")))
+        pool.clear()
+        self.assertEqual(pool.loaded_models, [])
+        self.assertEqual(pool.ram_usage_mb, 0)
+        calls = []
+        pool.get(key("b"), lambda: calls.append(1) or FakeModel("b"))  # loaded again after clear
+        self.assertEqual(calls, [1])
@@ -0,0 +1,115 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from ovos_tts_plugin_coqui import CoquiTTSPlugin
+from ovos_tts_plugin_coqui.aio import SynthesisCancelled
+from ovos_tts_plugin_coqui.pool import ModelKey
+from ovos_tts_plugin_coqui.prerender import PRERENDER_PRIORITY, Prerenderer, iter_phrases, read_dialogs
+from ovos_tts_plugin_coqui.scheduler import ModelScheduler
+
+KEY = ModelKey("model")
+
+
+class TestDialogs(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.skill = self.write("skill/locale/en-us/hello.dialog", "Hello there.\n# comment\n\nHi!\n")
+        self.write("skill/locale/en-us/timer.dialog", "Timer set for {minutes} minutes.\nHi!\nDone.\n")
+        self.write("skill/locale/en-us/intents.intent", "say hello\n")
+        self.other = self.write("other/goodbye.dialog", "Goodbye.\n")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def write(self, name: str, content: str) -> str:
+        path = os.path.join(self.dir.name, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+        return os.path.dirname(path)
+
+    def test_read_dialogs(self):
+        self.assertEqual(read_dialogs(os.path.join(self.dir.name, "skill")), ["Hello there.", "Hi!", "Done."])
+
+    def test_a_folder_or_a_list(self):
+        self.assertEqual(list(iter_phrases(self.other)), ["Goodbye."])
+        self.assertEqual(list(iter_phrases([self.other, self.skill])), ["Goodbye.", "Hello there.", "Hi!", "Done."])
+
+    def test_missing_folders_are_skipped(self):
+        self.assertEqual(list(iter_phrases([os.path.join(self.dir.name, "missing"), self.other])), ["Goodbye."])
+
+    def test_other_types_are_rejected(self):
+        for value in (5, {"path": self.other}, [self.other, 5], None):
+            with self.assertRaises(TypeError):
+                iter_phrases(value)
+
+    def test_plugin_rejects_invalid_dialog_dirs(self):
+        with self.assertRaises(TypeError):
+            CoquiTTSPlugin(lang="en-us", config={"preload": False, "prerender": {
+                "dialog_dirs": 5, "path": os.path.join(self.dir.name, "cache")}})
+
+
+class TestPrerenderer(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = ModelScheduler()
+        self.prerenderer = Prerenderer(self.scheduler, idle_delay=0.05)
+
+    def render(self, name: str, rendered: list, steps: int = 1, step: float = 0.0):
+        """a job that synthesizes `steps` chunks, stopping at a chunk boundary when preempted"""
+
+        def job(cancel):
+            for _ in range(steps):
+                self.assertEqual(self.scheduler.current().priority, PRERENDER_PRIORITY)
+                self.scheduler.submit(KEY, lambda: time.sleep(step))
+                if cancel.is_set():
+                    raise SynthesisCancelled()
+            rendered.append(name)
+
+        return job
+
+    def test_jobs_are_rendered_once(self):
+        rendered = []
+        self.assertTrue(self.prerenderer.submit("a", self.render("a", rendered)))
+        self.assertFalse(self.prerenderer.submit("a", self.render("a", rendered)))
+        self.assertTrue(self.prerenderer.join(5))
+        self.assertEqual(rendered, ["a"])
+
+    def test_oldest_jobs_are_dropped(self):
+        self.prerenderer.max_pending = 2
+        busy = threading.Event()
+        self.prerenderer.submit("blocker", lambda cancel: busy.wait(5))
+        time.sleep(0.1)  # the blocker is running, the next jobs wait
+        rendered = []
+        for name in "abc":
+            self.prerenderer.submit(name, self.render(name, rendered))
+        busy.set()
+        self.assertTrue(self.prerenderer.join(5))
+        self.assertEqual(rendered, ["b", "c"])
+        self.assertEqual(self.prerenderer.dropped, 1)
+
+    def test_waits_for_idle_models(self):
+        rendered = []
+        release = threading.Event()
+        request = threading.Thread(target=self.scheduler.submit, args=(KEY, lambda: release.wait(5)))
+        request.start()
+        self.prerenderer.submit("a", self.render("a", rendered))
+        time.sleep(0.2)
+        self.assertEqual(rendered, [])  # a real request is using the model
+        release.set()
+        request.join(5)
+        self.assertTrue(self.prerenderer.join(5))
+        self.assertEqual(rendered, ["a"])
+
+    def test_real_requests_preempt_jobs(self):
+        rendered = []
+        self.prerenderer.submit("long", self.render("long", rendered, steps=50, step=0.01))
+        end = time.monotonic() + 5
+        while self.scheduler.busy() == 0 and time.monotonic() < end:  # wait until the job is rendering
+            time.sleep(0.005)
+        self.scheduler.submit(KEY, lambda: time.sleep(0.05))  # a real request arrives
+        self.assertTrue(self.prerenderer.join(10))
+        self.assertEqual(rendered, ["long"])  # resumed at the next idle period
+        self.assertGreaterEqual(self.prerenderer.preempted, 1)
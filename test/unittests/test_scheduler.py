@@ -0,0 +1,248 @@
+import threading
+import time
+import unittest
+
+from ovos_tts_plugin_coqui.pool import ModelKey
+from ovos_tts_plugin_coqui.scheduler import CostModel, ModelScheduler, RequestRejected
+
+KEY = ModelKey("model")
+
+
+class Blocker:
+    """holds the model until released, so requests pile up in the queue"""
+
+    def __init__(self, scheduler: ModelScheduler):
+        self.scheduler = scheduler
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.thread = threading.Thread(target=scheduler.submit, args=(KEY, self.run))
+        self.thread.start()
+        self.started.wait(5)
+
+    def run(self):
+        self.started.set()
+        self.release.wait(5)
+
+
+def wait_for_queue(scheduler: ModelScheduler, depth: int):
+    end = time.monotonic() + 5
+    while scheduler.queue_depth < depth and time.monotonic() < end:
+        time.sleep(0.005)
+
+
+class TestModelScheduler(unittest.TestCase):
+    def test_returns_results_and_errors(self):
+        scheduler = ModelScheduler()
+        self.assertEqual(scheduler.submit(KEY, lambda: 42), 42)
+        with self.assertRaises(ZeroDivisionError):
+            scheduler.submit(KEY, lambda: 1 / 0)
+
+    def test_nested_calls_do_not_deadlock(self):
+        scheduler = ModelScheduler()
+        self.assertEqual(scheduler.submit(KEY, lambda: scheduler.submit(KEY, lambda: "inner")), "inner")
+
+    def test_model_is_used_by_one_thread_at_a_time(self):
+        scheduler = ModelScheduler()
+        active, peak, lock = [0], [0], threading.Lock()
+
+        def work():
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.01)
+            with lock:
+                active[0] -= 1
+
+        threads = [threading.Thread(target=scheduler.submit, args=(KEY, work)) for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(5)
+        self.assertEqual(peak[0], 1)
+
+
+class TestBatching(unittest.TestCase):
+    def run_batched(self, batch_fn, n: int = 3) -> dict:
+        """submit n concurrent batchable requests, returns {i: result or exception}"""
+        scheduler = ModelScheduler(max_batch_size=4, window_ms=50)
+        results = {}
+
+        def call(i):
+            try:
+                results[i] = scheduler.submit(KEY, lambda: i * 10, batch=("group", batch_fn, i))
+            except BaseException as e:
+                results[i] = e
+
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(n)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(5)
+        self.assertFalse(any(t.is_alive() for t in threads), "a caller was left waiting")
+        return results
+
+    def test_batching(self):
+        batches = []
+
+        def batch_fn(items):
+            batches.append(list(items))
+            return [i * 10 for i in items]
+
+        self.assertEqual(self.run_batched(batch_fn), {0: 0, 1: 10, 2: 20})
+        self.assertGreater(max(len(b) for b in batches), 1)
+
+    def test_failed_batch_runs_requests_one_by_one(self):
+        def batch_fn(items):
+            raise RuntimeError("out of memory")
+
+        self.assertEqual(self.run_batched(batch_fn), {0: 0, 1: 10, 2: 20})
+
+    def test_missing_results_run_requests_one_by_one(self):
+        def batch_fn(items):
+            return [i * 10 for i in items][:-1]
+
+        self.assertEqual(self.run_batched(batch_fn), {0: 0, 1: 10, 2: 20})
+
+    def test_base_exception_fails_every_request(self):
+        batched = []
+
+        def batch_fn(items):
+            if len(items) > 1:
+                batched.append(items)
+                raise KeyboardInterrupt
+            return [i * 10 for i in items]
+
+        results = self.run_batched(batch_fn)
+        self.assertEqual(len(results), 3)
+        self.assertTrue(batched)
+        for i in batched[0]:
+            self.assertIsInstance(results[i], KeyboardInterrupt)
+
+
+class TestCostModel(unittest.TestCase):
+    def test_linear_fit(self):
+        model = CostModel()
+        for cost in (10, 20, 40, 80):
+            model.add(cost, 0.1 + 0.01 * cost)
+        self.assertAlmostEqual(model.estimate(100), 1.1, places=3)
+
+    def test_single_size(self):
+        model = CostModel()
+        model.add(10, 0.5)
+        self.assertAlmostEqual(model.estimate(20), 1.0)
+
+
+class TestScheduling(unittest.TestCase):
+    def run_queued(self, scheduler: ModelScheduler, requests) -> list:
+        """queue (name, priority, cost) requests behind a busy model, returns the run order"""
+        order = []
+        blocker = Blocker(scheduler)
+        threads = []
+        for name, priority, cost in requests:
+            def call(name=name, priority=priority, cost=cost):
+                with scheduler.request(priority=priority):
+                    scheduler.submit(KEY, lambda: order.append(name), cost=cost)
+            threads.append(threading.Thread(target=call))
+            threads[-1].start()
+            wait_for_queue(scheduler, len(threads))
+        blocker.release.set()
+        for t in threads + [blocker.thread]:
+            t.join(5)
+        return order
+
+    def test_priority_runs_first(self):
+        scheduler = ModelScheduler(policy="fifo")
+        order = self.run_queued(scheduler, [("low", 0, 1), ("high", 10, 1)])
+        self.assertEqual(order, ["high", "low"])
+
+    def test_fifo(self):
+        scheduler = ModelScheduler(policy="fifo")
+        self.assertEqual(self.run_queued(scheduler, [("long", 0, 500), ("short", 0, 5)]), ["long", "short"])
+
+    def test_shortest_job_first(self):
+        scheduler = ModelScheduler(policy="sjf", aging=0)
+        self.assertEqual(self.run_queued(scheduler, [("long", 0, 500), ("short", 0, 5)]), ["short", "long"])
+
+    def test_queue_full(self):
+        scheduler = ModelScheduler(max_queue=1)
+        blocker = Blocker(scheduler)
+        errors = []
+
+        def call(priority: int):
+            with scheduler.request(priority=priority):
+                try:
+                    scheduler.submit(KEY, lambda: None)
+                except RequestRejected as e:
+                    errors.append((priority, e.reason))
+
+        waiting = threading.Thread(target=call, args=(0,))
+        waiting.start()
+        wait_for_queue(scheduler, 1)
+        call(0)  # same priority, rejected right away
+        self.assertEqual(errors, [(0, "queue_full")])
+
+        urgent = threading.Thread(target=call, args=(5,))
+        urgent.start()  # displaces the waiting request
+        waiting.join(5)
+        self.assertEqual(errors, [(0, "queue_full"), (0, "queue_full")])
+        blocker.release.set()
+        urgent.join(5)
+        blocker.thread.join(5)
+        self.assertEqual(len(errors), 2)  # the urgent request ran
+
+    def test_deadline_passes_while_waiting(self):
+        scheduler = ModelScheduler()
+        blocker = Blocker(scheduler)
+        try:
+            with scheduler.request(deadline=0.05):
+                with self.assertRaises(RequestRejected) as ctx:
+                    scheduler.submit(KEY, lambda: None)
+            self.assertEqual(ctx.exception.reason, "deadline")
+        finally:
+            blocker.release.set()
+            blocker.thread.join(5)
+
+    def test_deadline_rejected_on_admission(self):
+        scheduler = ModelScheduler()
+        scheduler.submit(KEY, lambda: time.sleep(0.05), cost=10)  # measure the model
+        with scheduler.request(deadline=0.01):
+            with self.assertRaises(RequestRejected) as ctx:
+                scheduler.submit(KEY, lambda: None, cost=1000)
+        self.assertEqual(ctx.exception.reason, "deadline")
+
+    def test_request_options_nest(self):
+        scheduler = ModelScheduler()
+        self.assertIsNone(scheduler.current())
+        with scheduler.request(priority=3, deadline=10):
+            outer = scheduler.current()
+            with scheduler.request(deadline=1):
+                self.assertEqual(scheduler.current().priority, 3)
+                self.assertLess(scheduler.current().deadline, outer.deadline)
+            self.assertIs(scheduler.current(), outer)
+        self.assertIsNone(scheduler.current())
+
+    def test_aging_lets_long_requests_run(self):
+        scheduler = ModelScheduler(policy="sjf", aging=1e6)  # waiting outweighs any size difference
+        self.assertEqual(self.run_queued(scheduler, [("long", 0, 500), ("short", 0, 5)]), ["long", "short"])
+
+    def test_busy_counts_by_priority(self):
+        scheduler = ModelScheduler()
+        blocker = Blocker(scheduler)
+
+        def call():
+            with scheduler.request(priority=5):
+                scheduler.submit(KEY, lambda: None)
+
+        waiting = threading.Thread(target=call)
+        waiting.start()
+        wait_for_queue(scheduler, 1)
+        self.assertEqual(scheduler.busy(), 2)
+        self.assertEqual(scheduler.busy(min_priority=5), 1)
+        blocker.release.set()
+        waiting.join(5)
+        blocker.thread.join(5)
+        self.assertEqual(scheduler.busy(), 0)
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            ModelScheduler().configure(policy="lifo")
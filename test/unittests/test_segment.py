@@ -0,0 +1,55 @@
+import unittest
+
+from ovos_tts_plugin_coqui.segment import split_sentences
+
+
+class TestSplitSentences(unittest.TestCase):
+    def test_sentences(self):
+        self.assertEqual(split_sentences("Hello there. How are you? I am fine!"),
+                         ["Hello there.", "How are you?", "I am fine!"])
+
+    def test_whitespace_is_normalized(self):
+        self.assertEqual(split_sentences("  One.\n\n  Two.  "), ["One.", "Two."])
+        self.assertEqual(split_sentences("   "), [])
+
+    def test_abbreviations_do_not_split(self):
+        self.assertEqual(split_sentences("Ask Dr. Smith about it. Then call me."),
+                         ["Ask Dr. Smith about it.", "Then call me."])
+        self.assertEqual(split_sentences("Use tools, e.g. a hammer. Done."),
+                         ["Use tools, e.g. a hammer.", "Done."])
+
+    def test_dotted_initialisms_do_not_split(self):
+        self.assertEqual(split_sentences("See you at 5 p.m. tomorrow. Bring food."),
+                         ["See you at 5 p.m. tomorrow.", "Bring food."])
+        self.assertEqual(split_sentences("She moved to the U.S. last year."),
+                         ["She moved to the U.S. last year."])
+
+    def test_single_letters_end_sentences(self):
+        self.assertEqual(split_sentences("Take vitamin C. Then rest."),
+                         ["Take vitamin C.", "Then rest."])
+        self.assertEqual(split_sentences("The answer is b. Next question."),
+                         ["The answer is b.", "Next question."])
+
+    def test_closing_quotes(self):
+        self.assertEqual(split_sentences('He said "stop." Then he left.'),
+                         ['He said "stop."', "Then he left."])
+
+    def test_cjk_terminators(self):
+        self.assertEqual(split_sentences("你好。你好吗？我很好！", "zh"), ["你好。", "你好吗？", "我很好！"])
+
+    def test_long_sentences_split_at_clauses(self):
+        sentence = "first clause here, second clause here, third clause here."
+        self.assertEqual(split_sentences(sentence, max_chars=40),
+                         ["first clause here, second clause here,", "third clause here."])
+
+    def test_long_clauses_split_at_words(self):
+        sentence = " ".join(["word"] * 30)
+        segments = split_sentences(sentence, max_chars=32)
+        self.assertTrue(all(len(s) <= 32 for s in segments))
+        self.assertEqual(" ".join(segments), sentence)
+
+    def test_no_space_languages(self):
+        sentence = "今天天气很好，我们去公园散步，然后回家吃饭。"
+        segments = split_sentences(sentence, "zh-cn", max_chars=12)
+        self.assertTrue(all(len(s) <= 12 for s in segments))
+        self.assertEqual("".join(segments), sentence)
@@ -0,0 +1,126 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from ovos_tts_plugin_coqui.selection import (ModelProfiles, ModelSelector, choose_model, fingerprint_id,
+                                             fits_budget)
+
+HOST = {"machine": "x86_64", "cpu": "test cpu", "torch": "2.1.0"}
+
+PROFILES = {"large": {"ok": True, "rtf": 0.9, "ram_mb": 900, "load_time_s": 8},
+            "medium": {"ok": True, "rtf": 0.3, "ram_mb": 300, "load_time_s": 3},
+            "small": {"ok": True, "rtf": 0.1, "ram_mb": 400, "load_time_s": 1},
+            "broken": {"ok": False}}
+CANDIDATES = ["large", "medium", "small", "broken"]
+
+
+class TestChooseModel(unittest.TestCase):
+    def test_fits_budget(self):
+        self.assertTrue(fits_budget(PROFILES["medium"], {"max_rtf": 0.5, "max_ram_mb": 500}))
+        self.assertFalse(fits_budget(PROFILES["large"], {"max_rtf": 0.5}))
+        self.assertFalse(fits_budget(PROFILES["small"], {"max_ram_mb": 350}))
+        self.assertFalse(fits_budget(PROFILES["broken"], {}))
+
+    def test_quality_prefers_the_first_fitting_candidate(self):
+        self.assertEqual(choose_model(CANDIDATES, PROFILES, {"max_rtf": 0.5}), "medium")
+        self.assertEqual(choose_model(CANDIDATES, PROFILES, {}), "large")
+
+    def test_latency_and_memory(self):
+        self.assertEqual(choose_model(CANDIDATES, PROFILES, {"prefer": "latency"}), "small")
+        self.assertEqual(choose_model(CANDIDATES, PROFILES, {"prefer": "memory"}), "medium")
+
+    def test_nothing_fits(self):
+        self.assertEqual(choose_model(CANDIDATES, PROFILES, {"max_rtf": 0.01}), "small")
+        self.assertIsNone(choose_model(["broken"], PROFILES, {}))
+
+
+class TestModelSelector(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.profile_file = os.path.join(self.dir.name, "profiles", "models.json")
+        # local model files count as downloaded, their version is their size and mtime
+        self.models = {}
+        for name in PROFILES:
+            self.models[name] = os.path.join(self.dir.name, f"{name}.pth")
+            with open(self.models[name], "wb") as f:
+                f.write(name.encode("utf-8"))
+        self.candidates = [self.models[name] for name in CANDIDATES]
+        self.profiled = []
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def profile(self, model: str) -> dict:
+        self.profiled.append(model)
+        name = os.path.basename(model)[:-4]
+        if not PROFILES[name]["ok"]:
+            raise RuntimeError("model failed to load")
+        return {k: v for k, v in PROFILES[name].items() if k != "ok"}
+
+    def select(self, selector: ModelSelector, budget: dict = None, lang: str = "en") -> str:
+        return selector.select(lang, self.candidates, budget or {}, HOST, lambda m: "torch", self.profile)
+
+    def test_choice_is_remembered(self):
+        selector = ModelSelector(ModelProfiles(self.profile_file))
+        self.assertEqual(self.select(selector, {"prefer": "latency"}), self.models["small"])
+        self.assertEqual(len(self.profiled), 4)
+        self.assertEqual(self.select(selector, {"prefer": "latency"}), self.models["small"])
+        self.assertEqual(len(self.profiled), 4)
+
+    def test_profiles_are_persisted(self):
+        self.select(ModelSelector(ModelProfiles(self.profile_file)))
+        self.assertTrue(os.path.isfile(self.profile_file))
+        self.profiled.clear()
+        # a new process reads the measurements instead of profiling again
+        choice = self.select(ModelSelector(ModelProfiles(self.profile_file)), {"max_rtf": 0.5})
+        self.assertEqual(choice, self.models["medium"])
+        self.assertEqual(self.profiled, [])
+        stored = ModelProfiles(self.profile_file).get(fingerprint_id(HOST), f"{self.models['broken']}|torch")
+        self.assertFalse(stored["ok"])
+        self.assertIn("model failed to load", stored["error"])
+
+    def test_changed_model_is_profiled_again(self):
+        self.select(ModelSelector(ModelProfiles(self.profile_file)))
+        self.profiled.clear()
+        with open(self.models["medium"], "ab") as f:
+            f.write(b"v2")
+        self.select(ModelSelector(ModelProfiles(self.profile_file)))
+        self.assertEqual(self.profiled, [self.models["medium"]])
+
+    def test_other_host_is_profiled_again(self):
+        profiles = ModelProfiles(self.profile_file)
+        self.select(ModelSelector(profiles))
+        self.profiled.clear()
+        ModelSelector(profiles).select("en", self.candidates, {}, dict(HOST, torch="2.2.0"),
+                                       lambda m: "torch", self.profile)
+        self.assertEqual(len(self.profiled), 4)
+
+    def test_chosen_languages_do_not_wait_for_profiling(self):
+        selector = ModelSelector(ModelProfiles(self.profile_file))
+        self.select(selector, lang="en")
+        release = threading.Event()
+
+        def slow_profile(model):
+            release.wait(5)
+            return {"rtf": 0.5}
+
+        other = threading.Thread(target=selector.select,
+                                 args=("pt", self.candidates[:1], {}, HOST, lambda m: "onnx", slow_profile))
+        other.start()
+        time.sleep(0.05)
+        start = time.monotonic()
+        self.select(selector, lang="en")
+        self.assertLess(time.monotonic() - start, 1)
+        release.set()
+        other.join(5)
+
+    def test_concurrent_selections_profile_once(self):
+        selector = ModelSelector(ModelProfiles(self.profile_file))
+        threads = [threading.Thread(target=self.select, args=(selector,)) for _ in range(3)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(5)
+        self.assertEqual(sorted(self.profiled), sorted(self.candidates))
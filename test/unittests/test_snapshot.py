@@ -0,0 +1,76 @@
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from ovos_tts_plugin_coqui import snapshot
+from ovos_tts_plugin_coqui.pool import ModelKey
+from ovos_tts_plugin_coqui.snapshot import ModelSnapshots
+
+HOST = {"torch": "2.1.0", "coqui": "0.22.0"}
+
+
+class TestSnapshotKey(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.snapshots = ModelSnapshots(self.dir.name, enabled=True)
+        self.key = ModelKey("tts_models/en/ljspeech/vits")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def folder(self, key: ModelKey = None, python=(3, 11), **host) -> str:
+        with mock.patch.object(snapshot, "host_fingerprint", return_value=dict(HOST, **host)), \
+                mock.patch.object(snapshot, "sys", SimpleNamespace(version_info=python + (0,))):
+            return self.snapshots.folder_for(key or self.key)
+
+    def test_stable(self):
+        self.assertEqual(self.folder(), self.folder())
+        self.assertTrue(os.path.basename(self.folder()).startswith("tts_models-en-ljspeech-vits-"))
+
+    def test_versions_change_the_folder(self):
+        base = self.folder()
+        self.assertNotEqual(base, self.folder(torch="2.2.0"))
+        self.assertNotEqual(base, self.folder(coqui="0.23.0"))
+        self.assertNotEqual(base, self.folder(python=(3, 12)))
+
+    def test_model_files_change_the_folder(self):
+        self.assertNotEqual(self.folder(), self.folder(self.key._replace(model_config="config.json")))
+        self.assertNotEqual(self.folder(), self.folder(self.key._replace(vocoder="vocoder_models/en/hifigan")))
+
+    def test_model_version_changes_the_folder(self):
+        model = os.path.join(self.dir.name, "model.pth")
+        with open(model, "w") as f:
+            f.write("v1")
+        before = self.folder(ModelKey(model))
+        with open(model, "w") as f:
+            f.write("v2 weights")
+        self.assertNotEqual(before, self.folder(ModelKey(model)))
+
+
+class TestSnapshotLoad(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.snapshots = ModelSnapshots(os.path.join(self.dir.name, "snapshots"), enabled=True)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_skipped_keys_are_built(self):
+        for key in (ModelKey("m", backend="onnx"), ModelKey("m", device="cuda")):
+            self.assertEqual(self.snapshots.load(key, lambda: "built"), "built")
+        self.snapshots.configure(enabled=False)
+        self.assertEqual(self.snapshots.load(ModelKey("m"), lambda: "built"), "built")
+        self.assertFalse(os.path.exists(self.snapshots.path))
+
+    def test_snapshot_in_a_shared_folder_is_not_loaded(self):
+        key = ModelKey("m")
+        folder = self.snapshots.folder_for(key)
+        os.makedirs(folder)
+        with open(os.path.join(folder, snapshot.META_FILE), "w") as f:
+            f.write('{"ok": true}')
+        os.chmod(folder, 0o777)
+        with mock.patch.object(self.snapshots, "_restore") as restore:
+            self.assertEqual(self.snapshots.load(key, lambda: "built"), "built")
+        restore.assert_not_called()
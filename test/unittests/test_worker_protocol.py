@@ -0,0 +1,114 @@
+import os
+import socket
+import tempfile
+import threading
+import unittest
+
+from ovos_tts_plugin_coqui.worker import WorkerClient, _WorkerServer, recv_msg, remote_config, send_msg
+
+
+class TestFraming(unittest.TestCase):
+    def setUp(self):
+        self.a, self.b = socket.socketpair()
+
+    def tearDown(self):
+        self.a.close()
+        self.b.close()
+
+    def test_header_only(self):
+        send_msg(self.a, {"method": "ping", "params": {"lang": "en-us"}})
+        header, payload = recv_msg(self.b)
+        self.assertEqual(header["method"], "ping")
+        self.assertEqual(header["params"], {"lang": "en-us"})
+        self.assertEqual(header["size"], 0)
+        self.assertEqual(payload, b"")
+
+    def test_payload(self):
+        data = bytes(range(256)) * 64  # fits in the socket buffer, sent from the same thread
+        send_msg(self.a, {"ok": True}, data)
+        header, payload = recv_msg(self.b)
+        self.assertEqual(header["size"], len(data))
+        self.assertEqual(payload, data)
+
+    def test_consecutive_messages(self):
+        for i in range(3):
+            send_msg(self.a, {"i": i}, b"x" * i)
+        for i in range(3):
+            header, payload = recv_msg(self.b)
+            self.assertEqual((header["i"], payload), (i, b"x" * i))
+
+    def test_large_payload_from_another_thread(self):
+        data = b"\x01\x02" * (4 * 1024 * 1024)  # larger than the socket buffers
+        sender = threading.Thread(target=send_msg, args=(self.a, {"ok": True}, data))
+        sender.start()
+        header, payload = recv_msg(self.b)
+        sender.join(5)
+        self.assertEqual(payload, data)
+
+    def test_closed_connection(self):
+        self.a.close()
+        self.assertEqual(recv_msg(self.b), (None, b""))
+
+    def test_connection_closed_mid_message(self):
+        send_msg(self.a, {"ok": True}, b"payload")
+        self.b.recv(6)  # eat part of the length prefix and header
+        self.a.close()
+        with self.assertRaises((ConnectionError, ValueError)):
+            recv_msg(self.b)
+
+
+class TestRemoteConfig(unittest.TestCase):
+    def test_model_and_output_settings_are_kept(self):
+        config = {"model": "tts_models/en/ljspeech/vits", "voice": "p232", "pipeline": True,
+                  "audio_output": {"encoder": "soundfile", "bitrate": "64k"}}
+        self.assertEqual(remote_config(config), config)
+
+    def test_local_settings_are_dropped(self):
+        config = remote_config({"model": "m",
+                                "metrics": {"callback": "os:system"},
+                                "audio_cache": {"path": "/etc"},
+                                "worker": True,
+                                "num_threads": 64,
+                                "voices_dir": "/home",
+                                "audio_output": {"ffmpeg": "/tmp/evil", "bitrate": "64k"}})
+        self.assertEqual(config, {"model": "m", "audio_output": {"bitrate": "64k"}})
+
+
+class FakePlugin:
+    def __init__(self, lang: str, config: dict):
+        self.lang = lang
+        self.config = config
+
+    def get_tts(self, sentence: str, wav_file: str, **kwargs):
+        with open(wav_file, "wb") as f:
+            f.write(sentence.encode("utf-8"))
+        return wav_file, None
+
+
+class TestWorkerServer(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.server = _WorkerServer(os.path.join(self.dir.name, "worker.sock"))
+        self.plugins = []
+        self.server.plugin = self.plugin
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.client = WorkerClient(self.server.server_address, timeout=5)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.dir.cleanup()
+
+    def plugin(self, lang: str, config: dict):
+        self.plugins.append(FakePlugin(lang, config))
+        return self.plugins[-1]
+
+    def test_audio_is_returned_not_written(self):
+        target = os.path.join(self.dir.name, "target.wav")
+        header, payload = self.client.request("get_tts", plugin_lang="en-us", config={},
+                                              sentence="hello", wav_file=target)
+        self.assertEqual(payload, b"hello")
+        self.assertFalse(os.path.exists(target))
+
+    def test_socket_is_not_world_accessible(self):
+        self.assertEqual(os.stat(self.server.server_address).st_mode & 0o007, 0)